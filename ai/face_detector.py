@@ -8,29 +8,132 @@ Purpose:
 • Crop face automatically
 • Prevent group photo registration
 • Prepare image for embedding
+• Batch recognition across many images (see inference_scheduler.py)
 
 Uses:
 • InsightFace (RetinaFace)
 
+Model profiles (face_recognition.model in config.yaml):
+• buffalo_l       → full pack (adds 2D/3D landmarks + gender/age)
+• buffalo_l_lean  → buffalo_l detection + recognition only
+• buffalo_s       → smaller pack, detection + recognition only
+
+The portal only needs the bounding box and normed_embedding, so the
+lean profiles skip three models per detected face.
+
+Cascade mode (coarse → fine):
+• Coarse pass: detect on a downscaled copy of the frame
+• Fine pass: re-detect inside the face region at original resolution
+  to get precise landmarks for alignment
+• Landmarks / recognition run on the original-resolution frame
+
+Detection sizes adapt to the input (never upscaled, rounded to the
+32-pixel stride RetinaFace needs), so a 480p selfie is no longer padded
+into a 640×640 canvas. Faces much smaller than the coarse resolution can
+resolve are not seen by the coarse pass; they would fail the minimum
+face size rule anyway.
+
 """
 
+import time
+
 import cv2
 import numpy as np
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.utils import face_align
+
+
+MODEL_PROFILES = {
+    "buffalo_l": {"pack": "buffalo_l", "modules": None},
+    "buffalo_l_lean": {"pack": "buffalo_l", "modules": ["detection", "recognition"]},
+    "buffalo_s": {"pack": "buffalo_s", "modules": ["detection", "recognition"]}
+}
+
+
+def adaptive_det_size(height, width, max_side):
+    """
+    Detection input size for an image: longest side capped at max_side,
+    aspect ratio kept, both sides rounded up to a multiple of 32.
+
+    Returns:
+        (width, height)
+    """
+    scale = min(1.0, max_side / float(max(height, width)))
+
+    def stride(x):
+        return max(32, int(np.ceil(x * scale / 32.0)) * 32)
+
+    return stride(width), stride(height)
 
 
 class FaceDetector:
 
-    def __init__(self):
+    def __init__(self, profile="buffalo_l", det_size=640, cascade=False,
+                 coarse_size=320, fine_size=256, roi_margin=0.5,
+                 intra_op_threads=None):
         """
         Initialize InsightFace model
+
+        Args:
+            profile (str): one of MODEL_PROFILES
+            det_size (int): longest detection side in single-pass mode
+            cascade (bool): use coarse → fine detection
+            coarse_size (int): longest side of the coarse pass
+            fine_size (int): longest side of the fine (face region) pass
+            roi_margin (float): padding around the coarse box, as a
+                fraction of the box size
+            intra_op_threads (int): fix ONNX Runtime threads per session
+                (None = ONNX Runtime default, one per core)
         """
+        if profile not in MODEL_PROFILES:
+            raise ValueError(
+                f"Unknown face model profile: {profile} "
+                f"(expected one of {', '.join(MODEL_PROFILES)})"
+            )
+
+        start = time.perf_counter()
+
+        self.profile = profile
         self.app = FaceAnalysis(
-            name="buffalo_l",
+            name=MODEL_PROFILES[profile]["pack"],
+            allowed_modules=MODEL_PROFILES[profile]["modules"],
             providers=["CPUExecutionProvider"]
         )
 
-        self.app.prepare(ctx_id=0, det_size=(640, 640))
+        self.app.prepare(ctx_id=0, det_size=(det_size, det_size))
+
+        if intra_op_threads:
+            self._pin_threads(intra_op_threads)
+
+        self.startup_seconds = time.perf_counter() - start
+        print(f"🤖 Face model profile '{profile}' loaded "
+              f"({', '.join(self.app.models)}) in {self.startup_seconds:.2f}s")
+
+        self.det_size = det_size
+        self.cascade = cascade
+        self.coarse_size = coarse_size
+        self.fine_size = fine_size
+        self.roi_margin = roi_margin
+
+    def _pin_threads(self, threads):
+        """
+        Recreate every ONNX session with a fixed thread count.
+        FaceAnalysis does not accept SessionOptions directly.
+        """
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+
+        for model in self.app.models.values():
+            model.session = onnxruntime.InferenceSession(
+                model.model_file,
+                sess_options=options,
+                providers=["CPUExecutionProvider"]
+            )
 
     def detect_single_face(self, image_bgr):
         """
@@ -41,7 +144,162 @@ class FaceDetector:
             face_object (InsightFace face)
         """
 
-        faces = self.app.get(image_bgr)
+        return self.detect_batch([image_bgr])[0]
+
+    def detect_batch(self, images_bgr, embed=True):
+        """
+        detect_single_face for many images at once.
+
+        Detection runs per image (the buffalo_l detector is exported
+        with a fixed batch of 1). ArcFace runs once for every accepted
+        face in the batch, and only for accepted faces.
+
+        Args:
+            images_bgr: list of images
+            embed: run ArcFace on the accepted faces — one bool for the
+                whole batch, or one per image (False = locate only)
+
+        Returns:
+            list of (face_image, face_object) / (None, reason)
+        """
+        results = [self.locate_single_face(image_bgr) for image_bgr in images_bgr]
+
+        if isinstance(embed, bool):
+            embed = [embed] * len(images_bgr)
+
+        self.embed_faces([
+            (image_bgr, result[1])
+            for image_bgr, result, wanted in zip(images_bgr, results, embed)
+            if wanted and result[0] is not None
+        ])
+
+        return results
+
+    def locate_faces(self, images_bgr):
+        """
+        locate_single_face for many images (no recognition).
+        """
+        return self.detect_batch(images_bgr, embed=False)
+
+    def locate_single_face(self, image_bgr):
+        """
+        detect_single_face without recognition: the returned face has
+        no embedding until it is passed to embed_faces().
+        """
+        faces = self.detect_faces(image_bgr)
+        result = self._select_single_face(image_bgr, faces)
+
+        if result[0] is not None:
+            for taskname, model in self.app.models.items():
+                if taskname in ("detection", "recognition"):
+                    continue
+                model.get(image_bgr, result[1])
+
+        return result
+
+    def embed_faces(self, pairs):
+        """
+        Run ArcFace once for a list of (image, face) pairs.
+        Sets face.embedding on each face.
+        """
+        rec_model = self.app.models.get("recognition")
+
+        if not pairs or rec_model is None:
+            return
+
+        aligned = [
+            face_align.norm_crop(image_bgr, landmark=face.kps, image_size=rec_model.input_size[0])
+            for image_bgr, face in pairs
+        ]
+        embeddings = rec_model.get_feat(aligned)
+
+        for (_, face), embedding in zip(pairs, embeddings):
+            face.embedding = embedding.flatten()
+
+    def detect_faces(self, image_bgr):
+        """
+        Bounding boxes + landmarks only (no recognition).
+
+        Returns:
+            list of InsightFace faces in original-image coordinates
+        """
+        if not self.cascade:
+            return self._run_detector(image_bgr, self.det_size)
+
+        h, w = image_bgr.shape[:2]
+        scale = min(1.0, self.coarse_size / float(max(h, w)))
+
+        if scale < 1.0:
+            small = cv2.resize(image_bgr, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        else:
+            small = image_bgr
+
+        faces = self._run_detector(small, self.coarse_size)
+
+        for face in faces:
+            face.bbox = face.bbox / scale
+            if face.kps is not None:
+                face.kps = face.kps / scale
+
+        # Only the single-face case needs precise landmarks
+        if len(faces) == 1:
+            self._refine(image_bgr, faces[0])
+
+        return faces
+
+    def _refine(self, image_bgr, face):
+        """
+        Re-detect inside the face region at original resolution.
+        Keeps the coarse result if the fine pass finds nothing.
+        """
+        h, w = image_bgr.shape[:2]
+        x1, y1, x2, y2 = face.bbox
+        pad_x = (x2 - x1) * self.roi_margin
+        pad_y = (y2 - y1) * self.roi_margin
+
+        rx1 = int(max(0, x1 - pad_x))
+        ry1 = int(max(0, y1 - pad_y))
+        rx2 = int(min(w, x2 + pad_x))
+        ry2 = int(min(h, y2 + pad_y))
+
+        roi = image_bgr[ry1:ry2, rx1:rx2]
+        if roi.size == 0:
+            return
+
+        fine = self._run_detector(roi, self.fine_size)
+        if not fine:
+            return
+
+        offset = np.array([rx1, ry1], dtype=np.float32)
+        face.bbox = fine[0].bbox + np.tile(offset, 2)
+        face.det_score = fine[0].det_score
+        if fine[0].kps is not None:
+            face.kps = fine[0].kps + offset
+
+    def _run_detector(self, image_bgr, max_side):
+        h, w = image_bgr.shape[:2]
+        input_size = adaptive_det_size(h, w, max_side)
+
+        bboxes, kpss = self.app.det_model.detect(
+            image_bgr,
+            input_size=input_size,
+            max_num=0,
+            metric="default"
+        )
+
+        return [
+            Face(
+                bbox=bboxes[i, 0:4],
+                kps=kpss[i] if kpss is not None else None,
+                det_score=bboxes[i, 4]
+            )
+            for i in range(bboxes.shape[0])
+        ]
+
+    def _select_single_face(self, image_bgr, faces):
+        """
+        Apply the single-face rules to a list of detections.
+        """
 
         # ❌ No face
         if len(faces) == 0:
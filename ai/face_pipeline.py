@@ -0,0 +1,314 @@
+"""
+face_pipeline.py
+------------------
+
+Purpose:
+• The registration image pipeline in one place:
+  decode → detect → quality → embedding
+• Multi-frame bursts: locate and quality-score every frame in one
+  batch, embed only the best N and store their quality-weighted mean
+  embedding
+• Used in-process by the portal and inside inference pool workers
+• Every result carries per-stage timings (seconds) and, for
+  rejections, reason codes, for the portal's /metrics
+
+Results are plain dicts holding only strings, numbers and numpy
+arrays, so they can be sent back from a worker process.
+
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from ai.face_embedding import get_embedding
+from ai.face_quality import evaluate_face_quality, evaluate_quality_batch, quality_result
+
+
+def rejected(message, status=400, reasons=("rejected",)):
+    return {
+        "passed": False,
+        "status": status,
+        "message": message,
+        "reasons": list(reasons)
+    }
+
+
+def detection_rejected(reason):
+    """
+    Rejection for a FaceDetector reason string ("No face detected", ...).
+    """
+    text = reason.lower()
+    if "multiple" in text:
+        code = "multiple_faces"
+    elif "no face" in text:
+        code = "no_face"
+    elif "too far" in text:
+        code = "too_far"
+    else:
+        code = "detection"
+
+    return rejected(f"{reason}. Please try again with your face clearly visible.", reasons=[code])
+
+
+def add_time(timings, stage, start):
+    """
+    Add the time since start (perf_counter) to timings[stage].
+    """
+    timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+# JPEG start-of-frame markers (hold the image size)
+JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# cv2 flags that let libjpeg decode straight to a smaller size
+REDUCED_DECODE = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2)
+]
+
+
+def jpeg_size(buf):
+    """
+    Read (width, height) from a JPEG header without decoding it.
+    Returns None for anything that is not a readable JPEG.
+    """
+    buf = memoryview(buf)
+
+    if len(buf) < 4 or buf[0] != 0xFF or buf[1] != 0xD8:
+        return None
+
+    i = 2
+    while i + 9 < len(buf):
+        if buf[i] != 0xFF:
+            return None
+
+        marker = buf[i + 1]
+        length = (buf[i + 2] << 8) | buf[i + 3]
+
+        if marker in JPEG_SOF:
+            height = (buf[i + 5] << 8) | buf[i + 6]
+            width = (buf[i + 7] << 8) | buf[i + 8]
+            return width, height
+
+        i += 2 + length
+
+    return None
+
+
+def decode_flags(nparr, max_side):
+    """
+    Pick the cheapest IMREAD flag that keeps the longest side
+    at or above max_side.
+    """
+    if max_side:
+        size = jpeg_size(nparr)
+        if size is not None:
+            for factor, flag in REDUCED_DECODE:
+                if max(size) // factor >= max_side:
+                    return flag
+
+    return cv2.IMREAD_COLOR
+
+
+def decode_image(img_bytes, max_side=0):
+    """
+    Decode JPEG/PNG bytes.
+
+    Args:
+        img_bytes: bytes / bytearray / memoryview (not copied)
+        max_side (int): decode large JPEGs at a reduced scale, keeping
+            the longest side >= max_side (0 = always full size)
+
+    Returns:
+        frame (numpy array) / None
+        error message / None
+    """
+    if img_bytes is None or len(img_bytes) == 0:
+        return None, "Empty image data received"
+
+    nparr = np.frombuffer(img_bytes, np.uint8)
+    frame = cv2.imdecode(nparr, decode_flags(nparr, max_side))
+
+    if frame is None or frame.size == 0:
+        return None, "Failed to decode image. Please try again."
+
+    return frame, None
+
+
+def process_frame(detector, frame, timings=None):
+    """
+    Detect one face, check its quality and embed it.
+
+    Returns:
+        {
+            passed: bool,
+            status: int (HTTP status for rejections),
+            message: str,
+            reasons: list[str] (rejection reason codes),
+            embedding: float32 array (when passed),
+            quality: dict (when a face was found),
+            timings: {stage: seconds}
+        }
+    """
+    timings = {} if timings is None else timings
+
+    start = time.perf_counter()
+    face_img, face = detector.detect_single_face(frame)
+    add_time(timings, "detect", start)
+
+    if face_img is None:
+        # detect_single_face returns the reason in place of the face
+        result = detection_rejected(face)
+
+    elif face_img.size == 0:
+        result = rejected(
+            "Detected face crop is invalid/empty. Try better lighting or positioning.",
+            reasons=["invalid_crop"]
+        )
+
+    else:
+        start = time.perf_counter()
+        quality = evaluate_face_quality(face_img, frame_shape=frame.shape)
+        add_time(timings, "quality", start)
+
+        if not quality["passed"]:
+            result = quality_rejection(quality)
+        else:
+            start = time.perf_counter()
+            embedding = get_embedding(face)
+            add_time(timings, "embed", start)
+
+            result = {
+                "passed": True,
+                "status": 200,
+                "message": "",
+                "embedding": embedding,
+                "quality": quality
+            }
+
+    result["timings"] = timings
+    return result
+
+
+def quality_rejection(quality):
+    message = f"Face quality too low (score: {quality['score']:.2f})."
+    if quality["reasons"]:
+        message += " " + "; ".join(quality["reasons"])
+    else:
+        message += " Ensure good lighting, steady hold, and centered face."
+
+    result = rejected(message, reasons=quality["reason_codes"] or ["low_score"])
+    result["quality"] = quality
+    return result
+
+
+def process_frames(detector, frames_bytes, top_n=3, max_side=0):
+    """
+    Register from a burst of frames.
+
+    Every frame is decoded, then all of them are located in one
+    detector call (one micro-batch with an InferenceScheduler) and
+    quality-scored in one evaluate_quality_batch call, without running
+    recognition. The top_n passing frames by quality score are embedded
+    with a single ArcFace call and their embeddings averaged, weighted
+    by quality score.
+
+    Returns:
+        process_frame-style dict, plus frames_scored / frames_used.
+        When no frame passes, the best-scoring frame's rejection.
+    """
+    rejections = []
+    frames = []
+    timings = {}
+
+    start = time.perf_counter()
+    for img_bytes in frames_bytes:
+        frame, error = decode_image(img_bytes, max_side)
+        if frame is None:
+            rejections.append(rejected(error, reasons=["decode_failed"]))
+        else:
+            frames.append(frame)
+    add_time(timings, "decode", start)
+
+    start = time.perf_counter()
+    located = detector.locate_faces(frames) if frames else []
+    add_time(timings, "detect", start)
+
+    found = []
+    for frame, (face_img, face) in zip(frames, located):
+        if face_img is None:
+            rejections.append(detection_rejected(face))
+        else:
+            found.append((face_img, frame, face))
+
+    start = time.perf_counter()
+    rows = evaluate_quality_batch(
+        [face_img for face_img, _, _ in found],
+        [frame.shape for _, frame, _ in found]
+    )
+    add_time(timings, "quality", start)
+
+    good = []
+    for row, (_, frame, face) in zip(rows, found):
+        quality = quality_result(row)
+        if quality["passed"]:
+            good.append((quality, frame, face))
+        else:
+            rejections.append(quality_rejection(quality))
+
+    scored = len(frames_bytes)
+
+    if not good:
+        best_rejection = max(
+            rejections,
+            key=lambda r: r.get("quality", {}).get("score", -1),
+            default=None
+        ) or rejected("No image provided", reasons=["no_image"])
+        best_rejection["frames_scored"] = scored
+        best_rejection["timings"] = timings
+        return best_rejection
+
+    good.sort(key=lambda g: g[0]["score"], reverse=True)
+    good = good[:top_n]
+
+    start = time.perf_counter()
+    detector.embed_faces([(frame, face) for _, frame, face in good])
+
+    embeddings = np.stack([get_embedding(face) for _, _, face in good])
+    weights = np.array([max(q["score"], 1e-3) for q, _, _ in good], dtype="float32")
+
+    embedding = (embeddings * weights[:, None]).sum(axis=0)
+    embedding /= np.linalg.norm(embedding)
+    add_time(timings, "embed", start)
+
+    return {
+        "passed": True,
+        "status": 200,
+        "message": "",
+        "embedding": embedding.astype("float32"),
+        "quality": good[0][0],
+        "frames_scored": scored,
+        "frames_used": len(good),
+        "timings": timings
+    }
+
+
+def process_image(detector, img_bytes, max_side=0):
+    """
+    decode_image + process_frame.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    frame, error = decode_image(img_bytes, max_side)
+    add_time(timings, "decode", start)
+
+    if frame is None:
+        result = rejected(error, reasons=["decode_failed"])
+        result["timings"] = timings
+        return result
+
+    return process_frame(detector, frame, timings)
@@ -2,85 +2,235 @@
 # ======================================================
 # FACE QUALITY VALIDATION ENGINE — PRODUCTION
 # ======================================================
+#
+# Blur is scored per crop, in a loop, at the crop's native resolution
+# (downscaling sharpens it: a blurred 400px crop scores ~100x higher at
+# 112px). For the other image metrics every crop is converted to
+# grayscale and resized to a fixed QUALITY_SIZE × QUALITY_SIZE (the
+# ArcFace input size) and the stack is scored in one numpy pass:
+#
+#   blur        → variance of the Laplacian (native resolution)
+#   brightness  → mean gray level (0–255)
+#   dark/bright → fraction of under / over-exposed pixels (histogram tails)
+#   area_ratio  → face area / full frame area
+#   face_size   → shorter side of the original crop in pixels
+#
+# Thresholds come from config.yaml (face_recognition) via configure().
 
 import cv2
 import numpy as np
 
 
-def evaluate_face_quality(face_img, landmarks=None):
+QUALITY_SIZE = 112
+
+DEFAULT_THRESHOLDS = {
+    "blur_threshold": 100,
+    "brightness_min": 80,
+    "brightness_max": 200,
+    "max_clipped": 0.5,
+    "minimum_face_size": 80,
+    "minimum_face_ratio": 0.04,
+    "ideal_face_ratio": 0.15
+}
+
+QUALITY_DTYPE = np.dtype([
+    ("blur", "f4"),
+    ("brightness", "f4"),
+    ("dark", "f4"),
+    ("bright", "f4"),
+    ("area_ratio", "f4"),
+    ("face_size", "i4"),
+    ("score", "f4"),
+    ("passed", "?")
+])
+
+# BGR → gray weights (same as cv2.COLOR_BGR2GRAY)
+GRAY_WEIGHTS = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+
+_thresholds = dict(DEFAULT_THRESHOLDS)
+
+
+def configure(config=None, **overrides):
     """
-    Returns:
-        {
-            passed: bool,
-            score: float (0–1),
-            blur: float,
-            brightness: float,
-            area_ratio: float,
-            reasons: list[str]
-        }
+    Set process-wide thresholds from the face_recognition section
+    of config.yaml. Unknown keys are ignored.
     """
+    global _thresholds
 
-    reasons = []
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for key, value in (config or {}).items():
+        if key in thresholds and value is not None:
+            thresholds[key] = value
+    thresholds.update(overrides)
 
-    # --------------------------------------------------
-    # Preprocessing
-    # --------------------------------------------------
-    gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    _thresholds = thresholds
+    return thresholds
+
+
+def _stack_gray(face_imgs, size):
+    stack = np.empty((len(face_imgs), size, size, 3), dtype=np.uint8)
 
-    h, w = gray.shape
-    img_h, img_w = face_img.shape[:2]
+    for i, img in enumerate(face_imgs):
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        stack[i] = cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA)
+
+    return stack.astype(np.float32) @ GRAY_WEIGHTS
+
+
+def laplacian_variance(img):
+    """
+    Sharpness of one crop at its native resolution (blur_threshold
+    is calibrated on this scale).
+    """
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.Laplacian(img, cv2.CV_64F).var()
+
+
+def evaluate_quality_batch(face_imgs, frame_shapes=None, thresholds=None, size=QUALITY_SIZE):
+    """
+    Score many face crops at once.
+
+    Args:
+        face_imgs: list of BGR crops (any sizes)
+        frame_shapes: (h, w) of the frame each crop came from — one per
+            crop, or a single shape shared by all. None → crop is the frame.
+        thresholds: overrides for configure()'d thresholds
+
+    Returns:
+        numpy structured array (QUALITY_DTYPE), one row per crop
+    """
+    t = dict(_thresholds, **(thresholds or {}))
+    n = len(face_imgs)
+    metrics = np.zeros(n, dtype=QUALITY_DTYPE)
+
+    if n == 0:
+        return metrics
 
     # --------------------------------------------------
-    # Metrics
+    # Image metrics (blur per crop, the rest over the 112px stack)
     # --------------------------------------------------
-    blur = cv2.Laplacian(gray, cv2.CV_64F).var()
-    brightness = np.mean(gray)
+    gray = _stack_gray(face_imgs, size)
 
-    face_area = h * w
-    full_area = img_h * img_w
-    area_ratio = face_area / full_area
+    metrics["blur"] = [laplacian_variance(img) for img in face_imgs]
+    metrics["brightness"] = gray.reshape(n, -1).mean(axis=1)
+    metrics["dark"] = (gray < 26).reshape(n, -1).mean(axis=1)
+    metrics["bright"] = (gray > 229).reshape(n, -1).mean(axis=1)
 
     # --------------------------------------------------
-    # Threshold rules
+    # Face size / face-to-frame ratio
     # --------------------------------------------------
-    if blur < 100:
-        reasons.append("Image blurry — hold camera steady")
+    crop_hw = np.array([img.shape[:2] for img in face_imgs], dtype=np.float32)
 
-    if brightness < 80:
-        reasons.append("Image too dark — increase lighting")
+    if frame_shapes is None:
+        frame_hw = crop_hw
+    else:
+        frame_hw = np.array(frame_shapes, dtype=np.float32)[..., :2].reshape(-1, 2)
+        frame_hw = np.broadcast_to(frame_hw, crop_hw.shape)
 
-    if brightness > 200:
-        reasons.append("Image too bright — reduce light")
-
-    if area_ratio < 0.35:
-        reasons.append("Face too far — move closer to camera")
+    metrics["face_size"] = crop_hw.min(axis=1)
+    metrics["area_ratio"] = crop_hw.prod(axis=1) / frame_hw.prod(axis=1)
 
     # --------------------------------------------------
-    # Overall pass/fail
+    # Threshold rules
     # --------------------------------------------------
-    passed = (
-        blur >= 100
-        and 80 <= brightness <= 200
-        and area_ratio >= 0.35
+    metrics["passed"] = (
+        (metrics["blur"] >= t["blur_threshold"]) &
+        (metrics["brightness"] >= t["brightness_min"]) &
+        (metrics["brightness"] <= t["brightness_max"]) &
+        (metrics["dark"] + metrics["bright"] <= t["max_clipped"]) &
+        (metrics["face_size"] >= t["minimum_face_size"]) &
+        (metrics["area_ratio"] >= t["minimum_face_ratio"])
     )
 
     # --------------------------------------------------
     # Quality score (0.0 → 1.0)
     # --------------------------------------------------
     score = (
-        min(blur / 300, 1.0) * 0.4 +
-        (1 - abs(brightness - 130) / 130) * 0.3 +
-        min(area_ratio / 0.5, 1.0) * 0.3
+        np.minimum(metrics["blur"] / (3 * t["blur_threshold"]), 1.0) * 0.4 +
+        (1 - np.abs(metrics["brightness"] - 130) / 130) * 0.3 +
+        np.minimum(metrics["area_ratio"] / t["ideal_face_ratio"], 1.0) * 0.3
     )
+    metrics["score"] = np.clip(score, 0.0, 1.0)
 
-    score = round(max(min(score, 1.0), 0.0), 3)
+    return metrics
+
+
+# Rejection reason codes (metrics) → message shown to the user
+REASON_MESSAGES = {
+    "blur": "Image blurry — hold camera steady",
+    "dark": "Image too dark — increase lighting",
+    "bright": "Image too bright — reduce light",
+    "uneven_light": "Uneven lighting — avoid strong backlight or shadows",
+    "too_far": "Face too far — move closer to camera"
+}
+
+
+def quality_reason_codes(row, thresholds=None):
+    """
+    Rejection reason codes (REASON_MESSAGES keys) for one row of
+    evaluate_quality_batch.
+    """
+    t = dict(_thresholds, **(thresholds or {}))
+    codes = []
+
+    if row["blur"] < t["blur_threshold"]:
+        codes.append("blur")
+
+    if row["brightness"] < t["brightness_min"]:
+        codes.append("dark")
+
+    if row["brightness"] > t["brightness_max"]:
+        codes.append("bright")
+
+    if row["dark"] + row["bright"] > t["max_clipped"]:
+        codes.append("uneven_light")
+
+    if row["face_size"] < t["minimum_face_size"] or row["area_ratio"] < t["minimum_face_ratio"]:
+        codes.append("too_far")
+
+    return codes
+
+
+def quality_reasons(row, thresholds=None):
+    """
+    Human-readable rejection reasons for one row of evaluate_quality_batch.
+    """
+    return [REASON_MESSAGES[code] for code in quality_reason_codes(row, thresholds)]
+
+
+def evaluate_face_quality(face_img, landmarks=None, frame_shape=None, thresholds=None):
+    """
+    Returns:
+        {
+            passed: bool,
+            score: float (0–1),
+            blur: float,
+            brightness: float,
+            exposure: float (fraction of clipped pixels),
+            area_ratio: float (face / frame),
+            reasons: list[str],
+            reason_codes: list[str] (REASON_MESSAGES keys)
+        }
+    """
+    row = evaluate_quality_batch([face_img], frame_shape and [frame_shape], thresholds)[0]
+    return quality_result(row, thresholds)
+
+
+def quality_result(row, thresholds=None):
+    """
+    evaluate_face_quality's dict for one row of evaluate_quality_batch.
+    """
+    codes = quality_reason_codes(row, thresholds)
 
-    # --------------------------------------------------
     return {
-        "passed": passed,
-        "score": score,
-        "blur": round(blur, 2),
-        "brightness": round(brightness, 2),
-        "area_ratio": round(area_ratio, 3),
-        "reasons": reasons
+        "passed": bool(row["passed"]),
+        "score": round(float(row["score"]), 3),
+        "blur": round(float(row["blur"]), 2),
+        "brightness": round(float(row["brightness"]), 2),
+        "exposure": round(float(row["dark"] + row["bright"]), 3),
+        "area_ratio": round(float(row["area_ratio"]), 3),
+        "reasons": [REASON_MESSAGES[code] for code in codes],
+        "reason_codes": codes
     }
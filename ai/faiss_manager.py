@@ -1,54 +1,926 @@
+"""
+faiss_manager.py
+------------------
+
+Purpose:
+• Store facial embeddings in a FAISS index keyed by member_id (int64)
+• Add, re-enroll (update) and remove members in place
+• Make every registration durable with one small append
+• Switch from brute force to an ANN index as the gallery grows
+• Stream the gallery out for backup and rebuild it from a backup
+
+Index tiers (faiss.index_type):
+• Flat     → exact brute-force inner product
+• IVFFlat  → inverted lists, exact vectors
+• IVFPQ    → inverted lists, product-quantised vectors
+• HNSW     → graph index
+• SQ8      → 8-bit scalar-quantised brute force
+
+Vector precision (faiss.precision), for Flat / IVFFlat / HNSW:
+• fp32 → 2 KB per 512-d face, exact
+• fp16 → 1 KB per face, no training
+• sq8  → 512 B per face (8-bit scalar quantiser, trained)
+• pq   → pq_m bytes per face (product quantiser, trained)
+IVFPQ and SQ8 imply pq / sq8. benchmarks/precision_eval.py measures
+what each costs in match rate at recognition_threshold.
+
+Every gallery starts as Flat (fp16 when a compressed precision is
+configured, fp32 otherwise). Once it holds migrate_threshold faces it
+is rebuilt into the configured type and precision by the background
+snapshot thread.
+
+Member IDs are the FAISS labels themselves (IndexIDMap2, or the native
+id lists of IVF indexes), so there is no separate position → member map.
+HNSW graphs cannot delete in place; removing from one rebuilds it.
+
+Persistence:
+• Snapshot   → faiss.index + faiss_meta.json manifest (background)
+• Journal    → faiss.index.journal (append-only, fsync'd per change)
+
+A FaissManager owns its files: it is for one process. Galleries opened
+by several processes (gunicorn workers, attendance, sync) use
+SharedFaissManager instead (faiss.shared, ai/shared_gallery.py).
+
+On startup the snapshot is loaded and any journal records that are
+newer than it are replayed. Replay is idempotent (add = upsert), so a
+crash between writing the index and the manifest is harmless. A torn
+record at the end of the journal (crash mid-write) is discarded.
+
+"""
+
 import faiss
+import math
 import os
 import json
+import struct
+import threading
+import zlib
 import numpy as np
 
+
+# Journal file magic + record header: crc32, op, seq, member_id
+JOURNAL_MAGIC = b"FAISSJ02"
+RECORD_HEADER = struct.Struct("<IBQq")
+
+OP_ADD = 1
+OP_REMOVE = 2
+
+MANIFEST_VERSION = 2
+
+# Aliases accepted in config.yaml → canonical index type
+INDEX_TYPES = {
+    "flat": "Flat",
+    "flatip": "Flat",
+    "flatl2": "Flat",
+    "ivfflat": "IVFFlat",
+    "ivfpq": "IVFPQ",
+    "hnsw": "HNSW",
+    "sq8": "SQ8"
+}
+
+
+def resolve_index_type(index_type):
+    """
+    Normalise a configured index type name.
+    """
+    key = str(index_type or "Flat").replace("_", "").replace("-", "").lower()
+
+    if key not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type: {index_type}")
+
+    return INDEX_TYPES[key]
+
+
+PRECISIONS = ["fp32", "fp16", "sq8", "pq"]
+
+
+def resolve_layout(index_type, precision="fp32"):
+    """
+    Canonical (index type, precision) pair.
+    IVFFlat + pq is IVFPQ, Flat + sq8 is SQ8.
+    """
+    index_type = resolve_index_type(index_type)
+    precision = str(precision or "fp32").lower()
+
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown FAISS precision: {precision}")
+
+    if index_type == "IVFPQ" or (index_type == "IVFFlat" and precision == "pq"):
+        return "IVFPQ", "pq"
+    if index_type == "SQ8" or (index_type == "Flat" and precision == "sq8"):
+        return "SQ8", "sq8"
+
+    return index_type, precision
+
+
+def auto_nlist(ntotal):
+    """
+    IVF list count: ~4·sqrt(N), with at least 39 training points per list.
+    """
+    nlist = int(4 * math.sqrt(max(ntotal, 1)))
+    nlist = min(nlist, max(ntotal // 39, 1))
+    return max(1, min(nlist, 65536))
+
+
+def build_index(index_type, dim, ntotal=0, nlist=0, pq_m=64, hnsw_m=32, precision="fp32"):
+    """
+    Create an empty inner-product index of the given type and precision.
+    IVF / PQ / SQ8 indexes still need train() before add().
+    """
+    index_type, precision = resolve_layout(index_type, precision)
+    nlist = nlist or auto_nlist(ntotal)
+
+    storage = {
+        "fp32": "Flat",
+        "fp16": "SQfp16",
+        "sq8": "SQ8",
+        "pq": f"PQ{pq_m}"
+    }[precision]
+
+    factory = {
+        "Flat": storage,
+        "IVFFlat": f"IVF{nlist},{storage}",
+        "IVFPQ": f"IVF{nlist},PQ{pq_m}",
+        "HNSW": f"HNSW{hnsw_m}" if precision == "fp32" else f"HNSW{hnsw_m},{storage}",
+        "SQ8": "SQ8"
+    }[index_type]
+
+    return faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+
+
+def wrap_index(index):
+    """
+    Key an index by member_id.
+    IVF indexes store ids natively; everything else gets an IndexIDMap2.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+
+    if ivf is not None:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+
+    return faiss.IndexIDMap2(index)
+
+
+def base_index(index):
+    """
+    The index doing the actual search (unwrapped from IndexIDMap2).
+    """
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def gallery_ids(index):
+    """
+    Every member_id stored in the index (int64 array).
+    """
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.vector_to_array(index.id_map).astype("int64")
+
+    invlists = faiss.try_extract_index_ivf(index).invlists
+    return np.concatenate([np.zeros(0, dtype="int64")] + [
+        faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+        for l in range(invlists.nlist)
+        if invlists.list_size(l) > 0
+    ])
+
+
+def export_gallery(index):
+    """
+    Returns:
+        member_ids (int64 array)
+        embeddings (float32 array, one row per member)
+    """
+    member_ids = gallery_ids(index)
+
+    if isinstance(index, faiss.IndexIDMap2):
+        vectors = base_index(index).reconstruct_n(0, index.ntotal)
+        return member_ids, vectors
+
+    vectors = np.vstack(
+        [np.zeros((0, index.d), dtype="float32")] +
+        [index.reconstruct(int(i)).reshape(1, -1) for i in member_ids]
+    )
+    return member_ids, vectors
+
+
+def index_precision(index):
+    """
+    Vector precision of an index (see PRECISIONS).
+    """
+    index = base_index(index)
+
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "fp32"
+
+
+def trained_copy(index):
+    """
+    An empty index with the same training (IVF centroids, PQ codebooks,
+    SQ ranges), so a rebuild can skip train(). None when there is no
+    training to keep (Flat, fp16, HNSW).
+    """
+    base = base_index(index)
+    ivf = faiss.try_extract_index_ivf(base)
+
+    if ivf is None:
+        if isinstance(base, faiss.IndexPQ):
+            copy = faiss.IndexPQ(base.d, base.pq.M, base.pq.nbits, base.metric_type)
+            copy.pq = base.pq
+        elif isinstance(base, faiss.IndexScalarQuantizer) and base.sq.qtype != faiss.ScalarQuantizer.QT_fp16:
+            copy = faiss.IndexScalarQuantizer(base.d, base.sq.qtype, base.metric_type)
+            copy.sq = base.sq
+        else:
+            return None
+
+        copy.is_trained = True
+        return copy
+
+    quantizer = faiss.clone_index(ivf.quantizer)
+
+    if isinstance(ivf, faiss.IndexIVFPQ):
+        copy = faiss.IndexIVFPQ(quantizer, ivf.d, ivf.nlist, ivf.pq.M, ivf.pq.nbits, ivf.metric_type)
+        copy.pq = ivf.pq
+        copy.by_residual = ivf.by_residual
+        copy.use_precomputed_table = ivf.use_precomputed_table
+    elif isinstance(ivf, faiss.IndexIVFScalarQuantizer):
+        copy = faiss.IndexIVFScalarQuantizer(quantizer, ivf.d, ivf.nlist, ivf.sq.qtype, ivf.metric_type, ivf.by_residual)
+        copy.sq = ivf.sq
+    else:
+        copy = faiss.IndexIVFFlat(quantizer, ivf.d, ivf.nlist, ivf.metric_type)
+
+    copy.own_fields = True
+    quantizer.this.disown()
+    copy.is_trained = True
+
+    if isinstance(copy, faiss.IndexIVFPQ):
+        copy.precompute_table()
+
+    return copy
+
+
+def pack_record(op, seq, member_id, embedding=None):
+    """
+    One journal record: header (crc32, op, seq, member_id) + embedding.
+    """
+    payload = embedding.tobytes() if embedding is not None else b""
+    body = RECORD_HEADER.pack(0, op, seq, member_id)[4:] + payload
+    return struct.pack("<I", zlib.crc32(body)) + body
+
+
+def read_records(f, dim):
+    """
+    Read journal records from the current position of f.
+    Stops at the end of the file or at the first torn / corrupt record.
+
+    Yields:
+        (op, seq, member_id, embedding or None, end offset of the record)
+    """
+    payload_size = dim * 4
+
+    while True:
+        header = f.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+
+        crc, op, seq, member_id = RECORD_HEADER.unpack(header)
+        payload = f.read(payload_size) if op == OP_ADD else b""
+
+        if op not in (OP_ADD, OP_REMOVE) or len(payload) < (payload_size if op == OP_ADD else 0):
+            return
+
+        if zlib.crc32(header[4:] + payload) != crc:
+            return
+
+        embedding = np.frombuffer(payload, dtype="float32").reshape(1, -1) if op == OP_ADD else None
+        yield op, seq, member_id, embedding, f.tell()
+
+
+def set_search_params(index, nprobe=16, ef_search=64):
+    """
+    Apply query-time knobs to whichever ANN index is in use.
+    """
+    index = base_index(index)
+    params = faiss.ParameterSpace()
+
+    if faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe)
+
+    if "HNSW" in type(index).__name__:
+        params.set_index_parameter(index, "efSearch", ef_search)
+
+
 class FaissManager:
     def __init__(self,
                  index_path="database/faiss.index",
                  meta_path="database/faiss_meta.json",
-                 dim=512):
+                 dim=512,
+                 journal_path=None,
+                 snapshot_every=1000,
+                 snapshot_interval=60,
+                 index_type="Flat",
+                 migrate_threshold=50000,
+                 nlist=0,
+                 nprobe=16,
+                 pq_m=64,
+                 hnsw_m=32,
+                 ef_search=64,
+                 precision="fp32"):
 
         self.index_path = index_path
         self.meta_path = meta_path
+        self.journal_path = journal_path or index_path + ".journal"
         self.dim = dim
+        self.snapshot_every = snapshot_every
+
+        self.index_type, self.precision = resolve_layout(index_type, precision)
+
+        # Compressed precisions need training data → start as fp16
+        self.initial_precision = "fp32" if self.precision == "fp32" else "fp16"
+        self.migrate_threshold = migrate_threshold
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+
+        self.lock = threading.Lock()
+        self.snapshot_lock = threading.Lock()
+        self.pending = 0
+        self.seq = 0
+
+        # Changes made while migrate() / restore() build a new index
+        self._catchup = None
 
         os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self._open()
+
+        # Background snapshot + compaction
+        self._stop = threading.Event()
+        self._snapshot_thread = threading.Thread(
+            target=self._snapshot_loop,
+            args=(snapshot_interval,),
+            daemon=True
+        )
+        self._snapshot_thread.start()
+
+    @classmethod
+    def from_config(cls, faiss_config):
+        """
+        Build from the faiss section of config.yaml.
+        With shared: true every process opening the gallery maps one
+        snapshot instead (see ai/shared_gallery.py).
+        """
+        if faiss_config.get("shared", False) and cls is FaissManager:
+            from ai.shared_gallery import SharedFaissManager
+            cls = SharedFaissManager
 
-        if os.path.exists(index_path):
-            self.index = faiss.read_index(index_path)
+        return cls(
+            index_path=faiss_config.get("index_path", "database/faiss.index"),
+            meta_path=faiss_config.get("meta_path", "database/faiss_meta.json"),
+            dim=faiss_config.get("dimension", 512),
+            journal_path=faiss_config.get("journal_path"),
+            snapshot_every=faiss_config.get("snapshot_every", 1000),
+            snapshot_interval=faiss_config.get("snapshot_interval_seconds", 60),
+            index_type=faiss_config.get("index_type", "Flat"),
+            migrate_threshold=faiss_config.get("migrate_threshold", 50000),
+            nlist=faiss_config.get("nlist", 0),
+            nprobe=faiss_config.get("nprobe", 16),
+            pq_m=faiss_config.get("pq_m", 64),
+            hnsw_m=faiss_config.get("hnsw_m", 32),
+            ef_search=faiss_config.get("ef_search", 64),
+            precision=faiss_config.get("precision", "fp32")
+        )
+
+    def _open(self):
+        """
+        Load the snapshot and replay the journal on top of it.
+        """
+        manifest = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as f:
+                manifest = json.load(f)
+
+        if os.path.exists(self.index_path):
+            self.index = faiss.read_index(self.index_path)
         else:
-            self.index = faiss.IndexFlatIP(dim)
+            self.index = self._new_index("Flat", None, precision=self.initial_precision)
+
+        legacy = "version" not in manifest and isinstance(self.index, faiss.IndexFlat)
+        if legacy:
+            self._convert_legacy(manifest)
+            manifest = {}
+
+        set_search_params(self.index, self.nprobe, self.ef_search)
+
+        self.seq = manifest.get("journal_seq", 0)
+        self._replay_journal()
+        self.journal = open(self.journal_path, "ab")
+
+        if self.journal.tell() == 0:
+            self.journal.write(JOURNAL_MAGIC)
+            self.journal.flush()
+
+        if legacy:
+            self.save()
+
+    def _convert_legacy(self, meta):
+        """
+        Convert a positional IndexFlatIP + {"row": member_id} JSON map
+        into an index keyed by member_id.
+        """
+        print(f"🔁 Converting legacy FAISS gallery ({self.index.ntotal} faces) to member_id keys")
 
-        if os.path.exists(meta_path):
-            with open(meta_path, "r") as f:
-                self.meta = json.load(f)
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        member_ids = np.array(
+            [meta.get(str(i), -1) for i in range(len(vectors))],
+            dtype="int64"
+        )
+        keep = member_ids >= 0
+
+        # Keep only the latest face per member
+        _, last = np.unique(member_ids[::-1], return_index=True)
+        latest = np.zeros(len(member_ids), dtype=bool)
+        latest[len(member_ids) - 1 - last] = True
+        keep &= latest
+
+        self.index = wrap_index(faiss.IndexFlatIP(self.dim))
+        self.index.add_with_ids(vectors[keep], member_ids[keep])
+        self.pending += 1
+
+    # --------------------------------------------------
+    # Journal
+    # --------------------------------------------------
+    def _replay_journal(self):
+        """
+        Apply journal records that are newer than the snapshot.
+        Truncates the journal after the last valid record.
+        """
+        if not os.path.exists(self.journal_path):
+            return
+
+        size = os.path.getsize(self.journal_path)
+
+        with open(self.journal_path, "rb") as f:
+            if f.read(len(JOURNAL_MAGIC)) != JOURNAL_MAGIC:
+                if size > 0:
+                    print("⚠️  FAISS journal has an unknown format, moving it aside")
+                    os.replace(self.journal_path, self.journal_path + ".legacy")
+                return
+
+            valid_end = f.tell()
+
+            for op, seq, member_id, embedding, valid_end in read_records(f, self.dim):
+                if seq > self.seq:
+                    if op == OP_ADD:
+                        self._upsert(embedding, member_id)
+                    else:
+                        self._remove(member_id)
+
+                    self.seq = seq
+                    self.pending += 1
+
+        if valid_end < size:
+            print(f"⚠️  Discarding torn FAISS journal tail at byte {valid_end}")
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(valid_end)
+
+    def _append_journal(self, op, member_id, embedding=None):
+        self.seq += 1
+        self.journal.write(pack_record(op, self.seq, member_id, embedding))
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    # --------------------------------------------------
+    # Index mutation (caller holds self.lock)
+    # --------------------------------------------------
+    def _contains(self, member_id):
+        try:
+            self.index.reconstruct(int(member_id))
+            return True
+        except RuntimeError:
+            return False
+
+    def _upsert(self, embedding, member_id):
+        if self._contains(member_id):
+            self._remove(member_id)
+
+        self.index.add_with_ids(embedding, np.array([member_id], dtype="int64"))
+
+        if self._catchup is not None:
+            self._catchup.append((OP_ADD, member_id, embedding))
+
+    def _remove(self, member_id):
+        if not self._contains(member_id):
+            return False
+
+        if isinstance(base_index(self.index), faiss.IndexHNSW):
+            # HNSW graphs do not support deletion → rebuild without it
+            member_ids, vectors = export_gallery(self.index)
+            keep = member_ids != member_id
+
+            index = self._new_index(self.current_type(), vectors[keep], precision=self.current_precision())
+            index.add_with_ids(vectors[keep], member_ids[keep])
+            self.index = index
         else:
-            self.meta = {}
+            self.index.remove_ids(np.array([member_id], dtype="int64"))
 
+        if self._catchup is not None:
+            self._catchup.append((OP_REMOVE, member_id, None))
+
+        return True
+
+    def _new_index(self, index_type, training_vectors, ntotal=None, precision="fp32"):
+        index = wrap_index(build_index(
+            index_type, self.dim, ntotal or (len(training_vectors) if training_vectors is not None else 0),
+            nlist=self.nlist, pq_m=self.pq_m, hnsw_m=self.hnsw_m, precision=precision
+        ))
+        if not index.is_trained:
+            index.train(training_vectors)
+        set_search_params(index, self.nprobe, self.ef_search)
+        return index
+
+    # --------------------------------------------------
+    # Public API
+    # --------------------------------------------------
     def add(self, embedding, member_id):
+        """
+        Enroll a member's face. Replaces any face already stored
+        for that member (re-enrollment).
+        """
         embedding = np.array(embedding).astype("float32").reshape(1, -1)
         faiss.normalize_L2(embedding)
+        member_id = int(member_id)
+
+        with self.lock:
+            self._append_journal(OP_ADD, member_id, embedding)
+            self._upsert(embedding, member_id)
+            self.pending += 1
+
+    update = add
+
+    def remove(self, member_id):
+        """
+        Delete a member's face. Returns False if none was stored.
+        """
+        member_id = int(member_id)
+
+        with self.lock:
+            if not self._contains(member_id):
+                return False
+
+            self._append_journal(OP_REMOVE, member_id)
+            self._remove(member_id)
+            self.pending += 1
+            return True
+
+    def __contains__(self, member_id):
+        with self.lock:
+            return self._contains(member_id)
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def member_ids(self):
+        """
+        All enrolled member IDs as an int64 array.
+        """
+        with self.lock:
+            return gallery_ids(self.index)
+
+    def iter_gallery(self, chunk_size=50000):
+        """
+        Stream the gallery as (member_ids, embeddings) chunks.
+        The lock is only held while one chunk is copied out, so
+        registrations continue during a backup. Members removed
+        meanwhile are skipped.
+        """
+        member_ids = self.member_ids()
+
+        for start in range(0, len(member_ids), chunk_size):
+            ids = member_ids[start:start + chunk_size]
+
+            with self.lock:
+                try:
+                    vectors = self.index.reconstruct_batch(ids)
+                except RuntimeError:
+                    vectors = None
+
+            if vectors is None:
+                embeddings = self.get_embeddings(ids)
+                if not embeddings:
+                    continue
+                ids = np.fromiter(embeddings.keys(), dtype="int64", count=len(embeddings))
+                vectors = np.stack(list(embeddings.values()))
+
+            yield ids, vectors
+
+    def get_embeddings(self, member_ids):
+        """
+        Stored (normalised) embeddings for some members.
+
+        Returns:
+            {member_id: float32 vector} — members without a face are left out
+        """
+        embeddings = {}
+
+        with self.lock:
+            for member_id in member_ids:
+                try:
+                    embeddings[int(member_id)] = self.index.reconstruct(int(member_id))
+                except RuntimeError:
+                    continue
+
+        return embeddings
+
+    def current_type(self, index=None):
+        base = base_index(self.index if index is None else index)
+
+        if faiss.try_extract_index_ivf(base) is not None:
+            return "IVFPQ" if isinstance(base, faiss.IndexIVFPQ) else "IVFFlat"
+        if isinstance(base, faiss.IndexHNSW):
+            return "HNSW"
+        if isinstance(base, faiss.IndexScalarQuantizer) and base.sq.qtype != faiss.ScalarQuantizer.QT_fp16:
+            return "SQ8"
+        return "Flat"
+
+    def current_precision(self, index=None):
+        return index_precision(self.index if index is None else index)
+
+    def target_layout(self, index=None):
+        """
+        (index type, precision) the gallery should have at its size.
+        """
+        index = self.index if index is None else index
+
+        if index.ntotal >= self.migrate_threshold:
+            return self.index_type, self.precision
+        return "Flat", self.initial_precision
+
+    def needs_migration(self, index=None):
+        """
+        Flat galleries are rebuilt when they reach migrate_threshold, or
+        straight away when only the (training-free) precision changed.
+        ANN galleries are never rebuilt back.
+        """
+        index = self.index if index is None else index
+        current = (self.current_type(index), self.current_precision(index))
+
+        if current[0] not in ("Flat", "SQ8") or current == self.target_layout(index):
+            return False
 
-        self.index.add(embedding)
-        self.meta[str(self.index.ntotal - 1)] = member_id
+        return index.ntotal >= self.migrate_threshold or current[0] == "Flat"
+
+    def migrate(self):
+        """
+        Rebuild the flat gallery into the configured ANN index.
+        Registrations continue against the old index while training
+        and are replayed onto the new one before it is swapped in.
+        """
+        with self.snapshot_lock:
+            if not self.needs_migration():
+                return
+
+            with self.lock:
+                member_ids, vectors = export_gallery(self.index)
+                self._catchup = []
+
+            index_type, precision = self.target_layout()
+            print(f"🔁 Migrating FAISS gallery ({len(member_ids)} faces) to {index_type} / {precision}")
+
+            try:
+                index = self._new_index(index_type, vectors, precision=precision)
+                index.add_with_ids(vectors, member_ids)
+            except Exception:
+                with self.lock:
+                    self._catchup = None
+                raise
+
+            with self.lock:
+                catchup, self._catchup = self._catchup, None
+                self.index = index
+
+                for op, member_id, embedding in catchup:
+                    if op == OP_ADD:
+                        self._upsert(embedding, member_id)
+                    else:
+                        self._remove(member_id)
+
+                self.pending += 1
+
+            print(f"✅ FAISS gallery migrated to {index_type} / {precision}")
+
+        self.save()
+
+    def training_state(self):
+        """
+        Serialized trained_copy() of the current index, or None.
+        Lets restore() rebuild an IVF gallery without re-training.
+        """
+        with self.lock:
+            copy = trained_copy(self.index)
+
+        if copy is None:
+            return None
+        return faiss.serialize_index(copy).tobytes()
+
+    def restore(self, chunks, total=None, training_state=None):
+        """
+        Replace the gallery with (member_ids, embeddings) chunks, e.g.
+        cloud_backup.embedding_backup.read_backup(). Each chunk goes
+        into the new index with one add_with_ids call.
+
+        With a training_state (see training_state()) the chunks go
+        straight into that trained index. Otherwise the index is built
+        as index_type / precision when total reaches migrate_threshold
+        (trained on the first chunks), or as Flat.
+
+        The current gallery keeps serving until the new one is swapped
+        in, and registrations made meanwhile are replayed on top of it.
+
+        Returns:
+            number of faces restored
+        """
+        with self.snapshot_lock:
+            with self.lock:
+                self._catchup = []
+
+            try:
+                index, restored = self._build_restored(chunks, total, training_state)
+            except Exception:
+                with self.lock:
+                    self._catchup = None
+                raise
+
+            with self.lock:
+                catchup, self._catchup = self._catchup, None
+                self.index = index
+
+                for op, member_id, embedding in catchup:
+                    if op == OP_ADD:
+                        self._upsert(embedding, member_id)
+                    else:
+                        self._remove(member_id)
+
+                self.pending += 1
+
+        self.save()
+        return restored
+
+    def _build_restored(self, chunks, total, training_state):
+        """
+        Build a new index from restore() chunks.
+
+        Returns:
+            (index, number of faces added)
+        """
+        if total and total >= self.migrate_threshold:
+            index_type, precision = self.index_type, self.precision
+        else:
+            index_type, precision = "Flat", self.initial_precision
+
+        train_size = 1
+        if index_type in ("IVFFlat", "IVFPQ"):
+            train_size = min(total, max(39 * (self.nlist or auto_nlist(total)), 10000))
+        elif precision in ("sq8", "pq"):
+            train_size = min(total, 10000)
+
+        index = None
+        held = []
+        restored = 0
+
+        if training_state is not None:
+            index = wrap_index(faiss.deserialize_index(np.frombuffer(training_state, dtype="uint8")))
+            set_search_params(index, self.nprobe, self.ef_search)
+
+        for member_ids, vectors in chunks:
+            vectors = np.array(vectors, dtype="float32")
+            faiss.normalize_L2(vectors)
+            held.append((np.asarray(member_ids, dtype="int64"), vectors))
+
+            if index is None:
+                if sum(len(ids) for ids, _ in held) < train_size:
+                    continue
+                index = self._new_index(
+                    index_type, np.vstack([v for _, v in held]), ntotal=total, precision=precision
+                )
+
+            for ids, vecs in held:
+                index.add_with_ids(vecs, ids)
+                restored += len(ids)
+            held = []
+
+        if index is None:
+            # Fewer faces than expected → exact search
+            index = self._new_index("Flat", None, precision=self.initial_precision)
+            for ids, vecs in held:
+                index.add_with_ids(vecs, ids)
+                restored += len(ids)
+
+        return index, restored
 
     def save(self):
-        faiss.write_index(self.index, self.index_path)
-        with open(self.meta_path, "w") as f:
-            json.dump(self.meta, f)
+        """
+        Write a full snapshot and drop the journal records it covers.
+        Safe to call while registrations continue.
+        """
+        with self.snapshot_lock:
+            with self.lock:
+                if self.pending == 0 and os.path.exists(self.index_path):
+                    return
+
+                index_bytes = faiss.serialize_index(self.index)
+                manifest = {
+                    "version": MANIFEST_VERSION,
+                    "journal_seq": self.seq,
+                    "index_type": self.current_type(),
+                    "precision": self.current_precision(),
+                    "ntotal": self.index.ntotal
+                }
+                journal_offset = self.journal.tell()
+                self.pending = 0
+
+            # Index first: if we crash before the manifest is replaced,
+            # the older journal_seq just replays a few idempotent records.
+            # The serialized buffer is written as is: a .tobytes() copy
+            # would hold a third copy of the gallery in memory
+            self._write_atomic(self.index_path, index_bytes)
+            self._write_atomic(self.meta_path, json.dumps(manifest).encode())
+
+            with self.lock:
+                self._compact_journal(journal_offset)
+
+    def close(self):
+        self._stop.set()
+        self._snapshot_thread.join()
+        self.save()
+        self.journal.close()
 
     def search(self, embedding, top_k=1):
-        embedding = np.array(embedding).astype("float32").reshape(1, -1)
-        faiss.normalize_L2(embedding)
+        return self.search_batch([embedding], top_k)[0]
+
+    def search_batch(self, embeddings, top_k=1):
+        """
+        One index.search call for many query embeddings.
+
+        Returns:
+            one [(member_id, score), ...] list per query
+        """
+        queries = np.array(embeddings).astype("float32").reshape(len(embeddings), -1)
+        faiss.normalize_L2(queries)
 
-        distances, indices = self.index.search(embedding, top_k)
+        with self.lock:
+            distances, member_ids = self.index.search(queries, top_k)
 
         results = []
-        for i, score in zip(indices[0], distances[0]):
-            if i == -1:
-                continue
-            member_id = self.meta.get(str(i))
-            results.append((member_id, float(score)))
+        for ids, scores in zip(member_ids, distances):
+            results.append([
+                (int(member_id), float(score))
+                for member_id, score in zip(ids, scores)
+                if member_id != -1
+            ])
 
         return results
+
+    # --------------------------------------------------
+    # Snapshot helpers
+    # --------------------------------------------------
+    def _snapshot_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                if self.needs_migration():
+                    self.migrate()
+                elif self.pending >= self.snapshot_every:
+                    self.save()
+            except Exception as e:
+                print(f"❌ FAISS snapshot failed: {str(e)}")
+
+    def _compact_journal(self, offset):
+        """
+        Keep only the records appended after the snapshot was taken.
+        Caller must hold self.lock.
+        """
+        self.journal.close()
+
+        with open(self.journal_path, "rb") as f:
+            f.seek(offset)
+            tail = f.read()
+
+        self._write_atomic(self.journal_path, JOURNAL_MAGIC + tail)
+        self.journal = open(self.journal_path, "ab")
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
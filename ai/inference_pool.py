@@ -0,0 +1,144 @@
+"""
+inference_pool.py
+------------------
+
+Purpose:
+• Run the CPU-heavy registration pipeline (decode, detect, quality,
+  embed) in worker processes instead of Flask request threads
+• One FaceDetector (own ONNX sessions) per worker process
+• Fixed ONNX intra-op thread count per worker, optionally pinned to
+  its own CPU cores, so workers do not oversubscribe the machine
+
+Request handlers submit raw image bytes and wait on a Future. The
+result is the dict returned by face_pipeline.process_image.
+
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from ai.face_pipeline import process_frames, process_image
+from ai.face_quality import configure as configure_quality
+
+
+# Per-process state (set by _init_worker)
+_detector = None
+
+
+def _init_worker(detector_kwargs, quality_config, intra_op_threads, pin_cpus, slot_counter):
+    global _detector
+
+    with slot_counter.get_lock():
+        slot = slot_counter.value
+        slot_counter.value += 1
+
+    if pin_cpus and hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        first = (slot * intra_op_threads) % len(cpus)
+        cores = {cpus[(first + i) % len(cpus)] for i in range(intra_op_threads)}
+        os.sched_setaffinity(0, cores)
+
+    # Imported here so the parent process never loads the models
+    from ai.face_detector import FaceDetector
+
+    _detector = FaceDetector(intra_op_threads=intra_op_threads, **detector_kwargs)
+    configure_quality(quality_config)
+
+
+def _warmup():
+    return os.getpid()
+
+
+def _process(img_bytes, max_side):
+    return process_image(_detector, img_bytes, max_side)
+
+
+def _process_frames(frames_bytes, top_n, max_side):
+    return process_frames(_detector, frames_bytes, top_n, max_side)
+
+
+class InferencePool:
+
+    def __init__(self, workers=2, intra_op_threads=1, pin_cpus=True, detector_kwargs=None,
+                 quality_config=None):
+        """
+        Args:
+            workers (int): number of worker processes (0 = one per core)
+            intra_op_threads (int): ONNX Runtime threads per worker
+                (None = ONNX Runtime default)
+            pin_cpus (bool): bind each worker to its own cores (Linux);
+                needs intra_op_threads
+            detector_kwargs (dict): FaceDetector settings
+            quality_config (dict): face_quality thresholds (face_recognition config)
+        """
+        self.workers = workers or os.cpu_count() or 1
+
+        # Each worker is pinned to intra_op_threads cores: without a
+        # thread count there is no per-worker share to pin to
+        if pin_cpus and not intra_op_threads:
+            print("⚠️  pin_cpus needs intra_op_threads: workers are not pinned")
+            pin_cpus = False
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+        ctx = multiprocessing.get_context("spawn")
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(
+                detector_kwargs or {},
+                quality_config,
+                intra_op_threads,
+                pin_cpus,
+                ctx.Value("i", 0)
+            )
+        )
+
+        # Load the models now rather than on the first registration
+        warmups = [self.executor.submit(_warmup) for _ in range(self.workers)]
+        pids = {f.result() for f in warmups}
+        print(f"🧵 Inference pool ready: {len(pids)} worker(s), {intra_op_threads or 'default'} ONNX thread(s) each")
+
+    def submit(self, img_bytes, max_side=0):
+        """
+        Queue one image. Returns a Future of the pipeline result dict.
+        """
+        return self._submit(_process, img_bytes, max_side)
+
+    def submit_frames(self, frames_bytes, top_n=3, max_side=0):
+        """
+        Queue a burst of frames (face_pipeline.process_frames).
+        The whole burst runs in one worker.
+        """
+        return self._submit(_process_frames, list(frames_bytes), top_n, max_side)
+
+    def process(self, img_bytes, max_side=0, timeout=None):
+        return self.submit(img_bytes, max_side).result(timeout)
+
+    def process_frames(self, frames_bytes, top_n=3, max_side=0, timeout=None):
+        return self.submit_frames(frames_bytes, top_n, max_side).result(timeout)
+
+    def queue_depth(self):
+        """
+        Jobs submitted but not finished (running + waiting).
+        """
+        return self.inflight
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            self.inflight += 1
+
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future):
+        with self._lock:
+            self.inflight -= 1
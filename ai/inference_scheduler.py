@@ -0,0 +1,130 @@
+"""
+inference_scheduler.py
+------------------
+
+Purpose:
+• Collect face detection requests from concurrent Flask threads
+• Run them through FaceDetector.detect_batch as one batch
+• Hand each caller its own result through a Future
+• Multi-frame bursts queue every frame at once (locate only, no
+  recognition), so they share batches with other requests
+
+A batch is dispatched as soon as max_batch_size requests are waiting,
+or max_wait_ms after the first request arrived, whichever comes first.
+
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class InferenceScheduler:
+
+    def __init__(self, detector, max_batch_size=8, max_wait_ms=5):
+        """
+        Args:
+            detector (FaceDetector): owns the ONNX sessions
+            max_batch_size (int): largest batch sent to the models
+            max_wait_ms (float): how long the first request may wait
+        """
+        self.detector = detector
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.images = 0
+
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, image_bgr, embed=True):
+        """
+        Queue one image. Returns a Future resolving to the same value
+        FaceDetector.detect_single_face would return (locate_single_face
+        with embed=False).
+        """
+        future = Future()
+        self.queue.put((image_bgr, embed, future))
+        return future
+
+    def detect_single_face(self, image_bgr, timeout=None):
+        """
+        Drop-in replacement for FaceDetector.detect_single_face.
+        """
+        return self.submit(image_bgr).result(timeout)
+
+    def locate_faces(self, images_bgr, timeout=None):
+        """
+        Drop-in replacement for FaceDetector.locate_faces. All images
+        are queued before waiting, so they go out in the same batch.
+        """
+        futures = [self.submit(image_bgr, embed=False) for image_bgr in images_bgr]
+        return [future.result(timeout) for future in futures]
+
+    def locate_single_face(self, image_bgr, timeout=None):
+        return self.locate_faces([image_bgr], timeout)[0]
+
+    def embed_faces(self, pairs):
+        return self.detector.embed_faces(pairs)
+
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def close(self):
+        self._stop.set()
+        self._worker.join()
+
+    # --------------------------------------------------
+    # Worker thread
+    # --------------------------------------------------
+    def _collect(self):
+        try:
+            first = self.queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+
+            # Skip callers that gave up (cancelled futures)
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                results = self.detector.detect_batch(
+                    [img for img, _, _ in batch],
+                    embed=[embed for _, embed, _ in batch]
+                )
+            except Exception as e:
+                print(f"❌ Batched inference failed: {str(e)}")
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.images += len(batch)
+
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
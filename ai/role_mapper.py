@@ -62,6 +62,23 @@ def get_role_name(level):
     return level_map.get(level, "Member")
 
 
+def visit_type(member_branch_id, current_branch_id):
+    """
+    Classify an attendance as local or visitor.
+
+    A member attending a branch other than their own (including SOPs,
+    who have no branch) is a visitor.
+
+    Args:
+        member_branch_id (int): Member's home branch ID
+        current_branch_id (int): Branch where attendance was recorded
+
+    Returns:
+        str: "local" or "visitor" (attendance.visit_type)
+    """
+    return "visitor" if member_branch_id != current_branch_id else "local"
+
+
 def is_vip_visitor(level, member_branch_id, current_branch_id):
     """
     Check if a visitor should trigger VIP notification to branch pastor.
@@ -78,7 +95,7 @@ def is_vip_visitor(level, member_branch_id, current_branch_id):
     Returns:
         bool: True if VIP notification should be sent
     """
-    is_visitor = member_branch_id != current_branch_id
+    is_visitor = visit_type(member_branch_id, current_branch_id) == "visitor"
     is_high_level = level >= 3
     
     return is_visitor and is_high_level
@@ -0,0 +1,668 @@
+"""
+shared_gallery.py
+------------------
+
+Purpose:
+• One FAISS gallery for every process that opens it (gunicorn workers,
+  attendance, sync, backups) without each holding a private copy
+• Workers memory-map the published snapshot read-only: its pages live
+  once in the page cache, however many workers there are
+• Registrations from any worker are appended to the shared journal
+  under a file lock, so none is lost and every worker sees them
+• One process at a time folds the journal into a new snapshot and
+  publishes it atomically; the others re-map it on the version bump
+
+How a worker sees the gallery:
+    mapped snapshot  (read-only, shared)
+  + delta            (exact flat index of faces added since the snapshot)
+  - stale ids        (snapshot faces re-enrolled or removed since)
+
+The delta is rebuilt from the journal tail after the snapshot's
+journal_seq, so it stays around snapshot_every faces. Searches query
+the snapshot and the delta and merge the results.
+
+Keeping workers in step:
+    A tiny version file (memory-mapped, like database/phone_index.py)
+    holds the snapshot generation and the last journal seq. Checking it
+    before an operation is a memory read; only when it moved does the
+    worker re-map the snapshot or read the new journal records.
+
+Files (next to faiss.index):
+• faiss.index          → published snapshot, replaced atomically
+• faiss_meta.json      → manifest (generation, journal_seq, layout)
+• faiss.index.journal  → shared journal (FaissManager format)
+• faiss.index.version  → generation + journal seq hint
+• faiss.index.lock     → held while appending or publishing a manifest
+• faiss.index.publish.lock → held by the process building a snapshot
+
+The layout is FaissManager's, so a gallery can be switched between
+shared and private mode, but every process opening the same files must
+use the same mode.
+
+What is mapped (IO_FLAG_MMAP_IFC): the vector codes of Flat / SQ8 /
+fp16 indexes, the inverted lists of IVF indexes and the vector storage
+of HNSW (its graph links are still read into each worker). A mapped
+index is never modified: FAISS aborts the process if one is. Building a
+snapshot reads a private copy into the publishing process only. FAISS
+builds without the flag load every snapshot privately: still correct,
+but memory grows with the number of workers again.
+
+"""
+
+import fcntl
+import io
+import json
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+
+from ai.faiss_manager import (
+    FaissManager,
+    JOURNAL_MAGIC,
+    MANIFEST_VERSION,
+    OP_ADD,
+    OP_REMOVE,
+    base_index,
+    export_gallery,
+    gallery_ids,
+    pack_record,
+    read_records,
+    set_search_params
+)
+
+
+# Version file: snapshot generation, last journal seq
+VERSION = struct.Struct("<qq")
+
+# Extra results fetched from the snapshot to make up for stale faces
+STALE_HEADROOM = 8
+
+# Older FAISS releases cannot map index storage (see requirements.txt)
+MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+
+
+def read_mapped(path):
+    """
+    Memory-map a snapshot read-only. Falls back to a private copy for
+    index types (or FAISS builds) that cannot be mapped.
+    """
+    if MMAP_FLAG is not None:
+        try:
+            return faiss.read_index(path, MMAP_FLAG)
+        except RuntimeError:
+            pass
+    return faiss.read_index(path)
+
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """
+    Exclusive flock on path for the duration of the block.
+    A fresh descriptor each time, so it also excludes other threads and
+    forked workers. Yields False if non-blocking and already held.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+
+class SharedFaissManager(FaissManager):
+    """
+    FaissManager for a gallery opened by several processes at once.
+    Same public API; see the module docstring.
+    """
+
+    def __init__(self, **settings):
+        # Kept to convert a legacy gallery with a plain FaissManager
+        self._settings = settings
+        super().__init__(**settings)
+
+    # --------------------------------------------------
+    # Opening
+    # --------------------------------------------------
+    def _open(self):
+        self.lock_path = self.index_path + ".lock"
+        self.publish_lock_path = self.index_path + ".publish.lock"
+        self.version_path = self.index_path + ".version"
+
+        self.generation = -1
+        self._journal_ino = None
+        self._journal_offset = 0
+
+        manifest = self._read_manifest()
+        if manifest is not None and "version" not in manifest:
+            # Positional legacy gallery: convert it once, privately
+            with file_lock(self.publish_lock_path):
+                manifest = self._read_manifest()
+                if manifest is not None and "version" not in manifest:
+                    FaissManager(**self._settings).close()
+
+        with file_lock(self.lock_path):
+            self._prepare_journal()
+            self._version = self._open_version()
+
+        self.journal = open(self.journal_path, "ab")
+
+        with self.lock:
+            self._sync()
+
+        print(f"🗂️  Shared FAISS gallery mapped: generation {self.generation}, "
+              f"{self.index.ntotal} in snapshot, {self.delta.ntotal} in journal")
+
+        if MMAP_FLAG is None:
+            print("⚠️  This FAISS build cannot memory-map indexes: "
+                  "each process holds its own copy of the gallery")
+
+    def _read_manifest(self):
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path, "r") as f:
+            return json.load(f)
+
+    def _prepare_journal(self):
+        """
+        Create the journal, or move aside one in an unknown format.
+        Caller holds the file lock.
+        """
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                magic = f.read(len(JOURNAL_MAGIC))
+
+            if magic == JOURNAL_MAGIC:
+                return
+            if magic:
+                print("⚠️  FAISS journal has an unknown format, moving it aside")
+                os.replace(self.journal_path, self.journal_path + ".legacy")
+
+        with open(self.journal_path, "ab") as f:
+            f.truncate(0)
+            f.write(JOURNAL_MAGIC)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _open_version(self):
+        """
+        Map the version file, creating it from the manifest if needed.
+        Caller holds the file lock.
+        """
+        fd = os.open(self.version_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < VERSION.size:
+                manifest = self._read_manifest() or {}
+                os.write(fd, VERSION.pack(manifest.get("generation", 0), manifest.get("journal_seq", 0)))
+            return mmap.mmap(fd, VERSION.size)
+        finally:
+            # The mapping stays valid without the descriptor
+            os.close(fd)
+
+    def shared_version(self):
+        """
+        (snapshot generation, last journal seq) as published by any process.
+        """
+        return VERSION.unpack_from(self._version, 0)
+
+    # --------------------------------------------------
+    # Catching up (caller holds self.lock)
+    # --------------------------------------------------
+    def _sync(self):
+        """
+        Re-map the snapshot if a newer one was published, then apply
+        journal records appended by other processes.
+        """
+        generation, seq = self.shared_version()
+
+        if generation > self.generation:
+            self._load_snapshot(generation)
+            self._read_journal()
+        elif seq > self.seq:
+            self._read_journal()
+
+    def _load_snapshot(self, generation):
+        # Manifest before index: a snapshot is always written before
+        # its manifest, so the index read here is at least as new.
+        # Records it already holds replay idempotently on top.
+        manifest = self._read_manifest() or {}
+
+        if os.path.exists(self.index_path):
+            index = read_mapped(self.index_path)
+        else:
+            index = self._new_index("Flat", None, precision=self.initial_precision)
+
+        set_search_params(index, self.nprobe, self.ef_search)
+
+        self.index = index
+        self.generation = max(generation, manifest.get("generation", 0))
+        self.seq = manifest.get("journal_seq", 0)
+        self.delta = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+        self.stale = set()
+        self.pending = 0
+
+        # Re-read the journal from the start, skipping covered records
+        self._journal_ino = None
+
+    def _read_journal(self):
+        """
+        Apply the records after the last one read, up to the end of the
+        journal (or a record still being written).
+        """
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return
+
+        with f:
+            ino = os.fstat(f.fileno()).st_ino
+
+            if ino != self._journal_ino:
+                # Compacted since (or never read): start over
+                self._journal_ino = ino
+                self._journal_offset = 0
+
+            if self._journal_offset == 0:
+                if f.read(len(JOURNAL_MAGIC)) != JOURNAL_MAGIC:
+                    return
+                self._journal_offset = f.tell()
+
+            f.seek(self._journal_offset)
+
+            for op, seq, member_id, embedding, end in read_records(f, self.dim):
+                if seq > self.seq:
+                    self._apply(op, member_id, embedding)
+                    self.seq = seq
+                self._journal_offset = end
+
+    def _apply(self, op, member_id, embedding):
+        ids = np.array([member_id], dtype="int64")
+
+        self.delta.remove_ids(ids)
+        if member_id not in self.stale and self._in_snapshot(member_id):
+            self.stale.add(member_id)
+
+        if op == OP_ADD:
+            self.delta.add_with_ids(embedding, ids)
+
+        self.pending += 1
+
+    def _in_snapshot(self, member_id):
+        try:
+            self.index.reconstruct(int(member_id))
+            return True
+        except RuntimeError:
+            return False
+
+    def _in_delta(self, member_id):
+        try:
+            self.delta.reconstruct(int(member_id))
+            return True
+        except RuntimeError:
+            return False
+
+    def _contains(self, member_id):
+        if self._in_delta(member_id):
+            return True
+        return member_id not in self.stale and self._in_snapshot(member_id)
+
+    def _changed_ids(self):
+        """
+        Members whose snapshot face must not be used.
+        """
+        return np.concatenate([
+            np.fromiter(self.stale, dtype="int64", count=len(self.stale)),
+            faiss.vector_to_array(self.delta.id_map).astype("int64")
+        ])
+
+    # --------------------------------------------------
+    # Journal (caller holds self.lock and the file lock)
+    # --------------------------------------------------
+    def _append(self, op, member_id, embedding=None):
+        # _read_journal() under the file lock has read up to the end
+        # of the current journal; reopen if it was compacted since
+        if os.fstat(self.journal.fileno()).st_ino != self._journal_ino:
+            self.journal.close()
+            self.journal = open(self.journal_path, "ab")
+
+        if os.fstat(self.journal.fileno()).st_size > self._journal_offset:
+            # Nobody else can be writing: what is left is a torn record
+            print(f"⚠️  Discarding torn FAISS journal tail at byte {self._journal_offset}")
+            self.journal.truncate(self._journal_offset)
+
+        if self._journal_offset == 0:
+            self.journal.write(JOURNAL_MAGIC)
+            self._journal_offset = len(JOURNAL_MAGIC)
+
+        record = pack_record(op, self.seq + 1, member_id, embedding)
+        self.journal.write(record)
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+        self.seq += 1
+        self._journal_offset += len(record)
+        self._apply(op, member_id, embedding)
+
+        VERSION.pack_into(self._version, 0, self.shared_version()[0], self.seq)
+
+    # --------------------------------------------------
+    # Public API
+    # --------------------------------------------------
+    def add(self, embedding, member_id):
+        """
+        Enroll a member's face. Replaces any face already stored
+        for that member (re-enrollment).
+        """
+        embedding = np.array(embedding).astype("float32").reshape(1, -1)
+        faiss.normalize_L2(embedding)
+        member_id = int(member_id)
+
+        with self.lock, file_lock(self.lock_path):
+            self._sync()
+            self._read_journal()
+            self._append(OP_ADD, member_id, embedding)
+
+    update = add
+
+    def remove(self, member_id):
+        """
+        Delete a member's face. Returns False if none was stored.
+        """
+        member_id = int(member_id)
+
+        with self.lock, file_lock(self.lock_path):
+            self._sync()
+            self._read_journal()
+
+            if not self._contains(member_id):
+                return False
+
+            self._append(OP_REMOVE, member_id)
+            return True
+
+    def __contains__(self, member_id):
+        with self.lock:
+            self._sync()
+            return self._contains(int(member_id))
+
+    def __len__(self):
+        with self.lock:
+            self._sync()
+            return self.index.ntotal - len(self.stale) + self.delta.ntotal
+
+    def member_ids(self):
+        with self.lock:
+            self._sync()
+            member_ids = gallery_ids(self.index)
+            if self.stale:
+                member_ids = member_ids[~np.isin(member_ids, self._changed_ids())]
+            return np.concatenate([member_ids, faiss.vector_to_array(self.delta.id_map).astype("int64")])
+
+    def iter_gallery(self, chunk_size=50000):
+        """
+        Stream the gallery as (member_ids, embeddings) chunks.
+        Chunks without recent changes are copied straight out of the
+        snapshot; the others member by member.
+        """
+        member_ids = self.member_ids()
+
+        for start in range(0, len(member_ids), chunk_size):
+            ids = member_ids[start:start + chunk_size]
+            vectors = None
+
+            with self.lock:
+                self._sync()
+                if not np.isin(ids, self._changed_ids()).any():
+                    try:
+                        vectors = self.index.reconstruct_batch(ids)
+                    except RuntimeError:
+                        vectors = None
+
+            if vectors is None:
+                embeddings = self.get_embeddings(ids)
+                if not embeddings:
+                    continue
+                ids = np.fromiter(embeddings.keys(), dtype="int64", count=len(embeddings))
+                vectors = np.stack(list(embeddings.values()))
+
+            yield ids, vectors
+
+    def get_embeddings(self, member_ids):
+        embeddings = {}
+
+        with self.lock:
+            self._sync()
+
+            for member_id in member_ids:
+                member_id = int(member_id)
+                try:
+                    embeddings[member_id] = self.delta.reconstruct(member_id)
+                    continue
+                except RuntimeError:
+                    pass
+
+                if member_id in self.stale:
+                    continue
+
+                try:
+                    embeddings[member_id] = self.index.reconstruct(member_id)
+                except RuntimeError:
+                    continue
+
+        return embeddings
+
+    def search_batch(self, embeddings, top_k=1):
+        """
+        Search the snapshot and the delta, skipping stale snapshot faces.
+
+        Returns:
+            one [(member_id, score), ...] list per query
+        """
+        queries = np.array(embeddings).astype("float32").reshape(len(embeddings), -1)
+        faiss.normalize_L2(queries)
+
+        with self.lock:
+            self._sync()
+            stale = self.stale
+
+            extra = min(len(stale), STALE_HEADROOM)
+            distances, member_ids = self.index.search(queries, top_k + extra)
+            rows = list(zip(member_ids, distances))
+
+            if len(stale) > extra:
+                # More stale faces than headroom: redo queries that lost too many
+                for i, (ids, _) in enumerate(rows):
+                    if sum(int(member_id) in stale for member_id in ids) > extra:
+                        d, m = self.index.search(queries[i:i + 1], top_k + len(stale))
+                        rows[i] = (m[0], d[0])
+
+            if self.delta.ntotal:
+                delta_distances, delta_ids = self.delta.search(queries, top_k)
+            else:
+                delta_distances = delta_ids = None
+
+        results = []
+        for i, (ids, scores) in enumerate(rows):
+            matches = [
+                (int(member_id), float(score))
+                for member_id, score in zip(ids, scores)
+                if member_id != -1 and int(member_id) not in stale
+            ][:top_k]
+
+            if delta_ids is not None:
+                matches += [
+                    (int(member_id), float(score))
+                    for member_id, score in zip(delta_ids[i], delta_distances[i])
+                    if member_id != -1
+                ]
+                matches = sorted(matches, key=lambda match: match[1], reverse=True)[:top_k]
+
+            results.append(matches)
+
+        return results
+
+    # --------------------------------------------------
+    # Publishing
+    # --------------------------------------------------
+    def migrate(self):
+        """
+        Migration happens while building the next snapshot.
+        """
+        self.save()
+
+    def save(self):
+        """
+        Fold the journal into a new snapshot and publish it.
+        Only one process builds a snapshot at a time: if another one
+        is at it, this returns straight away.
+        """
+        with self.snapshot_lock, file_lock(self.publish_lock_path, blocking=False) as acquired:
+            if not acquired:
+                return
+
+            with self.lock:
+                self._sync()
+
+                if self.pending == 0 and os.path.exists(self.index_path) and not self.needs_migration():
+                    return
+
+                seq = self.seq
+                changed = self._changed_ids()
+                delta_ids, delta_vectors = export_gallery(self.delta)
+
+            # Private, writable copy of the snapshot. Registrations carry
+            # on meanwhile: they are after seq and stay in the journal.
+            if os.path.exists(self.index_path):
+                index = faiss.read_index(self.index_path)
+                set_search_params(index, self.nprobe, self.ef_search)
+            else:
+                index = self._new_index("Flat", None, precision=self.initial_precision)
+
+            index = self._without(index, changed)
+            index.add_with_ids(delta_vectors, delta_ids)
+
+            if self.needs_migration(index):
+                index = self._migrated(index)
+
+            self._publish(index, seq)
+
+    def restore(self, chunks, total=None, training_state=None):
+        """
+        Replace the gallery with (member_ids, embeddings) chunks (see
+        FaissManager.restore). Registrations made by any process while
+        it runs stay in the journal and are replayed on top.
+
+        Returns:
+            number of faces restored
+        """
+        with self.snapshot_lock, file_lock(self.publish_lock_path):
+            with self.lock:
+                self._sync()
+                seq = self.seq
+
+            index, restored = self._build_restored(chunks, total, training_state)
+            self._publish(index, seq)
+
+        return restored
+
+    def _without(self, index, member_ids):
+        """
+        index minus member_ids (HNSW graphs are rebuilt without them).
+        """
+        if len(member_ids) == 0:
+            return index
+
+        if not isinstance(base_index(index), faiss.IndexHNSW):
+            index.remove_ids(member_ids)
+            return index
+
+        ids, vectors = export_gallery(index)
+        keep = ~np.isin(ids, member_ids)
+
+        rebuilt = self._new_index("HNSW", vectors[keep], precision=self.current_precision(index))
+        rebuilt.add_with_ids(vectors[keep], ids[keep])
+        return rebuilt
+
+    def _migrated(self, index):
+        index_type, precision = self.target_layout(index)
+        member_ids, vectors = export_gallery(index)
+        print(f"🔁 Migrating FAISS gallery ({len(member_ids)} faces) to {index_type} / {precision}")
+
+        migrated = self._new_index(index_type, vectors, precision=precision)
+        migrated.add_with_ids(vectors, member_ids)
+
+        print(f"✅ FAISS gallery migrated to {index_type} / {precision}")
+        return migrated
+
+    def _publish(self, index, seq):
+        """
+        Write index as the snapshot covering journal records up to seq,
+        then bump the generation. Caller holds the publish lock.
+        """
+        # Index first (see FaissManager.save)
+        tmp_path = self.index_path + ".tmp"
+        faiss.write_index(index, tmp_path)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+        with self.lock, file_lock(self.lock_path):
+            generation = max(self.generation, self.shared_version()[0]) + 1
+            manifest = {
+                "version": MANIFEST_VERSION,
+                "generation": generation,
+                "journal_seq": seq,
+                "index_type": self.current_type(index),
+                "precision": self.current_precision(index),
+                "ntotal": index.ntotal
+            }
+            self._write_atomic(self.meta_path, json.dumps(manifest).encode())
+            self._compact_journal(seq)
+
+            VERSION.pack_into(self._version, 0, generation, max(self.seq, self.shared_version()[1]))
+
+            # Drop the private copy: map what was just published
+            self._sync()
+
+    def _compact_journal(self, seq):
+        """
+        Keep only the records after seq. Caller holds both locks.
+        """
+        self.journal.close()
+
+        with open(self.journal_path, "rb") as f:
+            data = f.read()
+
+        records = io.BytesIO(data)
+        records.seek(len(JOURNAL_MAGIC))
+        keep_from = valid_end = len(JOURNAL_MAGIC)
+
+        for _, record_seq, _, _, end in read_records(records, self.dim):
+            if record_seq <= seq:
+                keep_from = end
+            valid_end = end
+
+        self._write_atomic(self.journal_path, JOURNAL_MAGIC + data[keep_from:valid_end])
+        self.journal = open(self.journal_path, "ab")
+
+    # --------------------------------------------------
+    # Snapshot helpers
+    # --------------------------------------------------
+    def _snapshot_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                # Idle workers drop their delta once someone publishes
+                with self.lock:
+                    self._sync()
+
+                if self.pending >= self.snapshot_every or self.needs_migration():
+                    self.save()
+            except Exception as e:
+                print(f"❌ FAISS snapshot failed: {str(e)}")
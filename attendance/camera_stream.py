@@ -0,0 +1,203 @@
+"""
+camera_stream.py
+------------------
+
+Purpose:
+• One reader thread per camera (DVR channel, IP camera or video file)
+• Keep only the newest frame: a slow consumer skips frames instead of
+  falling behind, so recognition always works on "now"
+• Build Dahua RTSP URLs from the dvr / cameras sections of config.yaml
+
+Video files are paced at their own frame rate and loop at the end, so
+a recording behaves like a live camera when testing on a laptop.
+
+"""
+
+import os
+import threading
+import time
+from urllib.parse import quote
+
+import cv2
+
+
+# --------------------------------------------------
+# Sources
+# --------------------------------------------------
+def dvr_rtsp_url(dvr, channel, stream="sub"):
+    """
+    Dahua RTSP URL for one DVR channel (main stream = subtype 0,
+    sub stream = subtype 1). The password is read from password_env.
+    """
+    password = os.environ.get(dvr.get("password_env", ""), "")
+    subtype = 0 if stream == "main" else 1
+
+    return (
+        f"rtsp://{quote(dvr.get('username', 'admin'), safe='')}:{quote(password, safe='')}"
+        f"@{dvr['ip']}:{dvr.get('rtsp_port', 554)}"
+        f"/cam/realmonitor?channel={channel}&subtype={subtype}"
+    )
+
+
+def camera_sources(config, overrides=None):
+    """
+    (name, source) for every enabled camera in config.yaml.
+
+    Args:
+        overrides (list[str]): video files / URLs used instead of the
+            configured cameras, in order (extra ones get their own name)
+
+    Returns:
+        list of (name, source)
+    """
+    cameras = [c for c in config.get("cameras") or [] if c.get("enabled", True)]
+    sources = []
+
+    for camera in cameras:
+        if camera.get("source"):
+            source = camera["source"]
+        else:
+            source = dvr_rtsp_url(config["dvr"], camera["channel"], camera.get("stream", "sub"))
+        sources.append((camera["name"], source))
+
+    if overrides:
+        names = [name for name, _ in sources]
+        sources = [
+            (names[i] if i < len(names) else f"Source {i + 1}", source)
+            for i, source in enumerate(overrides)
+        ]
+
+    return sources
+
+
+# --------------------------------------------------
+# Latest-frame buffer
+# --------------------------------------------------
+class LatestFrame:
+    """
+    Single-slot buffer. put() overwrites; a frame that was never taken
+    counts as dropped.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.frame = None
+        self.seq = 0
+        self.timestamp = 0.0
+        self.taken_seq = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._cond:
+            if self.seq > self.taken_seq:
+                self.dropped += 1
+            self.frame = frame
+            self.seq += 1
+            self.timestamp = time.time()
+            self._cond.notify_all()
+
+    def take(self, timeout=0.0):
+        """
+        Newest frame not taken yet, or None.
+
+        Returns:
+            (frame, timestamp) / None
+        """
+        with self._cond:
+            if self.seq == self.taken_seq and timeout:
+                self._cond.wait(timeout)
+
+            if self.seq == self.taken_seq:
+                return None
+
+            self.taken_seq = self.seq
+            return self.frame, self.timestamp
+
+
+# --------------------------------------------------
+# Reader thread
+# --------------------------------------------------
+class CameraReader:
+
+    def __init__(self, name, source, loop_files=True, reconnect_seconds=5):
+        """
+        Args:
+            name (str): camera name (reported in stats / attendance)
+            source (str | int): RTSP URL, video file or device index
+            loop_files (bool): restart video files at the end
+            reconnect_seconds (float): wait before reopening a lost stream
+        """
+        self.name = name
+        self.source = source
+        self.loop_files = loop_files
+        self.reconnect_seconds = reconnect_seconds
+
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        self.buffer = LatestFrame()
+        self.frames_read = 0
+        self.started_at = None
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"camera:{name}", daemon=True)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    @property
+    def alive(self):
+        return self._thread.is_alive()
+
+    def take(self, timeout=0.0):
+        return self.buffer.take(timeout)
+
+    def _open(self):
+        capture = cv2.VideoCapture(self.source)
+        # Live streams: keep the decoder's own queue as short as possible
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return capture
+
+    def _run(self):
+        while not self._stop.is_set():
+            capture = self._open()
+
+            if not capture.isOpened():
+                print(f"⚠️ Camera '{self.name}' unavailable, retrying in {self.reconnect_seconds}s")
+                self._stop.wait(self.reconnect_seconds)
+                continue
+
+            fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+            interval = 1.0 / fps if self.is_file else 0.0
+            next_at = time.monotonic()
+
+            while not self._stop.is_set():
+                ok, frame = capture.read()
+
+                if not ok:
+                    break
+
+                self.frames_read += 1
+                self.buffer.put(frame)
+
+                # Files: play back in real time, like a camera would
+                if interval:
+                    next_at += interval
+                    delay = next_at - time.monotonic()
+                    if delay > 0:
+                        self._stop.wait(delay)
+                    else:
+                        next_at = time.monotonic()
+
+            capture.release()
+
+            if self.is_file and not self.loop_files:
+                break
+
+            if not self.is_file and not self._stop.is_set():
+                print(f"⚠️ Camera '{self.name}' stream lost, reconnecting in {self.reconnect_seconds}s")
+                self._stop.wait(self.reconnect_seconds)
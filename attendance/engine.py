@@ -0,0 +1,260 @@
+"""
+engine.py
+------------------
+
+Purpose:
+• Live attendance from every enabled camera
+• Each round takes the newest unseen frame from every camera,
+  detects all faces, embeds them in ONE ArcFace batch and matches
+  them in ONE FaissManager.search_batch call
+• Matches at or above face_recognition.recognition_threshold are
+  handed to on_match (one dict per sighting)
+• Frames/s read and processed are tracked per camera
+• With tracking on (tracker.FaceTracker per camera), a face is
+  embedded once per track, or again when a clearly better frame of it
+  appears; the identity then carries along the track
+
+Readers never queue frames (see camera_stream.LatestFrame), so when
+recognition is slower than the cameras, old frames are skipped and
+counted as dropped.
+
+"""
+
+import time
+
+import numpy as np
+
+from attendance.tracker import FaceTracker
+
+
+class CameraStats:
+
+    def __init__(self):
+        self.processed = 0
+        self.faces = 0
+        self.embedded = 0
+        self.matches = 0
+        self.latency_total = 0.0
+
+
+class AttendanceEngine:
+
+    def __init__(self, detector, faiss_db, readers, recognition_threshold=0.62,
+                 min_face_size=40, on_match=None, idle_wait=0.05, tracking=True,
+                 tracker_kwargs=None):
+        """
+        Args:
+            detector (FaceDetector): shared by all cameras
+            faiss_db (FaissManager): member gallery
+            readers (list[CameraReader]): started camera readers
+            recognition_threshold (float): minimum cosine similarity
+            min_face_size (int): ignore faces smaller than this (pixels)
+            on_match (callable): called with each sighting dict
+            idle_wait (float): how long to wait when no camera has a new frame
+            tracking (bool): embed once per face track instead of every frame
+            tracker_kwargs (dict): FaceTracker settings
+        """
+        self.detector = detector
+        self.faiss_db = faiss_db
+        self.readers = readers
+        self.recognition_threshold = recognition_threshold
+        self.min_face_size = min_face_size
+        self.on_match = on_match or (lambda sighting: None)
+        self.idle_wait = idle_wait
+
+        self.stats = {reader.name: CameraStats() for reader in readers}
+        self.trackers = {
+            reader.name: FaceTracker(**(tracker_kwargs or {}))
+            for reader in readers
+        } if tracking else None
+        self.rounds = 0
+        self.recognition_calls = 0
+        self.started_at = time.monotonic()
+
+    # --------------------------------------------------
+    # One round over all cameras
+    # --------------------------------------------------
+    def collect(self):
+        """
+        Newest unseen frame from each camera.
+
+        Returns:
+            list of (reader, frame, timestamp)
+        """
+        frames = []
+        for reader in self.readers:
+            taken = reader.take()
+            if taken is not None:
+                frames.append((reader, taken[0], taken[1]))
+
+        if not frames and self.readers:
+            # Block briefly on the first camera instead of spinning
+            taken = self.readers[0].take(self.idle_wait)
+            if taken is not None:
+                frames.append((self.readers[0], taken[0], taken[1]))
+
+        return frames
+
+    def detect(self, frames):
+        """
+        Usable faces in a round that need an embedding (all of them
+        without tracking).
+
+        Returns:
+            list of (reader, frame, timestamp, face, track or None)
+        """
+        found = []
+
+        for reader, frame, timestamp in frames:
+            stats = self.stats[reader.name]
+            stats.processed += 1
+
+            faces = []
+            for face in self.detector.detect_faces(frame):
+                x1, y1, x2, y2 = face.bbox
+                if min(x2 - x1, y2 - y1) < self.min_face_size or face.kps is None:
+                    continue
+                faces.append(face)
+
+            stats.faces += len(faces)
+
+            if self.trackers is None:
+                found.extend((reader, frame, timestamp, face, None) for face in faces)
+                continue
+
+            for track, face, needs_embedding in self.trackers[reader.name].update(frame, faces):
+                if needs_embedding:
+                    found.append((reader, frame, timestamp, face, track))
+
+        return found
+
+    def recognise(self, found):
+        """
+        Embed every face in one batch and match against the gallery.
+
+        Returns:
+            list of sighting dicts
+        """
+        if not found:
+            return []
+
+        self.detector.embed_faces([(frame, face) for _, frame, _, face, _ in found])
+        self.recognition_calls += 1
+
+        embeddings = np.stack([face.embedding for _, _, _, face, _ in found])
+        results = self.faiss_db.search_batch(embeddings, top_k=1)
+
+        sightings = []
+        for (reader, _, timestamp, face, track), matches in zip(found, results):
+            self.stats[reader.name].embedded += 1
+
+            member_id, score = matches[0] if matches else (None, 0.0)
+            if score < self.recognition_threshold:
+                member_id = None
+
+            if track is not None:
+                track.embeddings += 1
+
+                # Keep a known identity unless the better frame is
+                # recognised as someone else
+                if member_id is None or member_id == track.member_id:
+                    if member_id is not None:
+                        track.score = max(track.score, score)
+                    continue
+
+                track.member_id = member_id
+                track.score = score
+
+            if member_id is None:
+                continue
+
+            self.stats[reader.name].matches += 1
+            sightings.append({
+                "member_id": member_id,
+                "score": score,
+                "camera": reader.name,
+                "timestamp": timestamp,
+                "bbox": [float(v) for v in face.bbox],
+                "track_id": track.track_id if track is not None else None
+            })
+
+        return sightings
+
+    def step(self):
+        """
+        One collect → detect → recognise round.
+        Returns the sightings of this round.
+        """
+        frames = self.collect()
+        if not frames:
+            return []
+
+        start = time.perf_counter()
+        sightings = self.recognise(self.detect(frames))
+        elapsed = time.perf_counter() - start
+
+        for reader, _, _ in frames:
+            self.stats[reader.name].latency_total += elapsed
+
+        for sighting in sightings:
+            self.on_match(sighting)
+
+        self.rounds += 1
+        return sightings
+
+    def run(self, duration=None, report_every=10, stop_event=None):
+        """
+        Process until duration seconds have passed, stop_event is set,
+        or every reader has finished.
+        """
+        started = time.monotonic()
+        next_report = started + report_every if report_every else None
+
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                break
+            if duration is not None and time.monotonic() - started >= duration:
+                break
+            if not any(reader.alive for reader in self.readers):
+                break
+
+            self.step()
+
+            if next_report is not None and time.monotonic() >= next_report:
+                self.report()
+                next_report += report_every
+
+        self.report()
+
+    # --------------------------------------------------
+    # Throughput
+    # --------------------------------------------------
+    def camera_stats(self):
+        """
+        Per camera: frames/s read from the source, frames/s processed,
+        frames dropped, faces found and members matched.
+        """
+        now = time.monotonic()
+        report = {}
+
+        for reader in self.readers:
+            stats = self.stats[reader.name]
+            elapsed = max(now - (reader.started_at or self.started_at), 1e-6)
+
+            report[reader.name] = {
+                "read_fps": round(reader.frames_read / elapsed, 2),
+                "processed_fps": round(stats.processed / elapsed, 2),
+                "dropped": reader.buffer.dropped,
+                "faces": stats.faces,
+                "embedded": stats.embedded,
+                "matches": stats.matches,
+                "avg_round_ms": round(stats.latency_total / stats.processed * 1000, 1) if stats.processed else None
+            }
+
+        return report
+
+    def report(self):
+        for name, s in self.camera_stats().items():
+            print(f"📹 {name}: {s['processed_fps']:.1f}/{s['read_fps']:.1f} fps processed/read, "
+                  f"{s['dropped']} dropped, {s['faces']} faces, {s['embedded']} embedded, "
+                  f"{s['matches']} matches")
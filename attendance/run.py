@@ -0,0 +1,113 @@
+"""
+run.py
+------------------
+
+Purpose:
+• Start live attendance on an edge node: one reader per enabled
+  camera in config.yaml, one shared AttendanceEngine
+• Record attendance once per member per service (AttendanceWriter)
+• Print frames/s per camera every --report-every seconds
+
+Usage:
+    python -m attendance.run
+    python -m attendance.run --source door.mp4 --source hall.mp4 --duration 60
+    python -m attendance.run --source rtsp://127.0.0.1:8554/cam1 --dry-run
+
+--source replaces the configured cameras (video files loop and are
+played back in real time, so they behave like live cameras).
+
+"""
+
+import argparse
+import json
+
+import yaml
+
+from ai.face_detector import FaceDetector
+from ai.faiss_manager import FaissManager
+from attendance.camera_stream import CameraReader, camera_sources
+from attendance.engine import AttendanceEngine
+from attendance.writer import AttendanceWriter
+from database.db import Database
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live multi-camera attendance")
+    parser.add_argument("--config", default="config/config.yaml")
+    parser.add_argument("--source", action="append", help="Video file / URL instead of the configured cameras (repeatable)")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    parser.add_argument("--report-every", type=float, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="Recognise but do not write attendance")
+    parser.add_argument("--json", help="Write the final per-camera stats to this file")
+    args = parser.parse_args()
+
+    config = yaml.safe_load(open(args.config))
+    settings = config.get("attendance", {})
+    detection = settings.get("detection", {})
+    tracking = settings.get("tracking", {})
+
+    detector = FaceDetector(
+        profile=config["face_recognition"].get("model", "buffalo_l"),
+        det_size=detection.get("det_size", 640),
+        cascade=detection.get("cascade", False),
+        intra_op_threads=settings.get("intra_op_threads")
+    )
+    faiss_db = FaissManager.from_config(config["faiss"])
+
+    writer = None
+    if not args.dry_run:
+        recording = settings.get("recording", {})
+        writer = AttendanceWriter(
+            Database(config.get("sqlite", {}).get("db_path", "database/church.db")),
+            config["branch"]["branch_id"],
+            service_schedule=config.get("service_schedule"),
+            timezone=config.get("organization", {}).get("timezone"),
+            cooldown_minutes=recording.get("cooldown_minutes"),
+            flush_interval=recording.get("flush_interval_seconds", 2),
+            max_queue=recording.get("max_queue", 10000)
+        )
+
+    readers = [
+        CameraReader(name, source, reconnect_seconds=settings.get("reconnect_seconds", 5)).start()
+        for name, source in camera_sources(config, args.source)
+    ]
+    print(f"🎥 Attendance running on {len(readers)} camera(s), gallery of {len(faiss_db)} face(s)")
+
+    engine = AttendanceEngine(
+        detector,
+        faiss_db,
+        readers,
+        recognition_threshold=config["face_recognition"].get("recognition_threshold", 0.62),
+        min_face_size=settings.get("min_face_size", 40),
+        on_match=writer,
+        tracking=tracking.get("enabled", True),
+        tracker_kwargs={
+            "iou_threshold": tracking.get("iou_threshold", 0.3),
+            "max_missed": tracking.get("max_missed", 15),
+            "reembed_margin": tracking.get("reembed_margin", 0.15)
+        }
+    )
+
+    try:
+        engine.run(
+            duration=args.duration,
+            report_every=args.report_every or settings.get("report_every_seconds", 10)
+        )
+    except KeyboardInterrupt:
+        engine.report()
+    finally:
+        for reader in readers:
+            reader.stop()
+        faiss_db.close()
+
+        if writer is not None:
+            writer.close()
+            print(f"📝 Attendance writer: {writer.stats()}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(engine.camera_stats(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
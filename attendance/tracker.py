@@ -0,0 +1,189 @@
+"""
+tracker.py
+------------------
+
+Purpose:
+• Follow each face across frames of one camera (IoU matching on
+  Kalman-predicted boxes) so a person who stays in view for seconds
+  is embedded once, not on every frame
+• Re-embed a track only when a clearly better face appears
+  (face_quality score up by reembed_margin)
+• The identity found for a track carries along it
+
+One FaceTracker per camera; boxes from different cameras are never
+compared.
+
+"""
+
+import itertools
+
+import numpy as np
+
+from ai.face_quality import evaluate_quality_batch
+
+
+# --------------------------------------------------
+# Box helpers
+# --------------------------------------------------
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Pairwise IoU of two (N, 4) / (M, 4) arrays of x1, y1, x2, y2.
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def crop(frame, bbox):
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = bbox.astype(int)
+    return frame[max(0, y1):min(h, y2), max(0, x1):min(w, x2)]
+
+
+# --------------------------------------------------
+# Constant-velocity Kalman filter on (cx, cy, w, h)
+# --------------------------------------------------
+class BoxKalman:
+
+    # State: cx, cy, w, h, vx, vy, vw, vh
+    F = np.eye(8, dtype=np.float64)
+    F[:4, 4:] = np.eye(4)
+    H = np.eye(4, 8, dtype=np.float64)
+
+    def __init__(self, bbox):
+        x1, y1, x2, y2 = bbox
+        self.x = np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1, 0, 0, 0, 0], dtype=np.float64)
+
+        size = max(self.x[2], self.x[3], 1.0)
+        self.P = np.diag([size, size, size, size, size * 10, size * 10, size * 10, size * 10]) ** 2 * 0.01
+        self.Q = np.diag([1, 1, 1, 1, 0.5, 0.5, 0.5, 0.5]) * (0.05 * size) ** 2
+        self.R = np.diag([1, 1, 1, 1]) * (0.1 * size) ** 2
+
+    def predict(self):
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+        return self.bbox()
+
+    def update(self, bbox):
+        x1, y1, x2, y2 = bbox
+        z = np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - self.H @ self.x)
+        self.P = (np.eye(8) - K @ self.H) @ self.P
+
+    def bbox(self):
+        cx, cy, w, h = self.x[:4]
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], dtype=np.float32)
+
+
+# --------------------------------------------------
+# Tracks
+# --------------------------------------------------
+class Track:
+
+    _ids = itertools.count(1)
+
+    def __init__(self, bbox):
+        self.track_id = next(self._ids)
+        self.kalman = BoxKalman(bbox)
+        self.bbox = np.asarray(bbox, dtype=np.float32)
+        self.hits = 1
+        self.missed = 0
+
+        self.member_id = None
+        self.score = 0.0
+        self.best_quality = -1.0
+        self.embeddings = 0
+
+
+class FaceTracker:
+
+    def __init__(self, iou_threshold=0.3, max_missed=15, reembed_margin=0.15):
+        """
+        Args:
+            iou_threshold (float): minimum IoU to continue a track
+            max_missed (int): frames a track survives without a detection
+            reembed_margin (float): quality score gain that triggers
+                a new embedding for an existing track
+        """
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.reembed_margin = reembed_margin
+        self.tracks = []
+
+    def update(self, frame, faces):
+        """
+        Match this frame's detections to tracks.
+
+        Returns:
+            list of (track, face, needs_embedding) — one per detection
+        """
+        predicted = [track.kalman.predict() for track in self.tracks]
+        boxes = [face.bbox for face in faces]
+
+        matched = {}
+        if predicted and boxes:
+            iou = iou_matrix(predicted, boxes)
+
+            # Greedy assignment, best overlaps first
+            for flat in np.argsort(-iou, axis=None):
+                t, d = np.unravel_index(flat, iou.shape)
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if t in matched.values() or d in matched:
+                    continue
+                matched[d] = t
+
+        assigned = []
+        for d, face in enumerate(faces):
+            if d in matched:
+                track = self.tracks[matched[d]]
+                track.kalman.update(face.bbox)
+                track.bbox = np.asarray(face.bbox, dtype=np.float32)
+                track.hits += 1
+                track.missed = 0
+            else:
+                track = Track(face.bbox)
+                self.tracks.append(track)
+            assigned.append((track, face))
+
+        live = {id(track) for track, _ in assigned}
+        for track in self.tracks:
+            if id(track) not in live:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        if not assigned:
+            return []
+
+        # Quality of every detection in one vectorised pass
+        crops = [crop(frame, np.asarray(face.bbox)) for _, face in assigned]
+        valid = [i for i, c in enumerate(crops) if c.size]
+        scores = np.full(len(assigned), -1.0, dtype=np.float32)
+        if valid:
+            metrics = evaluate_quality_batch([crops[i] for i in valid], frame.shape)
+            scores[valid] = metrics["score"]
+
+        results = []
+        for (track, face), quality in zip(assigned, scores):
+            needs = quality >= 0 and (
+                track.embeddings == 0
+                or quality >= track.best_quality + self.reembed_margin
+            )
+            if needs:
+                track.best_quality = float(quality)
+            results.append((track, face, needs))
+
+        return results
@@ -0,0 +1,278 @@
+"""
+writer.py
+------------------
+
+Purpose:
+• Turn recognition sightings into attendance rows without flooding
+  SQLite: a member is recorded once per service (service_schedule in
+  config.yaml), or again only after cooldown_minutes
+• Duplicates are dropped on the caller's thread with a dict lookup;
+  only new attendances are queued
+• A background thread flushes the queue every flush_interval seconds
+  with one executemany in one transaction
+• visit_type is set here (ai/role_mapper.visit_type: member's branch
+  vs this node's branch)
+
+Sightings outside every service window are not recorded.
+
+Metrics (stats()): queue depth, rows written, duplicates dropped,
+queue-full drops, sightings outside service, flush count and timing.
+
+"""
+
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from ai.role_mapper import visit_type
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def parse_schedule(service_schedule):
+    """
+    {weekday number: [(start time, end time)]} for enabled services.
+    A day may hold one service (start_time / end_time) or a list
+    under "services".
+    """
+    schedule = {}
+
+    for day, entry in (service_schedule or {}).items():
+        if day.lower() not in DAYS or not entry:
+            continue
+
+        services = entry.get("services") or [entry]
+        for service in services:
+            if not service.get("enabled", entry.get("enabled", True)):
+                continue
+
+            start = datetime.strptime(service["start_time"], "%H:%M").time()
+            end = datetime.strptime(service["end_time"], "%H:%M").time()
+            schedule.setdefault(DAYS.index(day.lower()), []).append((start, end))
+
+    return schedule
+
+
+class AttendanceWriter:
+
+    def __init__(self, db, branch_id, service_schedule=None, timezone=None,
+                 cooldown_minutes=None, flush_interval=2.0, max_queue=10000):
+        """
+        Args:
+            db (database.db.Database): attendance database
+            branch_id (int): this node's branch (detected_branch_id)
+            service_schedule (dict): service_schedule section of config.yaml
+            timezone (str): organization.timezone (service times are local)
+            cooldown_minutes (float): record a member again within the same
+                service after this long (None = once per service)
+            flush_interval (float): seconds between batch inserts
+            max_queue (int): pending rows kept before new ones are dropped
+        """
+        self.db = db
+        self.branch_id = branch_id
+        self.schedule = parse_schedule(service_schedule)
+        self.tz = ZoneInfo(timezone) if timezone and ZoneInfo else None
+        self.cooldown = timedelta(minutes=cooldown_minutes) if cooldown_minutes else None
+        self.flush_interval = flush_interval
+
+        self.queue = queue.Queue(maxsize=max_queue)
+
+        # (service start) → {member_id: last recorded time}
+        self.recorded = {}
+        self.branches = {}
+
+        self.written = 0
+        self.dropped_duplicates = 0
+        self.dropped_full = 0
+        self.outside_service = 0
+        self.unknown_members = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.last_flush_rows = 0
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+        self._thread.start()
+
+    # --------------------------------------------------
+    # Services
+    # --------------------------------------------------
+    def now(self, timestamp=None):
+        return datetime.fromtimestamp(timestamp if timestamp is not None else time.time(), self.tz).replace(tzinfo=None)
+
+    def service_start(self, when):
+        """
+        Start of the service `when` falls in, or None outside services.
+        """
+        for start, end in self.schedule.get(when.weekday(), []):
+            if start <= when.time() <= end:
+                return datetime.combine(when.date(), start)
+        return None
+
+    def _service_members(self, start):
+        """
+        Members already recorded for this service (loaded from the
+        database once, so a restart mid-service does not re-record).
+        """
+        members = self.recorded.get(start)
+        if members is None:
+            rows = self.db.query_all(
+                "SELECT member_id, MAX(timestamp) FROM attendance "
+                "WHERE detected_branch_id IS ? AND timestamp >= ? GROUP BY member_id",
+                (self.branch_id, start.isoformat())
+            )
+            members = {member_id: datetime.fromisoformat(ts) for member_id, ts in rows}
+
+            # Only the current service needs to be remembered
+            self.recorded = {start: members}
+
+        return members
+
+    # --------------------------------------------------
+    # Input (called from the recognition loop)
+    # --------------------------------------------------
+    def submit(self, sighting):
+        """
+        Queue an attendance for a sighting dict (member_id, timestamp).
+        Returns True if it was queued.
+        """
+        when = self.now(sighting.get("timestamp"))
+        start = self.service_start(when)
+
+        if start is None:
+            self.outside_service += 1
+            return False
+
+        member_id = sighting["member_id"]
+
+        with self._lock:
+            members = self._service_members(start)
+            last = members.get(member_id)
+
+            if last is not None and (self.cooldown is None or when - last < self.cooldown):
+                self.dropped_duplicates += 1
+                return False
+
+            try:
+                self.queue.put_nowait((member_id, when))
+            except queue.Full:
+                self.dropped_full += 1
+                return False
+
+            members[member_id] = when
+
+        return True
+
+    __call__ = submit
+
+    # --------------------------------------------------
+    # Output (background thread)
+    # --------------------------------------------------
+    def _member_branches(self, member_ids):
+        missing = [m for m in member_ids if m not in self.branches]
+
+        if missing:
+            placeholders = ",".join("?" * len(missing))
+            rows = self.db.query_all(
+                f"SELECT id, branch_id FROM members WHERE id IN ({placeholders})",
+                missing
+            )
+            for member_id, branch_id in rows:
+                self.branches[member_id] = branch_id
+
+        return self.branches
+
+    def flush(self):
+        """
+        Write everything queued so far in one transaction.
+        Returns the number of rows written.
+        """
+        with self._flush_lock:
+            pending = []
+            while True:
+                try:
+                    pending.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if not pending:
+                return 0
+
+            start = time.perf_counter()
+            branches = self._member_branches({member_id for member_id, _ in pending})
+
+            # Gallery faces without a members row cannot be recorded
+            # (attendance.member_id is a foreign key)
+            known = [(m, when) for m, when in pending if m in branches]
+            self.unknown_members += len(pending) - len(known)
+
+            rows = [
+                (
+                    member_id,
+                    self.branch_id,
+                    visit_type(branches[member_id], self.branch_id),
+                    when.isoformat()
+                )
+                for member_id, when in known
+            ]
+
+            if not rows:
+                return 0
+
+            try:
+                with self.db.transaction() as cur:
+                    cur.executemany(
+                        "INSERT INTO attendance (member_id, detected_branch_id, visit_type, timestamp) "
+                        "VALUES (?,?,?,?)",
+                        rows
+                    )
+            except Exception:
+                # Keep the rows for the next flush
+                for item in known:
+                    try:
+                        self.queue.put_nowait(item)
+                    except queue.Full:
+                        self.dropped_full += 1
+                raise
+
+            self.written += len(rows)
+            self.flushes += 1
+            self.last_flush_rows = len(rows)
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+            return len(rows)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Attendance flush failed: {str(e)}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "written": self.written,
+            "dropped_duplicates": self.dropped_duplicates,
+            "dropped_full": self.dropped_full,
+            "outside_service": self.outside_service,
+            "unknown_members": self.unknown_members,
+            "flushes": self.flushes,
+            "flush_interval_s": self.flush_interval,
+            "last_flush_rows": self.last_flush_rows,
+            "last_flush_ms": round(self.last_flush_ms, 2)
+        }
@@ -0,0 +1,137 @@
+"""
+ann_recall.py
+------------------
+
+Purpose:
+• Compare FAISS index tiers on synthetic face galleries
+• Report recall@k against exact Flat search
+• Report single-query latency (the portal searches one face at a time)
+
+Usage:
+    python benchmarks/ann_recall.py
+    python benchmarks/ann_recall.py --sizes 10000 100000 1000000 --json ann.json
+
+Synthetic galleries:
+Real ArcFace embeddings are not isotropic, so members are drawn from a
+low-rank latent space plus noise. Each query is a noisy re-capture of a
+random member (cosine ≈ 0.7 to its own template), like a second selfie.
+
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.faiss_manager import build_index, set_search_params
+
+
+INDEX_TYPES = ["Flat", "IVFFlat", "IVFPQ", "HNSW", "SQ8"]
+
+
+def synthetic_gallery(n, dim=512, latent=64, seed=0):
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((latent, dim)).astype("float32")
+
+    gallery = np.empty((n, dim), dtype="float32")
+    chunk = 100000
+
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        z = rng.standard_normal((stop - start, latent)).astype("float32")
+        noise = rng.standard_normal((stop - start, dim)).astype("float32")
+        gallery[start:stop] = z @ basis + noise * 4.0
+
+    faiss.normalize_L2(gallery)
+    return gallery
+
+
+def synthetic_queries(gallery, nq=1000, seed=1):
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(gallery), nq)
+
+    noise = rng.standard_normal((nq, gallery.shape[1])).astype("float32")
+    faiss.normalize_L2(noise)
+
+    queries = gallery[rows] + noise
+    faiss.normalize_L2(queries)
+    return queries, rows
+
+
+def run(index_type, gallery, queries, truth, k, nprobe, ef_search):
+    start = time.perf_counter()
+    index = build_index(index_type, gallery.shape[1], len(gallery))
+    index.train(gallery)
+    index.add(gallery)
+    set_search_params(index, nprobe, ef_search)
+    build_s = time.perf_counter() - start
+
+    latencies = []
+    found = np.empty((len(queries), k), dtype="int64")
+
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found[i] = ids[0]
+
+    latencies = np.array(latencies)
+
+    return {
+        "index_type": index_type,
+        "size": len(gallery),
+        "recall@1": float(np.mean(found[:, 0] == truth[:, 0])),
+        f"recall@{k}": float(np.mean([truth[i, 0] in found[i] for i in range(len(found))])),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "build_s": round(build_s, 2),
+        "index_mb": round(faiss.serialize_index(index).nbytes / 1e6, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FAISS recall vs latency on synthetic galleries")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--types", nargs="+", default=INDEX_TYPES)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    results = []
+
+    print(f"{'size':>9} {'index':>8} {'R@1':>6} {'R@' + str(args.k):>6} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'MB':>8}")
+
+    for size in args.sizes:
+        gallery = synthetic_gallery(size)
+        queries, _ = synthetic_queries(gallery, args.queries)
+
+        exact = faiss.IndexFlatIP(gallery.shape[1])
+        exact.add(gallery)
+        _, truth = exact.search(queries, 1)
+
+        for index_type in args.types:
+            r = run(index_type, gallery, queries, truth, args.k, args.nprobe, args.ef_search)
+            results.append(r)
+
+            print(f"{size:>9} {index_type:>8} {r['recall@1']:>6.3f} {r[f'recall@{args.k}']:>6.3f} "
+                  f"{r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['build_s']:>8.2f} {r['index_mb']:>8.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+detection_cascade.py
+------------------
+
+Purpose:
+• Compare single-pass detection (original 640×640 path) with the
+  coarse → fine cascade on a folder of test images
+• Report per-image latency and how often both paths agree
+
+Agreement:
+• outcome  → both accept, or both reject with the same reason
+• bbox IoU → for images both paths accept
+• cosine   → similarity of the two embeddings (alignment quality)
+
+Usage:
+    python benchmarks/detection_cascade.py path/to/images
+    python benchmarks/detection_cascade.py path/to/images --repeat 5 --json cascade.json
+
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.face_detector import FaceDetector
+
+
+def load_images(folder):
+    paths = []
+    for ext in ("jpg", "jpeg", "png"):
+        paths += glob.glob(os.path.join(folder, f"*.{ext}"))
+        paths += glob.glob(os.path.join(folder, f"*.{ext.upper()}"))
+
+    images = []
+    for path in sorted(paths):
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append((os.path.basename(path), image))
+
+    return images
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def timed(detect, image, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = detect(image)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-pass vs cascade face detection")
+    parser.add_argument("images", help="Folder of test images")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per image (best time is kept)")
+    parser.add_argument("--coarse-size", type=int, default=320)
+    parser.add_argument("--fine-size", type=int, default=256)
+    parser.add_argument("--json", help="Write per-image results to this file")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"❌ No images found in {args.images}")
+        sys.exit(1)
+
+    # Baseline: the original path, FaceAnalysis.get() on a fixed
+    # 640×640 canvas with every model in the pack
+    baseline = FaceDetector(det_size=640, cascade=False)
+
+    def baseline_detect(image):
+        return baseline._select_single_face(image, baseline.app.get(image))
+
+    cascade = FaceDetector(
+        det_size=640,
+        cascade=True,
+        coarse_size=args.coarse_size,
+        fine_size=args.fine_size
+    )
+
+    rows = []
+
+    for name, image in images:
+        (b_crop, b_face), b_ms = timed(baseline_detect, image, args.repeat)
+        (c_crop, c_face), c_ms = timed(cascade.detect_single_face, image, args.repeat)
+
+        b_ok = b_crop is not None
+        c_ok = c_crop is not None
+
+        row = {
+            "image": name,
+            "shape": list(image.shape[:2]),
+            "baseline_ms": round(b_ms, 2),
+            "cascade_ms": round(c_ms, 2),
+            "baseline": "ok" if b_ok else b_face,
+            "cascade": "ok" if c_ok else c_face,
+            "agree": (b_ok and c_ok) or (not b_ok and not c_ok and b_face == c_face)
+        }
+
+        if b_ok and c_ok:
+            row["iou"] = round(iou(b_face.bbox, c_face.bbox), 3)
+            row["cosine"] = round(float(np.dot(b_face.normed_embedding, c_face.normed_embedding)), 4)
+
+        rows.append(row)
+        print(f"{name:<32} {row['baseline_ms']:>8.1f} ms {row['cascade_ms']:>8.1f} ms  "
+              f"{'agree' if row['agree'] else 'DIFFER'}  {row.get('iou', '')} {row.get('cosine', '')}")
+
+    both = [r for r in rows if "iou" in r]
+    print()
+    print(f"Images:            {len(rows)}")
+    print(f"Median baseline:   {np.median([r['baseline_ms'] for r in rows]):.1f} ms")
+    print(f"Median cascade:    {np.median([r['cascade_ms'] for r in rows]):.1f} ms")
+    print(f"Outcome agreement: {np.mean([r['agree'] for r in rows]) * 100:.1f}%")
+    if both:
+        print(f"Mean bbox IoU:     {np.mean([r['iou'] for r in both]):.3f}")
+        print(f"Min cosine:        {np.min([r['cosine'] for r in both]):.4f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
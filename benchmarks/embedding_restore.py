@@ -0,0 +1,151 @@
+"""
+embedding_restore.py
+------------------
+
+Purpose:
+• Time a packed gallery backup (cloud_backup/embedding_backup.py)
+  and a full restore into an empty FaissManager
+• Check the restored gallery: same members, same top-1 matches
+• Compare with the row-per-face path (one FLOAT4[] row fetched and
+  one FaissManager.add per face), timed on a sample and extrapolated
+
+Usage:
+    python benchmarks/embedding_restore.py
+    python benchmarks/embedding_restore.py --size 1000000 --dtype float16 --json restore.json
+    python benchmarks/embedding_restore.py --store sqlite:///tmp/cloud.db
+
+The default store is a temp directory; pass --store for the SQLite
+stand-in or a Postgres database.
+
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai.faiss_manager import FaissManager
+from benchmarks.ann_recall import synthetic_gallery, synthetic_queries
+from cloud_backup.embedding_backup import open_store, restore_backup, write_backup
+
+
+def manager(work, name, index_type, migrate_threshold):
+    return FaissManager(
+        index_path=os.path.join(work, name, "faiss.index"),
+        meta_path=os.path.join(work, name, "faiss_meta.json"),
+        index_type=index_type,
+        migrate_threshold=migrate_threshold,
+        snapshot_interval=3600
+    )
+
+
+def chunks_of(member_ids, vectors, size=100000):
+    for start in range(0, len(member_ids), size):
+        yield member_ids[start:start + size], vectors[start:start + size]
+
+
+def row_by_row_ms(work, vectors, sample):
+    """
+    Per-face cost of the old path: fetch one FLOAT4[] row, add() it.
+    """
+    import sqlite3
+
+    conn = sqlite3.connect(os.path.join(work, "rows.db"))
+    conn.execute("CREATE TABLE face_embeddings (member_id INTEGER PRIMARY KEY, embedding TEXT)")
+    conn.executemany(
+        "INSERT INTO face_embeddings VALUES (?, ?)",
+        (
+            (i, "{" + ",".join(repr(float(v)) for v in vectors[i]) + "}")
+            for i in range(sample)
+        )
+    )
+    conn.commit()
+
+    target = manager(work, "rows", "Flat", 10 ** 9)
+    start = time.perf_counter()
+
+    for member_id, text in conn.execute("SELECT member_id, embedding FROM face_embeddings"):
+        target.add(np.array(text[1:-1].split(","), dtype="float32"), member_id)
+
+    elapsed = time.perf_counter() - start
+    target.close()
+    conn.close()
+
+    return elapsed / sample * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packed embedding backup / restore timing")
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument("--dtype", default="float16", choices=["float16", "float32"])
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--index-type", default="IVFFlat")
+    parser.add_argument("--migrate-threshold", type=int, default=50000)
+    parser.add_argument("--store", help="Backup store URL (default: temp directory)")
+    parser.add_argument("--row-sample", type=int, default=2000)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="restore_bench_")
+    store = open_store(args.store or os.path.join(work, "store"))
+
+    gallery = synthetic_gallery(args.size)
+    member_ids = np.arange(1, args.size + 1, dtype="int64")
+
+    source = manager(work, "source", args.index_type, args.migrate_threshold)
+    source.restore(chunks_of(member_ids, gallery), total=args.size)
+    print(f"🧱 Source gallery: {len(source)} faces ({source.current_type()})")
+
+    t0 = time.perf_counter()
+    manifest = write_backup(source, store, device_id="bench", dtype=args.dtype, chunk_size=args.chunk_size)
+    backup_s = time.perf_counter() - t0
+
+    target = manager(work, "target", args.index_type, args.migrate_threshold)
+    t0 = time.perf_counter()
+    _, restored = restore_backup(target, store, device_id="bench")
+    restore_s = time.perf_counter() - t0
+
+    queries, _ = synthetic_queries(gallery, 1000)
+    expected = [m[0][0] for m in source.search_batch(queries)]
+    found = [m[0][0] for m in target.search_batch(queries)]
+
+    per_face_ms = row_by_row_ms(work, gallery, min(args.row_sample, args.size))
+
+    result = {
+        "size": args.size,
+        "dtype": args.dtype,
+        "index_type": target.current_type(),
+        "backup_s": round(backup_s, 2),
+        "backup_mb": round(manifest["bytes"] / 1e6, 1),
+        "chunks": len(manifest["chunks"]),
+        "restore_s": round(restore_s, 2),
+        "restored": restored,
+        "same_members": bool(np.array_equal(np.sort(source.member_ids()), np.sort(target.member_ids()))),
+        "top1_agreement": float(np.mean(np.array(expected) == np.array(found))),
+        "row_by_row_ms_per_face": round(per_face_ms, 3),
+        "row_by_row_estimate_s": round(per_face_ms * args.size / 1000, 1)
+    }
+
+    source.close()
+    target.close()
+    store.close()
+
+    print(f"☁️ {args.size} faces: backup {backup_s:.1f}s ({result['backup_mb']} MB), "
+          f"restore {restore_s:.1f}s vs ~{result['row_by_row_estimate_s']}s row by row")
+    for key, value in result.items():
+        print(f"   {key}: {value}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+model_profiles.py
+------------------
+
+Purpose:
+• Measure each face model profile (ai/face_detector.MODEL_PROFILES):
+  startup time, resident memory and per-face latency
+• Each profile is loaded in a fresh process so memory is not shared
+
+Usage:
+    python benchmarks/model_profiles.py --images path/to/selfies
+    python benchmarks/model_profiles.py --profiles buffalo_l buffalo_l_lean --json profiles.json
+
+Without --images, a synthetic frame is used and only detection cost is
+measured (no face → no recognition).
+
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def rss_mb():
+    """
+    Current resident set size (Linux), falling back to peak RSS.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def measure(profile, images_dir, repeat):
+    """
+    Runs inside the child process.
+    """
+    import cv2
+    from ai.face_detector import FaceDetector
+
+    base_rss = rss_mb()
+    start = time.perf_counter()
+    detector = FaceDetector(profile=profile)
+    startup_s = time.perf_counter() - start
+    model_rss = rss_mb() - base_rss
+
+    images = []
+    if images_dir:
+        for name in sorted(os.listdir(images_dir)):
+            image = cv2.imread(os.path.join(images_dir, name), cv2.IMREAD_COLOR)
+            if image is not None:
+                images.append(image)
+    if not images:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)]
+
+    # Warm-up (ONNX Runtime allocates on first run)
+    detector.detect_single_face(images[0])
+
+    latencies = []
+    faces = 0
+    for _ in range(repeat):
+        for image in images:
+            t0 = time.perf_counter()
+            face_img, _ = detector.detect_single_face(image)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            faces += face_img is not None
+
+    return {
+        "profile": profile,
+        "models": list(detector.app.models),
+        "startup_s": round(startup_s, 2),
+        "model_rss_mb": round(model_rss, 1),
+        "total_rss_mb": round(rss_mb(), 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "faces_found": faces,
+        "runs": len(latencies)
+    }
+
+
+def main():
+    from ai.face_detector import MODEL_PROFILES
+
+    parser = argparse.ArgumentParser(description="Startup / memory / latency per face model profile")
+    parser.add_argument("--profiles", nargs="+", default=list(MODEL_PROFILES))
+    parser.add_argument("--images", help="Folder of single-face test images")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.images, args.repeat)))
+        return
+
+    results = []
+    print(f"{'profile':<16} {'startup s':>10} {'models MB':>10} {'p50 ms':>8} {'p95 ms':>8}  models")
+
+    for profile in args.profiles:
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", profile, "--repeat", str(args.repeat)]
+        if args.images:
+            cmd += ["--images", args.images]
+
+        proc = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT)
+        if proc.returncode != 0:
+            print(f"❌ {profile} failed:\n{proc.stderr[-2000:]}")
+            continue
+
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append(r)
+        print(f"{r['profile']:<16} {r['startup_s']:>10.2f} {r['model_rss_mb']:>10.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}  {', '.join(r['models'])}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
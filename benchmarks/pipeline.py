@@ -0,0 +1,548 @@
+"""
+pipeline.py
+------------------
+
+Purpose:
+• Time every stage of /register on its own, and end to end:
+    decode.base64          data URL → bytes
+    decode.imdecode        face_pipeline.decode_image (decode_max_side)
+    detect.single_face     FaceDetector.detect_single_face (incl. ArcFace)
+    quality.evaluate       evaluate_face_quality on the face crop
+    embed.get_embedding    get_embedding on the detected face
+    faiss.add/save/search  FaissManager at each gallery size
+    sqlite.insert          the members INSERT transaction
+    register.end_to_end    all of the above for one request
+• Synthetic selfies and galleries only, seeded, so every run sees the
+  same inputs
+• Results go to JSON; --compare flags stages that got slower
+
+Usage:
+    python benchmarks/pipeline.py --json baseline.json
+    python benchmarks/pipeline.py --sizes 1000 100000 --json after.json --baseline baseline.json
+    python benchmarks/pipeline.py --compare baseline.json after.json
+
+Settings come from config/config.yaml (faiss section, detection,
+decode_max_side), so a config change is measured like a code change.
+Files are written to a temporary directory.
+
+Memory: a gallery snapshot is serialized in memory before it is
+written, so save@N needs about twice the gallery (1M fp32 faces:
+~6 GB; --precision fp16 halves it). With faiss.shared the snapshot is
+mapped and save@N reads a private copy to publish from: about the same.
+
+Without the face models (~/.insightface/models), the detection,
+embedding and end-to-end stages are skipped and the reason is recorded.
+--compare exits with status 1 when a stage regressed.
+
+"""
+
+import argparse
+import base64
+import datetime
+import glob
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import faiss
+import numpy as np
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai.face_embedding import get_embedding
+from ai.face_pipeline import decode_image, process_image
+from ai.face_quality import configure as configure_quality, evaluate_face_quality
+from ai.faiss_manager import FaissManager
+from benchmarks.ann_recall import synthetic_gallery
+from database.db import Database
+
+
+MEMBER_INSERT = """
+    INSERT INTO members (
+        first_name, last_name, phone, whatsapp_number, email, residential_city,
+        country, state, branch_id, device_id, role, level, ministry_name, is_worker, created_at
+    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+
+# --------------------------------------------------
+# Timing
+# --------------------------------------------------
+def measure(fn, repeat, warmup=2, setup=None):
+    """
+    Call fn() warmup + repeat times, timing only the last repeat calls
+    (setup() runs untimed before each call).
+
+    Returns:
+        stats dict, last result
+    """
+    times = []
+    result = None
+
+    for i in range(warmup + repeat):
+        if setup is not None:
+            setup()
+
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+
+        if i >= warmup:
+            times.append(elapsed)
+
+    times = np.array(times)
+
+    return {
+        "n": len(times),
+        "median_ms": round(float(np.median(times)), 4),
+        "p95_ms": round(float(np.percentile(times, 95)), 4),
+        "mean_ms": round(float(times.mean()), 4),
+        "min_ms": round(float(times.min()), 4)
+    }, result
+
+
+# --------------------------------------------------
+# Synthetic inputs
+# --------------------------------------------------
+def sample_face():
+    """
+    A real face to paste into synthetic selfies (InsightFace ships a
+    few sample images), so detection runs its accept path.
+    """
+    try:
+        import insightface
+    except ImportError:
+        return None
+
+    path = os.path.join(os.path.dirname(insightface.__file__), "data", "images", "Tom_Hanks_54745.png")
+    return cv2.imread(path, cv2.IMREAD_COLOR)
+
+
+def synthetic_selfie(width, height, seed=0, face=None):
+    """
+    Phone-camera-sized frame: smooth background + sensor noise, with
+    face (if given) centred at ~45% of the frame height.
+    """
+    rng = np.random.default_rng(seed)
+
+    gradient = np.linspace(60, 190, width, dtype="float32")[None, :, None]
+    tint = rng.uniform(0.8, 1.2, 3).astype("float32")[None, None, :]
+    frame = np.broadcast_to(gradient * tint, (height, width, 3)).copy()
+    frame += rng.normal(0, 6, frame.shape).astype("float32")
+
+    if face is not None:
+        side = int(height * 0.45)
+        scale = side / max(face.shape[:2])
+        crop = cv2.resize(face, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        y = (height - crop.shape[0]) // 2
+        x = (width - crop.shape[1]) // 2
+        frame[y:y + crop.shape[0], x:x + crop.shape[1]] = crop
+
+    return np.clip(frame, 0, 255).astype("uint8")
+
+
+def load_frames(args):
+    """
+    JPEG bytes of the test frames: --images, or seeded synthetic selfies.
+    """
+    if args.images:
+        paths = sorted(
+            p for ext in ("jpg", "jpeg", "png", "JPG", "JPEG", "PNG")
+            for p in glob.glob(os.path.join(args.images, f"*.{ext}"))
+        )
+        frames = [cv2.imread(p, cv2.IMREAD_COLOR) for p in paths]
+        frames = [f for f in frames if f is not None]
+    else:
+        face = sample_face()
+        frames = [synthetic_selfie(args.width, args.height, seed, face) for seed in range(args.frames)]
+
+    return [cv2.imencode(".jpg", f, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes() for f in frames]
+
+
+def gallery_chunks(size, dim, chunk=100000):
+    """
+    (member_ids, embeddings) chunks for FaissManager.restore, generated
+    chunk by chunk so a 1M gallery is never held twice.
+    """
+    for start in range(0, size, chunk):
+        n = min(chunk, size - start)
+        yield np.arange(start + 1, start + n + 1, dtype="int64"), synthetic_gallery(n, dim, seed=start)
+
+
+def random_embedding(rng, dim):
+    vector = rng.standard_normal(dim).astype("float32")
+    return vector / np.linalg.norm(vector)
+
+
+# --------------------------------------------------
+# Stages
+# --------------------------------------------------
+def open_gallery(faiss_config, size, workdir):
+    """
+    FaissManager built from the faiss config, files in workdir,
+    filled with a synthetic gallery of size faces.
+    """
+    config = dict(
+        faiss_config,
+        index_path=os.path.join(workdir, "faiss.index"),
+        meta_path=os.path.join(workdir, "faiss_meta.json"),
+        journal_path=os.path.join(workdir, "faiss.index.journal"),
+        # Snapshots only when the benchmark asks for one
+        snapshot_every=10 ** 9,
+        snapshot_interval_seconds=3600
+    )
+
+    manager = FaissManager.from_config(config)
+    manager.restore(gallery_chunks(size, manager.dim), total=size)
+    return manager
+
+
+def bench_faiss(faiss_config, size, args, stages):
+    workdir = tempfile.mkdtemp(prefix="pipeline_faiss_")
+    rng = np.random.default_rng(size)
+
+    try:
+        start = time.perf_counter()
+        manager = open_gallery(faiss_config, size, workdir)
+        print(f"🗂️  Gallery of {size:,} faces ({manager.current_type()}, "
+              f"{manager.current_precision()}) ready in {time.perf_counter() - start:.1f}s")
+
+        next_id = itertools.count(size + 1)
+        queries = synthetic_gallery(min(size, 1000), manager.dim, seed=0)
+        queries += rng.standard_normal(queries.shape).astype("float32") * 0.03
+        query = itertools.cycle(queries)
+
+        stages[f"faiss.add@{size}"], _ = measure(
+            lambda: manager.add(random_embedding(rng, manager.dim), next(next_id)),
+            args.repeat
+        )
+
+        stages[f"faiss.search@{size}"], _ = measure(
+            lambda: manager.search(next(query), top_k=1),
+            args.repeat
+        )
+
+        # One pending registration before each snapshot
+        stages[f"faiss.save@{size}"], _ = measure(
+            manager.save,
+            args.save_repeat,
+            warmup=1,
+            setup=lambda: manager.add(random_embedding(rng, manager.dim), next(next_id))
+        )
+
+        manager.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def open_database(workdir):
+    db = Database(db_path=os.path.join(workdir, "church.db"))
+
+    with open(os.path.join(ROOT, "database", "schema.sql")) as f:
+        db.connection().executescript(f.read())
+
+    return db
+
+
+def insert_member(db, n):
+    with db.transaction() as cur:
+        cur.execute(MEMBER_INSERT, (
+            "Bench", f"Member{n}", f"+23480{n:08d}", f"+23480{n:08d}", "", "Lagos",
+            "Nigeria", "Lagos", None, "bench", "member", 1, "", False,
+            datetime.datetime.now().isoformat()
+        ))
+        return cur.lastrowid
+
+
+def bench_sqlite(args, stages):
+    workdir = tempfile.mkdtemp(prefix="pipeline_sqlite_")
+
+    try:
+        db = open_database(workdir)
+        n = itertools.count()
+
+        stages["sqlite.insert"], _ = measure(lambda: insert_member(db, next(n)), args.repeat)
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_images(frames, data_urls, decode_max_side, detector, args, stages):
+    url = itertools.cycle(data_urls)
+    frame = itertools.cycle(frames)
+
+    stages["decode.base64"], _ = measure(
+        lambda: base64.b64decode(next(url).split(",")[1]),
+        args.repeat
+    )
+
+    stages["decode.imdecode"], _ = measure(
+        lambda: decode_image(next(frame), decode_max_side)[0],
+        args.repeat
+    )
+
+    images = [decode_image(f, decode_max_side)[0] for f in frames]
+    image = itertools.cycle(images)
+
+    if detector is None:
+        # Quality on a centred crop of the same size a face would have
+        h, w = images[0].shape[:2]
+        side = int(h * 0.45)
+        crop = images[0][(h - side) // 2:(h + side) // 2, (w - side) // 2:(w + side) // 2]
+
+        stages["quality.evaluate"], _ = measure(
+            lambda: evaluate_face_quality(crop, frame_shape=images[0].shape),
+            args.repeat
+        )
+        return None
+
+    stages["detect.single_face"], _ = measure(lambda: detector.detect_single_face(next(image)), args.repeat)
+
+    face_img, face = detector.detect_single_face(images[0])
+    if face_img is None:
+        print(f"⚠️  No face accepted in the test frame ({face}); quality and embedding skipped")
+        return face
+
+    stages["quality.evaluate"], _ = measure(
+        lambda: evaluate_face_quality(face_img, frame_shape=images[0].shape),
+        args.repeat
+    )
+    stages["embed.get_embedding"], _ = measure(lambda: get_embedding(face), args.repeat)
+
+    return None
+
+
+def bench_end_to_end(data_urls, decode_max_side, detector, faiss_config, size, args, stages):
+    """
+    One /register request without Flask: decode → pipeline →
+    members INSERT + gallery add in one transaction.
+    """
+    workdir = tempfile.mkdtemp(prefix="pipeline_e2e_")
+    url = itertools.cycle(data_urls)
+    outcomes = []
+
+    try:
+        manager = open_gallery(faiss_config, size, workdir)
+        db = open_database(workdir)
+        n = itertools.count()
+
+        def register():
+            analysis = process_image(detector, base64.b64decode(next(url).split(",")[1]), decode_max_side)
+            outcomes.append(analysis["passed"])
+
+            if not analysis["passed"]:
+                return
+
+            with db.transaction() as cur:
+                cur.execute(MEMBER_INSERT, (
+                    "Bench", "Register", f"+23481{next(n):08d}", "", "", "", "Nigeria", "Lagos",
+                    None, "bench", "member", 1, "", False, datetime.datetime.now().isoformat()
+                ))
+                manager.add(analysis["embedding"], cur.lastrowid)
+
+        stats, _ = measure(register, args.repeat)
+        stats["gallery_size"] = size
+        stats["accepted"] = round(float(np.mean(outcomes)), 3)
+        stages["register.end_to_end"] = stats
+
+        manager.close()
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# --------------------------------------------------
+# Run / compare
+# --------------------------------------------------
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_detector(config):
+    from ai.face_detector import FaceDetector
+
+    detection = config["face_recognition"].get("detection", {})
+
+    return FaceDetector(
+        profile=config["face_recognition"].get("model", "buffalo_l"),
+        det_size=detection.get("det_size", 640),
+        cascade=detection.get("cascade", False),
+        coarse_size=detection.get("coarse_size", 320),
+        fine_size=detection.get("fine_size", 256),
+        roi_margin=detection.get("roi_margin", 0.5)
+    )
+
+
+def run(args):
+    with open(os.path.join(ROOT, "config", "config.yaml")) as f:
+        config = yaml.safe_load(f)
+
+    configure_quality(config["face_recognition"])
+    decode_max_side = config["registration_portal"].get("uploads", {}).get("decode_max_side", 0)
+    faiss_config = dict(config["faiss"])
+    if args.index_type:
+        faiss_config["index_type"] = args.index_type
+    if args.precision:
+        faiss_config["precision"] = args.precision
+
+    frames = load_frames(args)
+    if not frames:
+        raise SystemExit(f"❌ No images found in {args.images}")
+
+    data_urls = ["data:image/jpeg;base64," + base64.b64encode(f).decode() for f in frames]
+
+    stages = {}
+    skipped = {}
+
+    detector = None
+    reason = "--no-models"
+    if not args.no_models:
+        try:
+            detector = load_detector(config)
+        except Exception as e:
+            reason = f"face models unavailable ({type(e).__name__})"
+
+    if detector is None:
+        for stage in ("detect.single_face", "embed.get_embedding", "register.end_to_end"):
+            skipped[stage] = reason
+        print(f"⚠️  Skipping model stages ({reason})")
+
+    reason = bench_images(frames, data_urls, decode_max_side, detector, args, stages)
+    if reason is not None:
+        skipped["quality.evaluate"] = skipped["embed.get_embedding"] = f"no face accepted: {reason}"
+
+    bench_sqlite(args, stages)
+
+    for size in args.sizes:
+        bench_faiss(faiss_config, size, args, stages)
+
+    if detector is not None:
+        bench_end_to_end(data_urls, decode_max_side, detector, faiss_config, args.sizes[0], args, stages)
+
+    return {
+        "meta": {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "numpy": np.__version__,
+            "faiss": faiss.__version__,
+            "opencv": cv2.__version__,
+            "frames": len(frames),
+            "frame_bytes": int(np.mean([len(f) for f in frames])),
+            "decode_max_side": decode_max_side,
+            "faiss_index_type": faiss_config.get("index_type", "Flat"),
+            "faiss_precision": faiss_config.get("precision", "fp32"),
+            "repeat": args.repeat
+        },
+        "stages": stages,
+        "skipped": skipped
+    }
+
+
+def compare(old, new, threshold, min_delta_ms):
+    """
+    Compare median times stage by stage. A stage regressed when it is
+    more than threshold slower and at least min_delta_ms slower.
+
+    Returns:
+        list of regressed stage names
+    """
+    regressions = []
+
+    print(f"{'stage':<28} {'old ms':>10} {'new ms':>10} {'change':>8}")
+
+    for stage in sorted(set(old["stages"]) | set(new["stages"])):
+        if stage not in old["stages"] or stage not in new["stages"]:
+            side = "new" if stage not in old["stages"] else "old"
+            print(f"{stage:<28} {'only in ' + side:>30}")
+            continue
+
+        before = old["stages"][stage]["median_ms"]
+        after = new["stages"][stage]["median_ms"]
+        change = (after - before) / before if before else 0.0
+
+        flag = ""
+        if change > threshold and after - before >= min_delta_ms:
+            flag = "  ❌ REGRESSION"
+            regressions.append(stage)
+        elif change < -threshold and before - after >= min_delta_ms:
+            flag = "  ✅ faster"
+
+        print(f"{stage:<28} {before:>10.3f} {after:>10.3f} {change * 100:>+7.1f}%{flag}")
+
+    for label, result in (("old", old), ("new", new)):
+        meta = result.get("meta", {})
+        print(f"{label}: commit {meta.get('commit')}, {meta.get('created_at')}, "
+              f"{meta.get('cpus')} CPUs, faiss {meta.get('faiss')}")
+
+    print(f"\n{len(regressions)} regression(s) above {threshold * 100:.0f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage timings of the registration pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000],
+                        help="Gallery sizes for the FAISS stages")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed calls per stage")
+    parser.add_argument("--index-type", help="Override faiss.index_type from config.yaml")
+    parser.add_argument("--precision", help="Override faiss.precision from config.yaml")
+    parser.add_argument("--save-repeat", type=int, default=3, help="Timed snapshots per gallery size")
+    parser.add_argument("--images", help="Folder of selfies to use instead of synthetic frames")
+    parser.add_argument("--frames", type=int, default=8, help="Synthetic frames")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--no-models", action="store_true", help="Skip stages that need the face models")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare this run against an earlier --json file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Only compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown that counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore smaller absolute slowdowns")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+
+        sys.exit(1 if compare(old, new, args.threshold, args.min_delta_ms) else 0)
+
+    result = run(args)
+
+    print()
+    for stage, stats in result["stages"].items():
+        print(f"{stage:<28} median {stats['median_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms")
+    for stage, reason in result["skipped"].items():
+        print(f"{stage:<28} skipped ({reason})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            old = json.load(f)
+
+        print()
+        sys.exit(1 if compare(old, result, args.threshold, args.min_delta_ms) else 0)
+
+
+if __name__ == "__main__":
+    main()
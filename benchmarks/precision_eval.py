@@ -0,0 +1,163 @@
+"""
+precision_eval.py
+------------------
+
+Purpose:
+• Measure what compressed embedding storage costs in recognition
+  accuracy, at the configured face_recognition.recognition_threshold
+• Gallery precisions (faiss.precision): fp32, fp16, sq8, pq
+• Backup dtypes (sync.embedding_backup.dtype): float16, int8, pq
+  (gallery restored from the backup, searched at fp32)
+• Per variant: bytes per face, genuine match rate, false match rate,
+  decisions that differ from fp32, mean |score change|
+
+Usage:
+    python benchmarks/precision_eval.py
+    python benchmarks/precision_eval.py --size 100000 --queries 5000 --json precision.json
+    python benchmarks/precision_eval.py --threshold 0.55 --pq-m 32
+
+Synthetic faces:
+Members come from benchmarks/ann_recall.synthetic_gallery. A genuine
+query is a re-capture of a member whose cosine to the template is
+spread across ~0.55–0.9, so plenty of them sit near the threshold,
+where precision loss can flip a decision. Impostors are people from
+the same distribution who are not in the gallery.
+
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import faiss
+import numpy as np
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai.faiss_manager import build_index
+from benchmarks.ann_recall import synthetic_gallery
+from cloud_backup.embedding_backup import pack_chunk, train_codebook, unpack_chunk
+
+
+PRECISIONS = ["fp32", "fp16", "sq8", "pq"]
+BACKUP_DTYPES = ["float16", "int8", "pq"]
+
+
+def genuine_queries(gallery, nq, seed=1):
+    """
+    Noisy re-captures: cosine to the template = 1 / sqrt(1 + s²),
+    s ~ U(0.5, 1.5).
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(gallery), nq)
+
+    noise = rng.standard_normal((nq, gallery.shape[1])).astype("float32")
+    faiss.normalize_L2(noise)
+    noise *= rng.uniform(0.5, 1.5, (nq, 1)).astype("float32")
+
+    queries = gallery[rows] + noise
+    faiss.normalize_L2(queries)
+    return queries, rows
+
+
+def decide(index, queries, threshold):
+    """
+    Top-1 (member row or -1 below threshold) and score per query.
+    """
+    scores, rows = index.search(queries, 1)
+    scores, rows = scores[:, 0], rows[:, 0]
+    return np.where(scores >= threshold, rows, -1), scores
+
+
+def evaluate(name, index, bytes_per_face, genuine, truth, impostors, threshold, baseline=None):
+    accepted, scores = decide(index, genuine, threshold)
+    rejected_impostors, impostor_scores = decide(index, impostors, threshold)
+
+    result = {
+        "variant": name,
+        "bytes_per_face": round(bytes_per_face, 1),
+        "match_rate": float(np.mean(accepted == truth)),
+        "false_match_rate": float(np.mean(rejected_impostors != -1)),
+        "_decisions": np.concatenate([accepted, rejected_impostors]),
+        "_scores": np.concatenate([scores, impostor_scores])
+    }
+
+    if baseline is not None:
+        result["decisions_changed"] = int(np.sum(result["_decisions"] != baseline["_decisions"]))
+        result["mean_abs_score_delta"] = float(np.mean(np.abs(result["_scores"] - baseline["_scores"])))
+        result["match_rate_delta"] = round(result["match_rate"] - baseline["match_rate"], 5)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Match rate vs embedding precision")
+    parser.add_argument("--config", default=os.path.join(ROOT, "config", "config.yaml"))
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--threshold", type=float, help="Default: face_recognition.recognition_threshold")
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    threshold = args.threshold
+    if threshold is None:
+        with open(args.config) as f:
+            threshold = yaml.safe_load(f)["face_recognition"].get("recognition_threshold", 0.62)
+
+    people = synthetic_gallery(args.size + args.queries)
+    gallery, impostors = people[:args.size], people[args.size:]
+    genuine, truth = genuine_queries(gallery, args.queries)
+    dim = gallery.shape[1]
+
+    print(f"🎯 {args.size} faces, {args.queries} genuine + {args.queries} impostor queries, "
+          f"threshold {threshold}")
+    print(f"{'variant':>16} {'B/face':>8} {'match':>8} {'Δmatch':>8} {'false':>8} {'changed':>8} {'|Δscore|':>9}")
+
+    results = []
+    baseline = None
+
+    # Gallery precision (what FaissManager keeps in RAM / on disk)
+    for precision in PRECISIONS:
+        index = build_index("Flat", dim, args.size, pq_m=args.pq_m, precision=precision)
+        if not index.is_trained:
+            index.train(gallery)
+        index.add(gallery)
+
+        bytes_per_face = faiss.serialize_index(index).nbytes / args.size
+        r = evaluate(f"gallery {precision}", index, bytes_per_face, genuine, truth, impostors, threshold, baseline)
+        baseline = baseline or r
+        results.append(r)
+
+    # Backup dtype (what a restored gallery looks like)
+    for dtype in BACKUP_DTYPES:
+        pq = train_codebook(gallery[:min(args.size, 20000)], args.pq_m) if dtype == "pq" else None
+        data, _ = pack_chunk(np.arange(args.size), gallery, dtype, pq)
+        _, restored, _ = unpack_chunk(data, pq)
+
+        restored = np.array(restored, dtype="float32")
+        faiss.normalize_L2(restored)
+        index = faiss.IndexFlatIP(dim)
+        index.add(restored)
+
+        r = evaluate(f"backup {dtype}", index, len(data) / args.size, genuine, truth, impostors, threshold, baseline)
+        results.append(r)
+
+    for r in results:
+        print(f"{r['variant']:>16} {r['bytes_per_face']:>8.1f} {r['match_rate']:>8.4f} "
+              f"{r.get('match_rate_delta', 0.0):>+8.4f} {r['false_match_rate']:>8.4f} "
+              f"{r.get('decisions_changed', 0):>8} {r.get('mean_abs_score_delta', 0.0):>9.5f}")
+
+    results = [{k: v for k, v in r.items() if not k.startswith("_")} for r in results]
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"threshold": threshold, "size": args.size, "queries": args.queries, "results": results},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
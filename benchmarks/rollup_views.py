@@ -0,0 +1,230 @@
+"""
+rollup_views.py
+------------------
+
+Purpose:
+• Query time of the reporting views (cloud_backup/views.sql) on the
+  attendance rollups vs the original definitions that group the raw
+  attendance table (default: 3M attendance rows, 50k members)
+• Check both return the same report
+• Cost of keeping the rollups up to date: one sync-sized insert batch
+  with and without the rollup triggers, plus a delete
+• Check the rollups still match a full re-aggregation afterwards
+
+Usage:
+    python benchmarks/rollup_views.py --dsn postgresql://localhost/coza_test
+    python benchmarks/rollup_views.py --dsn … --attendance 5000000 --json rollups.json
+
+Needs a Postgres database (psycopg2). Everything is created in a
+scratch schema (rollup_bench) that is dropped first.
+
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+
+SCHEMA = "rollup_bench"
+
+# views.sql before the rollups
+LEGACY_VIEWS = """
+CREATE VIEW legacy_visiting_members AS
+SELECT m.id, m.first_name, m.last_name, m.phone, m.role, m.level,
+       COUNT(a.id) AS visit_count, MIN(a.timestamp) AS first_visit, MAX(a.timestamp) AS last_visit
+FROM attendance a
+JOIN members m ON m.id = a.member_id
+WHERE a.visit_type = 'visitor'
+GROUP BY m.id;
+
+CREATE VIEW legacy_top_visiting_members AS
+SELECT m.id, m.first_name, m.last_name, m.phone, m.level, COUNT(a.id) AS visits_last_50_days
+FROM attendance a
+JOIN members m ON m.id = a.member_id
+WHERE a.visit_type = 'visitor' AND a.timestamp >= NOW() - INTERVAL '50 days'
+GROUP BY m.id
+HAVING COUNT(a.id) >= 2
+ORDER BY visits_last_50_days DESC;
+"""
+
+ROLLUP_DRIFT = """
+SELECT COUNT(*) FROM (
+    (SELECT member_id, visit_type, visits, first_visit, last_visit FROM attendance_member_totals
+     EXCEPT
+     SELECT member_id, visit_type, COUNT(*), MIN(timestamp), MAX(timestamp)
+     FROM attendance GROUP BY 1, 2)
+    UNION ALL
+    (SELECT member_id, visit_type, COUNT(*), MIN(timestamp), MAX(timestamp)
+     FROM attendance GROUP BY 1, 2
+     EXCEPT
+     SELECT member_id, visit_type, visits, first_visit, last_visit FROM attendance_member_totals)
+) drift
+"""
+
+
+def run_file(cur, name):
+    with open(os.path.join(ROOT, "cloud_backup", name)) as f:
+        cur.execute(f.read())
+
+
+def timed(cur, sql, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cur.execute(sql)
+        rows = cur.fetchall()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), rows
+
+
+def load(cur, members, attendance, branches=20):
+    cur.execute("SELECT setseed(0.42)")
+    cur.execute(
+        "INSERT INTO members (id, first_name, last_name, phone, country, state, branch_id) "
+        "SELECT g, 'First' || g, 'Last' || g, '+23480' || lpad(g::TEXT, 8, '0'), 'Nigeria', 'Lagos', "
+        "1 + floor(random() * %s)::INT FROM generate_series(1, %s) g",
+        (branches, members)
+    )
+
+    # visit_type set here: detect_visit_type is installed after the load
+    cur.execute(
+        "INSERT INTO attendance (member_id, detected_branch_id, visit_type, timestamp, device_id, source_id) "
+        "SELECT r.member_id, r.branch, "
+        "CASE WHEN r.branch = m.branch_id THEN 'local' ELSE 'visitor' END, r.ts, 'bench', r.g "
+        "FROM ("
+        "  SELECT g, 1 + floor(random() * %s)::BIGINT AS member_id, "
+        "  1 + floor(random() * %s)::INT AS branch, "
+        "  NOW()::TIMESTAMP - random() * INTERVAL '365 days' AS ts "
+        "  FROM generate_series(1, %s) g"
+        ") r JOIN members m ON m.id = r.member_id",
+        (members, branches, attendance)
+    )
+
+
+def insert_batch(cur, members, branches, rows, first_source):
+    start = time.perf_counter()
+    cur.execute(
+        "INSERT INTO attendance (member_id, detected_branch_id, timestamp, device_id, source_id) "
+        "SELECT 1 + floor(random() * %s)::BIGINT, 1 + floor(random() * %s)::INT, "
+        "NOW()::TIMESTAMP - random() * INTERVAL '2 days', 'bench', %s + g "
+        "FROM generate_series(1, %s) g",
+        (members, branches, first_source, rows)
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reporting views: rollups vs raw attendance")
+    parser.add_argument("--dsn", default=os.environ.get("SYNC_TARGET_URL"), help="Postgres URL")
+    parser.add_argument("--members", type=int, default=50000)
+    parser.add_argument("--attendance", type=int, default=3000000)
+    parser.add_argument("--batch", type=int, default=5000, help="Rows per insert batch (one sync page)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    if psycopg2 is None:
+        raise SystemExit("psycopg2 is required (pip install psycopg2-binary)")
+    if not args.dsn:
+        raise SystemExit("Pass --dsn or set SYNC_TARGET_URL")
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}")
+
+    run_file(cur, "schema.sql")
+
+    t0 = time.perf_counter()
+    load(cur, args.members, args.attendance)
+    print(f"🧱 Loaded {args.members} members, {args.attendance} attendance rows "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+    run_file(cur, "triggers.sql")
+    run_file(cur, "rollups.sql")
+
+    t0 = time.perf_counter()
+    cur.execute("SELECT refresh_attendance_rollups()")
+    backfill_s = time.perf_counter() - t0
+
+    cur.execute(LEGACY_VIEWS)
+    run_file(cur, "views.sql")
+    cur.execute("ANALYZE")
+
+    cur.execute("SELECT COUNT(*) FROM attendance_daily")
+    daily_rows = cur.fetchone()[0]
+
+    result = {
+        "members": args.members,
+        "attendance": args.attendance,
+        "rollup_daily_rows": daily_rows,
+        "rollup_backfill_s": round(backfill_s, 2)
+    }
+
+    for view in ("visiting_members", "top_visiting_members"):
+        legacy_ms, legacy_rows = timed(cur, f"SELECT * FROM legacy_{view}", args.repeat)
+        rollup_ms, rollup_rows = timed(cur, f"SELECT * FROM {view}", args.repeat)
+
+        legacy_set, rollup_set = set(legacy_rows), set(rollup_rows)
+
+        result[view] = {
+            "legacy_ms": round(legacy_ms, 1),
+            "rollup_ms": round(rollup_ms, 1),
+            "speedup": round(legacy_ms / rollup_ms, 1),
+            "rows": len(rollup_rows),
+            "rows_differing": len(legacy_set ^ rollup_set)
+        }
+
+    # Maintenance cost: the same batch with and without the rollup triggers
+    cur.execute("SELECT MAX(source_id) FROM attendance")
+    next_source = cur.fetchone()[0] + 1
+
+    cur.execute("ALTER TABLE attendance DISABLE TRIGGER trg_rollup_attendance_insert")
+    without_ms = insert_batch(cur, args.members, 20, args.batch, next_source)
+    cur.execute("ALTER TABLE attendance ENABLE TRIGGER trg_rollup_attendance_insert")
+    cur.execute("SELECT refresh_attendance_rollups()")
+
+    with_ms = insert_batch(cur, args.members, 20, args.batch, next_source + args.batch)
+
+    t0 = time.perf_counter()
+    cur.execute("DELETE FROM attendance WHERE source_id > %s", (next_source + args.batch + args.batch // 2,))
+    delete_ms = (time.perf_counter() - t0) * 1000
+
+    cur.execute(ROLLUP_DRIFT)
+    drift = cur.fetchone()[0]
+
+    result["insert_batch"] = {
+        "rows": args.batch,
+        "without_rollups_ms": round(without_ms, 1),
+        "with_rollups_ms": round(with_ms, 1),
+        "delete_half_batch_ms": round(delete_ms, 1),
+        "rollup_drift_rows": drift
+    }
+
+    cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.close()
+
+    for key, value in result.items():
+        print(f"   {key}: {value}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+shared_gallery.py
+------------------
+
+Purpose:
+• Memory per worker with the gallery opened privately (FaissManager)
+  and shared (SharedFaissManager, faiss.shared), for 1…N worker
+  processes searching the same gallery
+• Concurrent registrations from several processes while snapshots are
+  published underneath them: every face must be there afterwards
+
+Memory is read from /proc/<pid>/smaps_rollup after the gallery is
+opened and searched, minus what the process used before opening it:
+    anon   private memory the gallery costs that worker
+    pss    its share of all pages (mapped snapshot pages are split
+           between the workers mapping them)
+The sum of pss over the workers is what the gallery really costs.
+
+Usage:
+    python benchmarks/shared_gallery.py
+    python benchmarks/shared_gallery.py --faces 1000000 --workers 1 2 4 --precision fp16 --json shared.json
+
+Settings come from config/config.yaml (faiss section). Files are
+written to a temporary directory. Exits with status 1 if a
+registration was lost.
+
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai.faiss_manager import FaissManager
+from benchmarks.pipeline import open_gallery, random_embedding
+
+
+def memory_mb():
+    """
+    Rss / Pss / Anonymous of this process, in MB.
+    """
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss", "Anonymous"):
+                values[key.lower()] = int(rest.split()[0]) / 1024
+    return values
+
+
+def gallery_config(faiss_config, workdir, shared, **overrides):
+    return dict(
+        faiss_config,
+        index_path=os.path.join(workdir, "faiss.index"),
+        meta_path=os.path.join(workdir, "faiss_meta.json"),
+        journal_path=os.path.join(workdir, "faiss.index.journal"),
+        shared=shared,
+        **overrides
+    )
+
+
+# --------------------------------------------------
+# Workers (separate processes)
+# --------------------------------------------------
+def search_worker(config, searches, barrier, results):
+    before = memory_mb()
+    manager = FaissManager.from_config(config)
+
+    rng = np.random.default_rng(os.getpid())
+    for _ in range(searches):
+        manager.search(random_embedding(rng, manager.dim), top_k=1)
+
+    after = memory_mb()
+    results.put({key: after[key] - before[key] for key in after})
+
+    # Stay mapped until every worker has measured
+    barrier.wait()
+    manager.close()
+
+
+def register_worker(config, worker, count, results):
+    manager = FaissManager.from_config(config)
+    rng = np.random.default_rng(worker)
+    start = time.perf_counter()
+
+    for i in range(count):
+        member_id = (worker + 1) * 10 ** 7 + i
+        manager.add(random_embedding(rng, manager.dim), member_id)
+        manager.search(random_embedding(rng, manager.dim), top_k=1)
+
+    results.put(time.perf_counter() - start)
+    manager.close()
+
+
+# --------------------------------------------------
+# Benchmarks
+# --------------------------------------------------
+def bench_memory(faiss_config, workdir, shared, workers, searches):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+
+    processes = [
+        context.Process(target=search_worker, args=(gallery_config(faiss_config, workdir, shared), searches, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    return {
+        "workers": workers,
+        "anon_mb_per_worker": round(float(np.mean([s["anonymous"] for s in samples])), 1),
+        "rss_mb_per_worker": round(float(np.mean([s["rss"] for s in samples])), 1),
+        "pss_mb_total": round(float(sum(s["pss"] for s in samples)), 1)
+    }
+
+
+def bench_registrations(faiss_config, workdir, workers, count, base):
+    """
+    workers processes each register count new faces into the shared
+    gallery; snapshots are published while they do.
+    """
+    config = gallery_config(
+        faiss_config, workdir, True,
+        snapshot_every=max(1, count // 4),
+        snapshot_interval_seconds=0.5
+    )
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+
+    start = time.perf_counter()
+    processes = [
+        context.Process(target=register_worker, args=(config, worker, count, results))
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    durations = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    manager = FaissManager.from_config(config)
+    expected = {(worker + 1) * 10 ** 7 + i for worker in range(workers) for i in range(count)}
+    stored = set(int(member_id) for member_id in manager.member_ids())
+    generation = manager.generation
+    size = len(manager)
+    manager.close()
+
+    return {
+        "workers": workers,
+        "registrations": len(expected),
+        "lost": len(expected - stored),
+        "gallery_size": size,
+        "expected_size": base + len(expected),
+        "snapshot_generation": generation,
+        "seconds": round(elapsed, 2),
+        "registrations_per_second": round(len(expected) / max(durations), 1)
+    }
+
+
+def run(args):
+    with open(os.path.join(ROOT, "config", "config.yaml")) as f:
+        faiss_config = dict(yaml.safe_load(f)["faiss"])
+
+    if args.index_type:
+        faiss_config["index_type"] = args.index_type
+    if args.precision:
+        faiss_config["precision"] = args.precision
+
+    workdir = tempfile.mkdtemp(prefix="shared_gallery_")
+    result = {"faces": args.faces, "memory": {"private": [], "shared": []}}
+
+    try:
+        start = time.perf_counter()
+        manager = open_gallery(dict(faiss_config, shared=False), args.faces, workdir)
+        result["index_type"] = manager.current_type()
+        result["precision"] = manager.current_precision()
+        manager.close()
+        print(f"🗂️  Gallery of {args.faces:,} faces ({result['index_type']}, {result['precision']}) "
+              f"ready in {time.perf_counter() - start:.1f}s, {os.path.getsize(os.path.join(workdir, 'faiss.index')) / 2 ** 20:.0f} MB")
+
+        for mode in ("private", "shared"):
+            for workers in args.workers:
+                sample = bench_memory(faiss_config, workdir, mode == "shared", workers, args.searches)
+                result["memory"][mode].append(sample)
+                print(f"{mode:<8} {workers} worker(s): anon {sample['anon_mb_per_worker']:>8.1f} MB/worker   "
+                      f"rss {sample['rss_mb_per_worker']:>8.1f} MB/worker   pss total {sample['pss_mb_total']:>8.1f} MB")
+
+        result["registrations"] = bench_registrations(
+            faiss_config, workdir, max(args.workers), args.registrations, args.faces
+        )
+        print(f"registrations: {json.dumps(result['registrations'])}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory of a private vs shared FAISS gallery")
+    parser.add_argument("--faces", type=int, default=200000, help="Gallery size")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker process counts")
+    parser.add_argument("--searches", type=int, default=200, help="Searches per worker before measuring")
+    parser.add_argument("--registrations", type=int, default=500, help="Faces each worker registers")
+    parser.add_argument("--index-type", help="Override faiss.index_type from config.yaml")
+    parser.add_argument("--precision", help="Override faiss.precision from config.yaml")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    sys.exit(1 if result["registrations"]["lost"] else 0)
+
+
+if __name__ == "__main__":
+    main()
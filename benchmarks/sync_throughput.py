@@ -0,0 +1,178 @@
+"""
+sync_throughput.py
+------------------
+
+Purpose:
+• Throughput of cloud_backup/sync_engine.py on a large backlog
+  (default: 10k members + 1M attendance rows)
+• Peak memory while syncing (should not grow with the backlog)
+• Resume: the run is interrupted half-way, restarted, and the target
+  is checked for missing / duplicated rows
+
+Usage:
+    python benchmarks/sync_throughput.py
+    python benchmarks/sync_throughput.py --attendance 1000000 --batch-size 5000 --json sync.json
+    python benchmarks/sync_throughput.py --target postgresql://localhost/coza_test
+
+The source is a fresh SQLite file built from database/schema.sql. The
+default target is the SQLite stand-in; pass --target for a local
+Postgres (needs psycopg2).
+
+"""
+
+import argparse
+import json
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cloud_backup.sync_engine import SyncEngine, open_target
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def build_source(path, members, attendance, seed=0):
+    rng = np.random.default_rng(seed)
+
+    conn = sqlite3.connect(path)
+    with open(os.path.join(ROOT, "database", "schema.sql")) as f:
+        conn.executescript(f.read())
+    with open(os.path.join(ROOT, "database", "seed_branches.sql")) as f:
+        conn.executescript(f.read())
+
+    conn.executemany(
+        "INSERT INTO members (id, first_name, last_name, phone, country, state, branch_id, role, level) "
+        "VALUES (?, ?, ?, ?, 'Nigeria', 'Lagos', ?, 'member', 1)",
+        (
+            (i, f"First{i}", f"Last{i}", f"+23480{i:08d}", int(rng.integers(1, 10)))
+            for i in range(1, members + 1)
+        )
+    )
+
+    chunk = 100000
+    for start in range(0, attendance, chunk):
+        n = min(chunk, attendance - start)
+        member_ids = rng.integers(1, members + 1, n)
+        branches = rng.integers(1, 10, n)
+        conn.executemany(
+            "INSERT INTO attendance (member_id, detected_branch_id, visit_type, timestamp) VALUES (?, ?, ?, ?)",
+            (
+                (int(m), int(b), "local" if b == 1 else "visitor", f"2026-01-{(start + i) % 28 + 1:02d} 10:00:00")
+                for i, (m, b) in enumerate(zip(member_ids, branches))
+            )
+        )
+
+    conn.commit()
+    conn.close()
+
+
+class InterruptingTarget:
+    """
+    Wraps a target and fails after a number of pages (simulated crash).
+    """
+
+    def __init__(self, target, fail_after_pages):
+        self.target = target
+        self.fail_after_pages = fail_after_pages
+        self.pages = 0
+
+    def upsert(self, table, rows):
+        if self.pages >= self.fail_after_pages:
+            raise ConnectionError("simulated network failure")
+        self.target.upsert(table, rows)
+        self.pages += 1
+
+    def close(self):
+        self.target.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync engine throughput + resume check")
+    parser.add_argument("--members", type=int, default=10000)
+    parser.add_argument("--attendance", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--target", help="Target URL (default: SQLite stand-in in a temp dir)")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="sync_bench_")
+    source = os.path.join(work, "church.db")
+    target_url = args.target or f"sqlite:///{os.path.join(work, 'cloud.db')}"
+    state = os.path.join(work, "sync_state.json")
+
+    t0 = time.perf_counter()
+    build_source(source, args.members, args.attendance)
+    print(f"🧱 Source built: {args.members} members, {args.attendance} attendance rows "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+    rss_before = peak_rss_mb()
+
+    # Run 1: crash half-way through the attendance backlog
+    member_pages = -(-args.members // args.batch_size)
+    attendance_pages = -(-args.attendance // args.batch_size)
+    fail_after = member_pages + attendance_pages // 2
+
+    engine = SyncEngine(source, InterruptingTarget(open_target(target_url), fail_after),
+                        state_path=state, device_id="bench", batch_size=args.batch_size)
+    t0 = time.perf_counter()
+    try:
+        engine.run_once()
+    except ConnectionError:
+        pass
+    first_s = time.perf_counter() - t0
+    first_mark = engine.state.get("attendance", 0)
+    engine.close()
+    print(f"💥 Interrupted after {first_s:.1f}s at attendance id {first_mark}")
+
+    # Run 2: resume from the saved watermarks
+    engine = SyncEngine(source, open_target(target_url), state_path=state,
+                        device_id="bench", batch_size=args.batch_size)
+    t0 = time.perf_counter()
+    stats = engine.run_once()
+    resume_s = time.perf_counter() - t0
+    engine.close()
+
+    total_rows = args.members + args.attendance
+    rows_per_s = total_rows / (first_s + resume_s)
+
+    result = {
+        "members": args.members,
+        "attendance": args.attendance,
+        "batch_size": args.batch_size,
+        "first_run_s": round(first_s, 2),
+        "resume_run_s": round(resume_s, 2),
+        "resumed_attendance_rows": stats["attendance"][0],
+        "rows_per_s": round(rows_per_s),
+        "peak_rss_growth_mb": round(peak_rss_mb() - rss_before, 1)
+    }
+
+    if target_url.startswith("sqlite:///"):
+        cloud = sqlite3.connect(target_url[len("sqlite:///"):])
+        count, distinct = cloud.execute("SELECT COUNT(*), COUNT(DISTINCT source_id) FROM attendance").fetchone()
+        result["target_attendance_rows"] = count
+        result["target_distinct_rows"] = distinct
+        result["complete"] = count == distinct == args.attendance
+        cloud.close()
+
+    print(f"☁️ {total_rows} rows in {first_s + resume_s:.1f}s → {rows_per_s:,.0f} rows/s, "
+          f"peak RSS +{result['peak_rss_growth_mb']} MB")
+    for key, value in result.items():
+        print(f"   {key}: {value}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
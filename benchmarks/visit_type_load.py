@@ -0,0 +1,177 @@
+"""
+visit_type_load.py
+------------------
+
+Purpose:
+• Attendance load throughput into the cloud schema through
+  sync_engine.PostgresTarget (COPY → stage table → merge)
+• before: visit_type set by trg_detect_visit_type, one members
+  lookup per row
+• after:  visit_type set for the whole page by the merge's join
+  (STAGE_MERGE), row trigger skipped
+• Check both give every row the same visit_type as the trigger would,
+  and that a plain single INSERT is still classified by the trigger
+
+Usage:
+    python benchmarks/visit_type_load.py --dsn postgresql://localhost/coza_test
+    python benchmarks/visit_type_load.py --dsn … --batch 100000 --batches 5 --with-rollups --json load.json
+
+Needs a Postgres database (psycopg2). Everything is created in a
+scratch schema (visit_bench) that is dropped first.
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cloud_backup import sync_engine
+from cloud_backup.sync_engine import PostgresTarget, psycopg2
+
+
+SCHEMA = "visit_bench"
+
+MISCLASSIFIED = """
+SELECT COUNT(*) FROM attendance a
+LEFT JOIN members m ON m.id = a.member_id
+WHERE a.device_id = %s
+  AND a.visit_type IS DISTINCT FROM visit_type_for(a.detected_branch_id, m.branch_id)
+"""
+
+
+def run_file(cur, name):
+    with open(os.path.join(ROOT, "cloud_backup", name)) as f:
+        cur.execute(f.read())
+
+
+def batch_rows(rng, device_id, first_source, size, members, branches, start):
+    member_ids = rng.integers(1, members + 1, size)
+    detected = rng.integers(1, branches + 1, size)
+
+    return [
+        (first_source + i, device_id, int(m), int(b) if i % 50 else None, None,
+         start + datetime.timedelta(seconds=int(i)))
+        for i, (m, b) in enumerate(zip(member_ids, detected))
+    ]
+
+
+def load(dsn, args):
+    """
+    Alternate before / after batches, so table growth and checkpoints
+    hit both the same. Same rows for both, on different days so neither
+    merges into the other's rollup rows.
+    """
+    targets = {"before": PostgresTarget(dsn), "after": PostgresTarget(dsn)}
+    starts = {"before": datetime.datetime(2026, 1, 1), "after": datetime.datetime(2026, 3, 1)}
+    times = {"before": [], "after": []}
+    stage_merge = sync_engine.STAGE_MERGE
+
+    for n in range(args.batches):
+        for name in ("before", "after"):
+            rng = np.random.default_rng(n)
+            rows = batch_rows(rng, name, n * args.batch, args.batch, args.members, args.branches, starts[name])
+
+            # before: the merge without STAGE_MERGE, as it was
+            sync_engine.STAGE_MERGE = stage_merge if name == "after" else {}
+
+            t0 = time.perf_counter()
+            targets[name].upsert("attendance", rows)
+            times[name].append(time.perf_counter() - t0)
+
+    sync_engine.STAGE_MERGE = stage_merge
+    for target in targets.values():
+        target.close()
+
+    return times["before"], times["after"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attendance bulk load: per-row vs set-based visit_type")
+    parser.add_argument("--dsn", default=os.environ.get("SYNC_TARGET_URL"), help="Postgres URL")
+    parser.add_argument("--members", type=int, default=50000)
+    parser.add_argument("--branches", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=100000, help="Rows per sync page")
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--with-rollups", action="store_true", help="Also install cloud_backup/rollups.sql")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    if psycopg2 is None:
+        raise SystemExit("psycopg2 is required (pip install psycopg2-binary)")
+    if not args.dsn:
+        raise SystemExit("Pass --dsn or set SYNC_TARGET_URL")
+
+    dsn = f"{args.dsn}{'&' if '?' in args.dsn else '?'}options=-csearch_path%3D{SCHEMA}"
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}")
+
+    run_file(cur, "schema.sql")
+    run_file(cur, "triggers.sql")
+    if args.with_rollups:
+        run_file(cur, "rollups.sql")
+
+    cur.execute(
+        "INSERT INTO members (id, first_name, last_name, phone, country, state, branch_id) "
+        "SELECT g, 'First' || g, 'Last' || g, '+23480' || lpad(g::TEXT, 8, '0'), 'Nigeria', 'Lagos', "
+        "CASE WHEN g %% 100 = 0 THEN NULL ELSE 1 + g %% %s END FROM generate_series(1, %s) g",
+        (args.branches, args.members)
+    )
+    cur.execute("ANALYZE")
+
+    before, after = load(dsn, args)
+
+    result = {
+        "batch_rows": args.batch,
+        "batches": args.batches,
+        "with_rollups": args.with_rollups
+    }
+
+    for name, times in (("before", before), ("after", after)):
+        cur.execute(MISCLASSIFIED, (name,))
+        result[name] = {
+            "batch_s": [round(t, 2) for t in times],
+            "rows_per_s": round(args.batch * len(times) / sum(times)),
+            "misclassified": cur.fetchone()[0]
+        }
+
+    result["speedup"] = round(sum(before) / sum(after), 2)
+
+    # Fallback: an ordinary single insert still goes through the row trigger
+    cur.execute("SELECT id, branch_id FROM members WHERE branch_id IS NOT NULL LIMIT 1")
+    member_id, branch_id = cur.fetchone()
+    cur.execute(
+        "INSERT INTO attendance (member_id, detected_branch_id, device_id, source_id) "
+        "VALUES (%s, %s, 'single', 1) RETURNING visit_type",
+        (member_id, branch_id + 1)
+    )
+    result["single_insert_visit_type"] = cur.fetchone()[0]
+
+    cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.close()
+
+    print(f"🏷️  {args.batches} × {args.batch} rows: {result['before']['rows_per_s']:,} rows/s per-row trigger → "
+          f"{result['after']['rows_per_s']:,} rows/s set-based ({result['speedup']}×)")
+    for key, value in result.items():
+        print(f"   {key}: {value}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+-- ======================================
+-- ATTENDANCE ROLLUPS
+-- ======================================
+-- Reporting views (views.sql) read these instead of scanning and
+-- grouping the whole attendance table.
+--
+-- Load order: schema.sql → triggers.sql → rollups.sql → views.sql
+--
+-- Kept up to date by statement-level triggers: an insert batch (one
+-- sync page) is aggregated once and merged with one upsert. Updates
+-- and deletes re-aggregate only the member-days they touch.
+--
+-- Full rebuild / repair:
+--     SELECT refresh_attendance_rollups();
+
+
+-- Per day, member, detected branch and visit type
+-- (detected_branch_id 0 = unknown branch)
+CREATE TABLE IF NOT EXISTS attendance_daily (
+    day DATE NOT NULL,
+    member_id BIGINT NOT NULL,
+    detected_branch_id INTEGER NOT NULL,
+    visit_type TEXT NOT NULL,
+
+    visits BIGINT NOT NULL,
+    first_visit TIMESTAMP NOT NULL,
+    last_visit TIMESTAMP NOT NULL,
+
+    PRIMARY KEY (day, member_id, detected_branch_id, visit_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_attendance_daily_member
+ON attendance_daily (member_id, day);
+
+
+-- All-time per member and visit type
+CREATE TABLE IF NOT EXISTS attendance_member_totals (
+    member_id BIGINT NOT NULL,
+    visit_type TEXT NOT NULL,
+
+    visits BIGINT NOT NULL,
+    first_visit TIMESTAMP NOT NULL,
+    last_visit TIMESTAMP NOT NULL,
+
+    PRIMARY KEY (member_id, visit_type)
+);
+
+
+-- Re-aggregating a member-day after an update / delete
+CREATE INDEX IF NOT EXISTS idx_attendance_member_timestamp
+ON attendance (member_id, timestamp);
+
+
+-- ======================================
+-- INSERTS: merge the batch
+-- ======================================
+
+CREATE OR REPLACE FUNCTION rollup_attendance_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO attendance_daily AS d
+        (day, member_id, detected_branch_id, visit_type, visits, first_visit, last_visit)
+    SELECT
+        n.timestamp::DATE,
+        n.member_id,
+        COALESCE(n.detected_branch_id, 0),
+        COALESCE(n.visit_type, 'local'),
+        COUNT(*),
+        MIN(n.timestamp),
+        MAX(n.timestamp)
+    FROM new_rows n
+    WHERE n.timestamp IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, member_id, detected_branch_id, visit_type) DO UPDATE SET
+        visits = d.visits + EXCLUDED.visits,
+        first_visit = LEAST(d.first_visit, EXCLUDED.first_visit),
+        last_visit = GREATEST(d.last_visit, EXCLUDED.last_visit);
+
+    INSERT INTO attendance_member_totals AS t
+        (member_id, visit_type, visits, first_visit, last_visit)
+    SELECT
+        n.member_id,
+        COALESCE(n.visit_type, 'local'),
+        COUNT(*),
+        MIN(n.timestamp),
+        MAX(n.timestamp)
+    FROM new_rows n
+    WHERE n.timestamp IS NOT NULL
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (member_id, visit_type) DO UPDATE SET
+        visits = t.visits + EXCLUDED.visits,
+        first_visit = LEAST(t.first_visit, EXCLUDED.first_visit),
+        last_visit = GREATEST(t.last_visit, EXCLUDED.last_visit);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- ======================================
+-- UPDATES / DELETES: re-aggregate what they touched
+-- ======================================
+
+CREATE OR REPLACE FUNCTION rollup_attendance_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    CREATE TEMP TABLE IF NOT EXISTS rollup_member_days (
+        member_id BIGINT,
+        day DATE
+    ) ON COMMIT DROP;
+
+    TRUNCATE rollup_member_days;
+
+    IF TG_OP = 'UPDATE' THEN
+        INSERT INTO rollup_member_days
+        SELECT member_id, timestamp::DATE FROM old_rows WHERE timestamp IS NOT NULL
+        UNION
+        SELECT member_id, timestamp::DATE FROM new_rows WHERE timestamp IS NOT NULL;
+    ELSE
+        INSERT INTO rollup_member_days
+        SELECT DISTINCT member_id, timestamp::DATE FROM old_rows WHERE timestamp IS NOT NULL;
+    END IF;
+
+    DELETE FROM attendance_daily d
+    USING rollup_member_days k
+    WHERE d.member_id = k.member_id AND d.day = k.day;
+
+    INSERT INTO attendance_daily
+        (day, member_id, detected_branch_id, visit_type, visits, first_visit, last_visit)
+    SELECT
+        a.timestamp::DATE,
+        a.member_id,
+        COALESCE(a.detected_branch_id, 0),
+        COALESCE(a.visit_type, 'local'),
+        COUNT(*),
+        MIN(a.timestamp),
+        MAX(a.timestamp)
+    FROM attendance a
+    JOIN rollup_member_days k
+      ON a.member_id = k.member_id
+     AND a.timestamp >= k.day
+     AND a.timestamp < k.day + 1
+    GROUP BY 1, 2, 3, 4;
+
+    DELETE FROM attendance_member_totals
+    WHERE member_id IN (SELECT member_id FROM rollup_member_days);
+
+    INSERT INTO attendance_member_totals
+        (member_id, visit_type, visits, first_visit, last_visit)
+    SELECT d.member_id, d.visit_type, SUM(d.visits), MIN(d.first_visit), MAX(d.last_visit)
+    FROM attendance_daily d
+    WHERE d.member_id IN (SELECT member_id FROM rollup_member_days)
+    GROUP BY 1, 2;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+DROP TRIGGER IF EXISTS trg_rollup_attendance_insert ON attendance;
+CREATE TRIGGER trg_rollup_attendance_insert
+AFTER INSERT ON attendance
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION rollup_attendance_insert();
+
+DROP TRIGGER IF EXISTS trg_rollup_attendance_update ON attendance;
+CREATE TRIGGER trg_rollup_attendance_update
+AFTER UPDATE ON attendance
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION rollup_attendance_change();
+
+DROP TRIGGER IF EXISTS trg_rollup_attendance_delete ON attendance;
+CREATE TRIGGER trg_rollup_attendance_delete
+AFTER DELETE ON attendance
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION rollup_attendance_change();
+
+
+-- ======================================
+-- FULL REBUILD
+-- ======================================
+
+CREATE OR REPLACE FUNCTION refresh_attendance_rollups()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE attendance IN SHARE MODE;
+
+    TRUNCATE attendance_daily, attendance_member_totals;
+
+    INSERT INTO attendance_daily
+        (day, member_id, detected_branch_id, visit_type, visits, first_visit, last_visit)
+    SELECT
+        timestamp::DATE,
+        member_id,
+        COALESCE(detected_branch_id, 0),
+        COALESCE(visit_type, 'local'),
+        COUNT(*),
+        MIN(timestamp),
+        MAX(timestamp)
+    FROM attendance
+    WHERE timestamp IS NOT NULL
+    GROUP BY 1, 2, 3, 4;
+
+    INSERT INTO attendance_member_totals
+        (member_id, visit_type, visits, first_visit, last_visit)
+    SELECT member_id, visit_type, SUM(visits), MIN(first_visit), MAX(last_visit)
+    FROM attendance_daily
+    GROUP BY 1, 2;
+END;
+$$ LANGUAGE plpgsql;
@@ -42,9 +42,21 @@ CREATE TABLE IF NOT EXISTS attendance (
         visit_type IN ('local', 'visitor')
     ),
 
-    timestamp TIMESTAMP DEFAULT NOW()
+    timestamp TIMESTAMP DEFAULT NOW(),
+
+    -- Origin of the row (sync_engine.py): local attendance ids are only
+    -- unique per device, so (device_id, source_id) is the upsert key
+    device_id TEXT,
+    source_id BIGINT
 );
 
+-- Existing databases
+ALTER TABLE attendance ADD COLUMN IF NOT EXISTS device_id TEXT;
+ALTER TABLE attendance ADD COLUMN IF NOT EXISTS source_id BIGINT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_source
+ON attendance (device_id, source_id);
+
 
 -- FACE EMBEDDINGS BACKUP
 CREATE TABLE IF NOT EXISTS face_embeddings (
@@ -52,3 +64,14 @@ CREATE TABLE IF NOT EXISTS face_embeddings (
     embedding FLOAT4[] NOT NULL,
     created_at TIMESTAMP DEFAULT NOW()
 );
+
+
+-- PACKED FACE EMBEDDING BACKUPS (embedding_backup.py)
+-- Chunks of float16 / float32 vectors + a JSON manifest per backup,
+-- named device-<id>/<backup id>/… ; device-<id>/LATEST points at the
+-- newest complete backup.
+CREATE TABLE IF NOT EXISTS face_embedding_chunks (
+    name TEXT PRIMARY KEY,
+    data BYTEA NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW()
+);
@@ -2,17 +2,30 @@
 -- AUTO DETECT VISITOR VS LOCAL MEMBER
 -- ======================================
 
+-- visitor when seen at a branch other than the member's own, including
+-- members with no home branch (SOPs), as ai/role_mapper.visit_type;
+-- local when the detecting branch is unknown
+CREATE OR REPLACE FUNCTION visit_type_for(detected_branch_id INTEGER, home_branch_id INTEGER)
+RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN detected_branch_id IS NULL THEN 'local'
+        WHEN detected_branch_id IS DISTINCT FROM home_branch_id THEN 'visitor'
+        ELSE 'local'
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+
+-- Single inserts: look the member up per row
 CREATE OR REPLACE FUNCTION detect_visit_type()
 RETURNS TRIGGER AS $$
 BEGIN
     IF NEW.detected_branch_id IS NULL THEN
         NEW.visit_type := 'local';
-    ELSIF NEW.detected_branch_id != (
-        SELECT branch_id FROM members WHERE id = NEW.member_id
-    ) THEN
-        NEW.visit_type := 'visitor';
     ELSE
-        NEW.visit_type := 'local';
+        NEW.visit_type := visit_type_for(
+            NEW.detected_branch_id,
+            (SELECT branch_id FROM members WHERE id = NEW.member_id)
+        );
     END IF;
 
     RETURN NEW;
@@ -20,7 +33,15 @@ END;
 $$ LANGUAGE plpgsql;
 
 
+-- Bulk loads classify the whole batch with one join instead
+-- (sync_engine.py: COPY into a stage table, then
+--  INSERT … SELECT visit_type_for(s.detected_branch_id, m.branch_id)
+--  FROM stage s LEFT JOIN members m …)
+-- and set coza.bulk_visit_type = 'on' for their transaction, which
+-- skips this trigger.
+DROP TRIGGER IF EXISTS trg_detect_visit_type ON attendance;
 CREATE TRIGGER trg_detect_visit_type
 BEFORE INSERT ON attendance
 FOR EACH ROW
+WHEN (current_setting('coza.bulk_visit_type', true) IS DISTINCT FROM 'on')
 EXECUTE FUNCTION detect_visit_type();
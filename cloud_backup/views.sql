@@ -1,6 +1,8 @@
 -- ======================================
 -- VISITING MEMBERS REPORT
 -- ======================================
+-- Built on the attendance rollups (rollups.sql), so these read one
+-- row per member (or per member-day) instead of every attendance row.
 
 CREATE OR REPLACE VIEW visiting_members AS
 SELECT
@@ -10,32 +12,64 @@ SELECT
     m.phone,
     m.role,
     m.level,
-    COUNT(a.id) AS visit_count,
-    MIN(a.timestamp) AS first_visit,
-    MAX(a.timestamp) AS last_visit
-FROM attendance a
-JOIN members m ON m.id = a.member_id
-WHERE a.visit_type = 'visitor'
-GROUP BY m.id;
+    t.visits AS visit_count,
+    t.first_visit,
+    t.last_visit
+FROM attendance_member_totals t
+JOIN members m ON m.id = t.member_id
+WHERE t.visit_type = 'visitor';
 
 
 -- ======================================
 -- TOP VISITING MEMBERS (50 DAYS)
 -- ======================================
+-- Whole days come from attendance_daily. On the day the window starts,
+-- a member-day row that straddles NOW() - 50 days is counted from the
+-- raw rows (one index lookup), so the result matches a raw count.
 
 CREATE OR REPLACE VIEW top_visiting_members AS
+WITH window_start AS (
+    SELECT NOW() - INTERVAL '50 days' AS since
+),
+visits AS (
+    SELECT d.member_id, d.visits
+    FROM attendance_daily d, window_start w
+    WHERE d.visit_type = 'visitor'
+      AND d.day > w.since::DATE
+
+    UNION ALL
+
+    SELECT
+        d.member_id,
+        CASE
+            WHEN d.first_visit >= w.since THEN d.visits
+            WHEN d.last_visit < w.since THEN 0
+            ELSE (
+                SELECT COUNT(*) FROM attendance a
+                WHERE a.member_id = d.member_id
+                  AND a.visit_type = 'visitor'
+                  AND COALESCE(a.detected_branch_id, 0) = d.detected_branch_id
+                  AND a.timestamp >= w.since
+                  AND a.timestamp < d.day + 1
+            )
+        END
+    FROM attendance_daily d, window_start w
+    WHERE d.visit_type = 'visitor'
+      AND d.day = w.since::DATE
+),
+totals AS (
+    SELECT member_id, SUM(visits) AS visits
+    FROM visits
+    GROUP BY member_id
+    HAVING SUM(visits) >= 2
+)
 SELECT
     m.id,
     m.first_name,
     m.last_name,
     m.phone,
     m.level,
-    COUNT(a.id) AS visits_last_50_days
-FROM attendance a
-JOIN members m ON m.id = a.member_id
-WHERE
-    a.visit_type = 'visitor'
-    AND a.timestamp >= NOW() - INTERVAL '50 days'
-GROUP BY m.id
-HAVING COUNT(a.id) >= 2
+    t.visits::BIGINT AS visits_last_50_days
+FROM totals t
+JOIN members m ON m.id = t.member_id
 ORDER BY visits_last_50_days DESC;
@@ -0,0 +1,175 @@
+"""
+db.py
+------------------
+
+Purpose:
+• Shared SQLite access for the portal (and anything else that runs
+  in the same process)
+• One connection per thread, opened once and reused, so requests no
+  longer pay for connect + PRAGMAs every time
+• WAL journal: phone lookups keep reading while a registration writes
+• Prepared statements are cached per connection (sqlite3 statement
+  cache), short busy retries instead of "database is locked" errors
+
+Usage:
+    db = Database("database/church.db")
+
+    row = db.query_one("SELECT COUNT(*) FROM members WHERE phone = ?", (phone,))
+
+    with db.transaction() as cur:
+        cur.execute("INSERT INTO members (...) VALUES (...)", values)
+
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Database:
+
+    def __init__(
+        self,
+        db_path="database/church.db",
+        busy_timeout_ms=5000,
+        busy_retries=5,
+        retry_delay_ms=20,
+        mmap_size_mb=256,
+        cache_size_mb=32,
+        cached_statements=256
+    ):
+        """
+        Args:
+            db_path (str): SQLite file
+            busy_timeout_ms (int): SQLite's own wait for a lock
+            busy_retries (int): extra attempts after a busy/locked error
+            retry_delay_ms (int): first retry delay (doubles each attempt)
+            mmap_size_mb (int): memory-mapped I/O size per connection
+            cache_size_mb (int): page cache size per connection
+            cached_statements (int): prepared statements kept per connection
+        """
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.busy_retries = busy_retries
+        self.retry_delay = retry_delay_ms / 1000.0
+        self.mmap_size = int(mmap_size_mb * 1024 * 1024)
+        self.cache_size_kb = int(cache_size_mb * 1024)
+        self.cached_statements = cached_statements
+
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+    # --------------------------------------------------
+    # Connections
+    # --------------------------------------------------
+    def connection(self):
+        """
+        This thread's connection (opened on first use, and again after
+        a fork so worker processes never share a handle).
+        """
+        conn = getattr(self._local, "conn", None)
+
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+
+            with self._lock:
+                self._connections.append(conn)
+
+        return conn
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            isolation_level=None,  # explicit BEGIN / COMMIT in transaction()
+            cached_statements=self.cached_statements,
+            check_same_thread=False
+        )
+
+        self._retry(conn.execute, "PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        conn.execute(f"PRAGMA cache_size = -{self.cache_size_kb}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+
+        return conn
+
+    def close(self):
+        """
+        Close every connection opened by this process.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+        self._local = threading.local()
+
+    # --------------------------------------------------
+    # Queries
+    # --------------------------------------------------
+    def execute(self, sql, params=()):
+        """
+        Run one statement outside an explicit transaction
+        (autocommit). Returns the cursor.
+        """
+        return self._retry(self.connection().execute, sql, params)
+
+    def query_one(self, sql, params=()):
+        return self.execute(sql, params).fetchone()
+
+    def query_all(self, sql, params=()):
+        return self.execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Write transaction. BEGIN IMMEDIATE takes the write lock up
+        front, so lock waits (and retries) happen before any work is
+        done rather than at COMMIT. Readers are never blocked (WAL).
+
+        Commits on success, rolls back on any exception — including a
+        failed COMMIT, so the pooled connection never stays inside the
+        transaction holding the write lock.
+        """
+        conn = self.connection()
+        self._retry(conn.execute, "BEGIN IMMEDIATE")
+
+        try:
+            yield conn.cursor()
+            self._retry(conn.commit)
+        except BaseException:
+            conn.rollback()
+            raise
+
+    # --------------------------------------------------
+    # Busy retries
+    # --------------------------------------------------
+    def _retry(self, fn, *args):
+        delay = self.retry_delay
+
+        for attempt in range(self.busy_retries + 1):
+            try:
+                return fn(*args)
+            except sqlite3.OperationalError as e:
+                message = str(e).lower()
+                busy = "locked" in message or "busy" in message
+
+                if not busy or attempt == self.busy_retries:
+                    raise
+
+                time.sleep(delay)
+                delay *= 2
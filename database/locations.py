@@ -0,0 +1,139 @@
+"""
+locations.py
+------------------
+
+Purpose:
+• One source for the country → state → branch tree used by the
+  registration form: the branches table, or the branch seed
+  (database/seed_branches.sql) when the table is empty / unreadable,
+  so the fallback has the same ids, names, codes and cities
+• Serialised once into the /api/locations body with a strong ETag
+  (hash of the body), so browsers and proxies can revalidate cheaply
+• The table is re-read at most every refresh_seconds; the body and
+  ETag only change when the active branches actually changed
+
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+BRANCHES_QUERY = """
+    SELECT id, country, state, name, code, city
+    FROM branches
+    WHERE active = 1
+    ORDER BY id
+"""
+
+
+class LocationCatalog:
+
+    def __init__(
+        self,
+        db,
+        fallback_path="database/seed_branches.sql",
+        schema_path="database/schema.sql",
+        refresh_seconds=30
+    ):
+        """
+        Args:
+            db (database.db.Database): member database
+            fallback_path (str): branch seed used when the table is empty
+            schema_path (str): schema the seed is loaded into
+            refresh_seconds (float): how often to look for branch changes
+        """
+        self.db = db
+        self.fallback_path = fallback_path
+        self.schema_path = schema_path
+        self.refresh_seconds = refresh_seconds
+
+        self.rows = None
+        self.source = None
+        self.checked_at = 0.0
+
+        self._lock = threading.Lock()
+        self._snapshot = ({}, b"{}", "")
+
+        self.refresh(force=True)
+        print(f"🗺️ Locations loaded from {self.source}: {len(self.rows)} branch(es)")
+
+    # --------------------------------------------------
+    # Loading
+    # --------------------------------------------------
+    def _load_rows(self):
+        try:
+            rows = self.db.query_all(BRANCHES_QUERY)
+            if rows:
+                return [tuple(r) for r in rows], "database"
+        except Exception as e:
+            print(f"⚠️ Could not read branches table: {str(e)}")
+
+        return self._load_seed(), "seed_branches.sql"
+
+    def _load_seed(self):
+        """
+        Active branches from the seed, run into a throwaway in-memory
+        database with the real schema.
+        """
+        conn = sqlite3.connect(":memory:")
+        try:
+            for path in (self.schema_path, self.fallback_path):
+                with open(path) as f:
+                    conn.executescript(f.read())
+            return [tuple(r) for r in conn.execute(BRANCHES_QUERY).fetchall()]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def build_tree(rows):
+        tree = {}
+        for branch_id, country, state, name, code, city in rows:
+            tree.setdefault(country, {}).setdefault(state, []).append({
+                "id": branch_id,
+                "code": code,
+                "name": name,
+                "city": city or ""
+            })
+        return tree
+
+    def refresh(self, force=False):
+        """
+        Re-read the branches if refresh_seconds have passed (or force).
+        Returns True when the tree changed.
+        """
+        now = time.monotonic()
+        if not force and now - self.checked_at < self.refresh_seconds:
+            return False
+
+        with self._lock:
+            if not force and now - self.checked_at < self.refresh_seconds:
+                return False
+
+            rows, source = self._load_rows()
+            self.checked_at = now
+
+            if rows == self.rows:
+                return False
+
+            tree = self.build_tree(rows)
+            body = json.dumps(tree, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+            # Published as one tuple so readers never mix two loads
+            self._snapshot = (tree, body, hashlib.sha256(body).hexdigest()[:32])
+            self.rows = rows
+            self.source = source
+
+            if not force:
+                print(f"🗺️ Locations reloaded from {source}: {len(rows)} branch(es)")
+
+            return True
+
+    def snapshot(self):
+        """
+        (tree, body bytes, etag) — always from the same load.
+        """
+        self.refresh()
+        return self._snapshot
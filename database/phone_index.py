@@ -0,0 +1,202 @@
+"""
+phone_index.py
+------------------
+
+Purpose:
+• Answer "how many members use this phone number?" from memory
+  (/api/check-phone runs on every form interaction)
+• Numbers are normalised to E.164 so "0803 123 4567", "+2348031234567"
+  and "002348031234567" count as the same phone
+• Warmed from the members table at startup
+
+Keeping gunicorn workers consistent:
+    Every process shares a tiny version file (memory-mapped) holding
+    the highest committed member id. A registration bumps it after its
+    commit. A lookup compares it with the last id this process has
+    indexed; only when it moved does the process read the new rows
+    (WHERE id > last_id) before answering. Members are never deleted
+    by the portal, so catching up by id is enough.
+
+"""
+
+import fcntl
+import mmap
+import os
+import re
+import struct
+import threading
+
+
+# Calling codes for the countries the church operates in.
+# Unknown countries fall back to DEFAULT_CALLING_CODE.
+CALLING_CODES = {
+    "Nigeria": "234",
+    "United Kingdom": "44",
+    "Ghana": "233",
+    "South Africa": "27",
+    "Kenya": "254",
+    "United States": "1",
+    "Canada": "1",
+    "Ireland": "353",
+    "Germany": "49",
+    "Netherlands": "31"
+}
+
+DEFAULT_CALLING_CODE = "234"
+
+VERSION = struct.Struct("<q")
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalise_phone(phone, country=None):
+    """
+    Best-effort E.164 ("+<code><number>").
+
+    • "+44 7911 123456" / "0044 7911..." → international as written
+    • "07911 123456" + country           → national, trunk 0 dropped
+    • bare digits that already start with a known calling code and are
+      long enough to include one are kept as international
+
+    Returns "" for input without digits.
+    """
+    phone = (phone or "").strip()
+    digits = _NON_DIGITS.sub("", phone)
+
+    if not digits:
+        return ""
+
+    if phone.startswith("+"):
+        return "+" + digits
+
+    if digits.startswith("00"):
+        return "+" + digits[2:]
+
+    code = CALLING_CODES.get(country or "", DEFAULT_CALLING_CODE)
+
+    if digits.startswith("0"):
+        return "+" + code + digits[1:]
+
+    if len(digits) > 10 and digits.startswith(code):
+        return "+" + digits
+
+    return "+" + code + digits
+
+
+class PhoneIndex:
+
+    def __init__(self, db, version_path="database/phone_index.version"):
+        """
+        Args:
+            db (database.db.Database): member database
+            version_path (str): version file shared by all workers
+        """
+        self.db = db
+        self.version_path = version_path
+
+        self.counts = {}
+        self.last_id = 0
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._version = self._open_version()
+
+        self.refresh()
+        print(f"📇 Phone index warmed: {len(self.counts)} number(s), last member id {self.last_id}")
+
+    # --------------------------------------------------
+    # Lookups
+    # --------------------------------------------------
+    def count(self, phone, country=None):
+        """
+        Members registered with this phone number.
+        """
+        key = normalise_phone(phone, country)
+        if not key:
+            return 0
+
+        version = self.shared_version()
+
+        if version > self.version:
+            self.misses += 1
+            self.refresh()
+            # Rows up to version were committed before it was published
+            self.version = max(self.version, version)
+        else:
+            self.hits += 1
+
+        return self.counts.get(key, 0)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "numbers": len(self.counts),
+            "last_member_id": self.last_id,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
+
+    # --------------------------------------------------
+    # Updates
+    # --------------------------------------------------
+    def refresh(self):
+        """
+        Index members added since the last refresh (all of them on the
+        first call).
+        """
+        with self._lock:
+            rows = self.db.query_all(
+                "SELECT id, phone, country FROM members WHERE id > ? ORDER BY id",
+                (self.last_id,)
+            )
+
+            for member_id, phone, country in rows:
+                key = normalise_phone(phone, country)
+                if key:
+                    self.counts[key] = self.counts.get(key, 0) + 1
+                self.last_id = member_id
+
+            self.version = max(self.version, self.last_id)
+
+        return len(rows)
+
+    def committed(self, member_id):
+        """
+        Call after a registration commit: indexes the new member here
+        and tells the other workers to catch up.
+        """
+        self._bump_version(member_id)
+        self.refresh()
+
+    # --------------------------------------------------
+    # Shared version (highest committed member id)
+    # --------------------------------------------------
+    def _open_version(self):
+        os.makedirs(os.path.dirname(self.version_path) or ".", exist_ok=True)
+
+        fd = os.open(self.version_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < VERSION.size:
+                os.write(fd, VERSION.pack(0))
+            self._version_fd = fd
+            return mmap.mmap(fd, VERSION.size)
+        except Exception:
+            os.close(fd)
+            raise
+
+    def shared_version(self):
+        return VERSION.unpack_from(self._version, 0)[0]
+
+    def _bump_version(self, member_id):
+        # lockf (per process) rather than flock: forked workers share
+        # the descriptor, and flock would treat them as one owner
+        with self._lock:
+            fcntl.lockf(self._version_fd, fcntl.LOCK_EX)
+            try:
+                if member_id > self.shared_version():
+                    VERSION.pack_into(self._version, 0, member_id)
+            finally:
+                fcntl.lockf(self._version_fd, fcntl.LOCK_UN)
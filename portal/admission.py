@@ -0,0 +1,209 @@
+"""
+admission.py
+------------------
+
+Purpose:
+• Admission control in front of face inference on /register
+• At most max_concurrent registrations run inference at once; up to
+  max_queue more wait for a slot, the rest are turned away at once
+• Every request has a deadline: a request that would not get a slot
+  in time is rejected straight away instead of timing out later
+• Estimated wait from a moving average of inference time, for
+  Retry-After headers and /api/ai-status
+
+Usage:
+    admission = AdmissionController(max_concurrent=2, max_queue=8, deadline_seconds=20)
+
+    try:
+        with admission.slot(deadline) as slot:
+            result = analyse(frames, timeout=slot.remaining())
+    except Overloaded as e:
+        return jsonify({"message": e.message}), e.status, {"Retry-After": e.retry_after}
+
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    """
+    Request turned away: status is 429 (queue full) or 503 (would miss
+    its deadline), retry_after is in whole seconds.
+    """
+
+    def __init__(self, status, retry_after, message):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.message = message
+
+
+class Slot:
+
+    def __init__(self, deadline, release):
+        self.deadline = deadline
+        self.held = False
+
+        self._release = release
+        self._released = False
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def hold_until_done(self, future):
+        """
+        Keep the slot after the request gives up on a job that could
+        not be cancelled (already running in a worker): it is released
+        when future finishes, so admission keeps counting that work.
+        """
+        self.held = True
+        future.add_done_callback(lambda _: self.release())
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._release()
+
+
+class AdmissionController:
+
+    def __init__(self, max_concurrent=2, max_queue=8, deadline_seconds=20,
+                 initial_service_seconds=1.5, min_retry_seconds=2, smoothing=0.2):
+        """
+        Args:
+            max_concurrent (int): registrations running inference at once
+            max_queue (int): registrations allowed to wait for a slot
+            deadline_seconds (float): per-request budget, from arrival
+            initial_service_seconds (float): inference time assumed
+                until real ones are measured
+            min_retry_seconds (int): smallest Retry-After hint
+            smoothing (float): weight of the newest inference time in
+                the moving average
+        """
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.deadline_seconds = deadline_seconds
+        self.min_retry_seconds = min_retry_seconds
+        self.smoothing = smoothing
+
+        self.service_seconds = initial_service_seconds
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {429: 0, 503: 0}
+
+        self._cond = threading.Condition()
+
+    def deadline(self, arrived=None):
+        """
+        monotonic() deadline for a request that arrived at arrived.
+        """
+        return (arrived or time.monotonic()) + self.deadline_seconds
+
+    # --------------------------------------------------
+    # Estimates (call with the lock held)
+    # --------------------------------------------------
+    def _estimated_wait(self, ahead):
+        """
+        Seconds until a slot frees up for a request with ahead
+        requests queued in front of it.
+        """
+        if self.active < self.max_concurrent and ahead == 0:
+            return 0.0
+        return self.service_seconds * (ahead + 1) / self.max_concurrent
+
+    def _retry_after(self):
+        wait = self._estimated_wait(self.waiting)
+        return max(self.min_retry_seconds, math.ceil(wait))
+
+    def _reject(self, status, message):
+        self.rejected[status] += 1
+        return Overloaded(status, self._retry_after(), message)
+
+    # --------------------------------------------------
+    # Admission
+    # --------------------------------------------------
+    def check(self):
+        """
+        Cheap early rejection (before the upload is parsed) when the
+        queue is already full.
+        """
+        with self._cond:
+            if self.active >= self.max_concurrent and self.waiting >= self.max_queue:
+                raise self._reject(429, "Registration is busy right now. Please try again shortly.")
+
+    @contextmanager
+    def slot(self, deadline):
+        """
+        Wait for an inference slot until deadline (monotonic seconds).
+        The slot is released when the block exits, or later if it was
+        handed to a job with Slot.hold_until_done.
+
+        Raises:
+            Overloaded: queue full (429), or no slot before the deadline (503)
+        """
+        self._enter(deadline)
+        start = time.monotonic()
+        slot = Slot(deadline, lambda: self._leave(time.monotonic() - start))
+
+        try:
+            yield slot
+        finally:
+            if not slot.held:
+                slot.release()
+
+    def _enter(self, deadline):
+        with self._cond:
+            if self.active < self.max_concurrent and self.waiting == 0:
+                self.active += 1
+                self.admitted += 1
+                return
+
+            if self.waiting >= self.max_queue:
+                raise self._reject(429, "Registration is busy right now. Please try again shortly.")
+
+            # Would not get a slot in time → say so now
+            if time.monotonic() + self._estimated_wait(self.waiting) > deadline:
+                raise self._reject(503, "Registration is taking longer than usual. Please try again shortly.")
+
+            self.waiting += 1
+            try:
+                while self.active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject(
+                            503, "Registration is taking longer than usual. Please try again shortly."
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+            self.active += 1
+            self.admitted += 1
+
+    def _leave(self, seconds):
+        with self._cond:
+            self.active -= 1
+            self.service_seconds += self.smoothing * (seconds - self.service_seconds)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "inflight": self.active,
+                "queued": self.waiting,
+                "capacity": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "accepting": self.active < self.max_concurrent or self.waiting < self.max_queue,
+                "estimated_wait_seconds": round(self._estimated_wait(self.waiting), 2),
+                "retry_after_seconds": self._retry_after(),
+                "service_seconds": round(self.service_seconds, 3),
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected)
+            }
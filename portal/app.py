@@ -1,62 +1,183 @@
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
-import base64, cv2, numpy as np, sqlite3, yaml, os
+from concurrent.futures import TimeoutError as FutureTimeout
+import base64, yaml, os, time
 from datetime import datetime
 
 from ai.face_detector import FaceDetector
-from ai.face_embedding import get_embedding
+from ai.inference_scheduler import InferenceScheduler
+from ai.inference_pool import InferencePool
+from ai.face_pipeline import process_frames, process_image
+from ai.face_quality import configure as configure_quality
 from ai.faiss_manager import FaissManager
-from ai.face_quality import evaluate_face_quality
 from ai.role_mapper import resolve_level
+from database.db import Database
+from database.phone_index import PhoneIndex
+from database.locations import LocationCatalog
+from portal.admission import AdmissionController, Overloaded
+from portal.logger import QueueLogger
+from portal.metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for development
 
-detector = FaceDetector()
-faiss_db = FaissManager()
-
 # Load configurations
 CONFIG = yaml.safe_load(open("config/config.yaml"))
 DEVICE = yaml.safe_load(open("config/device_config.yaml"))
 ROLES = yaml.safe_load(open("config/roles.yaml"))
 
+# Request threads only queue log records; one thread writes them
+LOGGING = CONFIG["registration_portal"].get("logging", {})
+queue_logger = QueueLogger(
+    level=LOGGING.get("level", "INFO"),
+    queue_size=LOGGING.get("queue_size", 10000)
+)
+log = queue_logger.logger
+
+DETECTION = CONFIG["face_recognition"].get("detection", {})
+DETECTOR_SETTINGS = {
+    "profile": CONFIG["face_recognition"].get("model", "buffalo_l"),
+    "det_size": DETECTION.get("det_size", 640),
+    "cascade": DETECTION.get("cascade", False),
+    "coarse_size": DETECTION.get("coarse_size", 320),
+    "fine_size": DETECTION.get("fine_size", 256),
+    "roi_margin": DETECTION.get("roi_margin", 0.5)
+}
+
+# Quality thresholds (blur_threshold, minimum_face_size, ...)
+configure_quality(CONFIG["face_recognition"])
+
+# Inference runs either in worker processes (inference_pool) or in the
+# request threads, optionally micro-batched (face_recognition.batching)
+POOL = CONFIG.get("inference_pool", {})
+detector = None
+inference_pool = None
+
+if POOL.get("enabled", False):
+    inference_pool = InferencePool(
+        workers=POOL.get("workers", 2),
+        intra_op_threads=POOL.get("intra_op_threads", 1),
+        pin_cpus=POOL.get("pin_cpus", True),
+        detector_kwargs=DETECTOR_SETTINGS,
+        quality_config=CONFIG["face_recognition"]
+    )
+else:
+    detector = FaceDetector(
+        intra_op_threads=POOL.get("intra_op_threads"),
+        **DETECTOR_SETTINGS
+    )
+
+    BATCHING = CONFIG["face_recognition"].get("batching", {})
+    if BATCHING.get("enabled", False):
+        detector = InferenceScheduler(
+            detector,
+            max_batch_size=BATCHING.get("max_batch_size", 8),
+            max_wait_ms=BATCHING.get("max_wait_ms", 5)
+        )
+
+faiss_db = FaissManager.from_config(CONFIG["faiss"])
+
+# Member database: per-thread WAL connections, reused across requests
+SQLITE = CONFIG.get("sqlite", {})
+db = Database(
+    db_path=SQLITE.get("db_path", "database/church.db"),
+    busy_timeout_ms=SQLITE.get("busy_timeout_ms", 5000),
+    busy_retries=SQLITE.get("busy_retries", 5),
+    mmap_size_mb=SQLITE.get("mmap_size_mb", 256),
+    cache_size_mb=SQLITE.get("cache_size_mb", 32)
+)
+
+# Phone → member count, answered from memory (see database/phone_index.py)
+phone_index = PhoneIndex(
+    db,
+    version_path=SQLITE.get("phone_index_version_path", "database/phone_index.version")
+)
+
+# Country → state → branch tree for the form (branches table,
+# database/seed_branches.sql as fallback), served by /api/locations
+LOCATIONS = CONFIG["registration_portal"].get("locations", {})
+LOCATIONS_MAX_AGE = LOCATIONS.get("cache_max_age", 300)
+locations = LocationCatalog(
+    db,
+    fallback_path=LOCATIONS.get("fallback_path", "database/seed_branches.sql"),
+    schema_path=LOCATIONS.get("schema_path", "database/schema.sql"),
+    refresh_seconds=LOCATIONS.get("refresh_seconds", 30)
+)
+
+# Multi-frame registration: embed the best frames of a burst
+MULTI_FRAME = CONFIG["registration_portal"].get("multi_frame", {})
+TOP_FRAMES = MULTI_FRAME.get("top_n", 3)
+MAX_FRAMES = MULTI_FRAME.get("max_frames", 8)
+
+# Uploads: cap request size; JPEGs larger than decode_max_side are
+# decoded at 1/2, 1/4 or 1/8 scale by libjpeg directly
+UPLOADS = CONFIG["registration_portal"].get("uploads", {})
+DECODE_MAX_SIDE = UPLOADS.get("decode_max_side", 0)
+app.config["MAX_CONTENT_LENGTH"] = UPLOADS.get("max_request_mb", 16) * 1024 * 1024
+
+# Admission control: bounded inference concurrency + queue, and a
+# deadline per registration; overload gets a fast 429/503 + Retry-After
+ADMISSION = CONFIG["registration_portal"].get("admission", {})
+if inference_pool is not None:
+    DEFAULT_CONCURRENCY = inference_pool.workers
+elif isinstance(detector, InferenceScheduler):
+    DEFAULT_CONCURRENCY = detector.max_batch_size
+else:
+    DEFAULT_CONCURRENCY = os.cpu_count() or 1
+
+admission = AdmissionController(
+    max_concurrent=ADMISSION.get("max_concurrent") or DEFAULT_CONCURRENCY,
+    max_queue=ADMISSION.get("max_queue", 16),
+    deadline_seconds=ADMISSION.get("deadline_seconds", 20),
+    initial_service_seconds=ADMISSION.get("initial_service_seconds", 1.5),
+    min_retry_seconds=ADMISSION.get("min_retry_seconds", 2)
+)
+
 PORT = CONFIG["registration_portal"].get("port", 5050)
 DEBUG = CONFIG["registration_portal"].get("debug", False)
 
 
 # --------------------------------------------------
-# BRANCH DATA STRUCTURE - 9 BRANCHES
-# IMPORTANT: Python syntax - all keys need quotes!
+# METRICS (/metrics, Prometheus text format)
 # --------------------------------------------------
-BRANCHES = {
-    "Nigeria": {
-        "Abuja": [
-            {"id": 1, "code": "COZA_HQ", "name": "COZA Abuja", "city": "Guzape"},
-            {"id": 2, "code": "COZA_LUGBE", "name": "COZA Lugbe", "city": "Lugbe"}
-        ],
-        "Lagos": [
-            {"id": 3, "code": "COZA_LAGOS", "name": "COZA Lagos", "city": "Ikeja"},
-            {"id": 4, "code": "COZA_VI/CHILDREN CHURCH", "name": "COZA VI", "city": "Maryland"}
-        ],
-        "Kwara": [
-            {"id": 5, "code": "COZA_ILORIN", "name": "COZA Ilorin", "city": "Tanke"}
-        ],
-        "Rivers": [
-            {"id": 6, "code": "COZA_PH", "name": "COZA Port Harcourt", "city": "Rumuomasi"}
-        ]
-    },
-    "United Kingdom": {
-        "Greater London": [
-            {"id": 7, "code": "COZA_LONDON", "name": "COZA London", "city": "London"}
-        ],
-        "West Midlands": [
-            {"id": 8, "code": "COZA_BIRMINGHAM", "name": "COZA Birmingham", "city": "Birmingham"}
-        ],
-        "Greater Manchester": [
-            {"id": 9, "code": "COZA_MANCHESTER", "name": "COZA Manchester", "city": "Manchester"}
-        ]
-    }
-}
+METRICS_ENABLED = CONFIG["registration_portal"].get("metrics", {}).get("enabled", True)
+metrics = Registry()
+
+REGISTER_SECONDS = metrics.histogram(
+    "portal_register_seconds", "Time to answer /register, by HTTP status", ["status"]
+)
+STAGE_SECONDS = metrics.histogram(
+    "portal_register_stage_seconds",
+    "Time per /register stage (admission_wait, queue_wait, decode, detect, quality, embed, faiss, db)",
+    ["stage"]
+)
+REJECTIONS = metrics.counter(
+    "portal_face_rejections_total",
+    "Registration frames rejected by the face pipeline, by reason",
+    ["reason"]
+)
+INFLIGHT = metrics.gauge("portal_register_inflight", "Registrations being processed")
+INFLIGHT.set(0)
+SHED = metrics.counter(
+    "portal_register_shed_total", "Registrations turned away by admission control, by HTTP status", ["status"]
+)
+
+
+def queue_depths():
+    depths = {("log",): queue_logger.depth(), ("admission",): admission.waiting}
+    if inference_pool is not None:
+        depths[("inference_pool",)] = inference_pool.queue_depth()
+    if isinstance(detector, InferenceScheduler):
+        depths[("batch_scheduler",)] = detector.queue_depth()
+    return depths
+
+
+metrics.gauge("portal_queue_depth", "Jobs waiting or running, per queue", ["queue"], callback=queue_depths)
+metrics.gauge(
+    "portal_log_dropped_records", "Log records dropped because the log queue was full",
+    callback=lambda: {(): queue_logger.dropped}
+)
+metrics.gauge("portal_faiss_gallery_size", "Faces in the FAISS gallery", callback=lambda: {(): len(faiss_db)})
 
 
 # --------------------------------------------------
@@ -68,8 +189,8 @@ def ai_is_online():
     Returns True if face detection and embedding services are operational.
     """
     try:
-        # Try to initialize the detector and check if models are loaded
-        if detector is None:
+        # Either the in-process detector or the worker pool must exist
+        if detector is None and inference_pool is None:
             return False
 
         # Quick health check - verify FAISS is accessible
@@ -79,28 +200,103 @@ def ai_is_online():
         return True
 
     except Exception as e:
-        print(f"⚠️  AI service check failed: {str(e)}")
+        log.warning(f"⚠️  AI service check failed: {str(e)}")
         return False
 
 
+def pool_result(future, slot=None):
+    """
+    Wait for an inference pool job until the slot's deadline. Past it
+    the job is cancelled if it has not started; one already running
+    keeps the admission slot until it finishes. Raises Overloaded.
+    """
+    try:
+        return future.result(slot.remaining() if slot is not None else None)
+    except FutureTimeout:
+        if not future.cancel() and slot is not None:
+            slot.hold_until_done(future)
+        raise Overloaded(503, admission.stats()["retry_after_seconds"],
+                         "Registration is taking longer than usual. Please try again shortly.")
+
+
+def analyse_image(img_bytes, slot=None):
+    """
+    Run decode → detect → quality → embed on the configured backend.
+    Returns the face_pipeline result dict.
+
+    The admission slot's deadline only applies to the inference pool
+    (in-process inference cannot be interrupted).
+    """
+    if inference_pool is not None:
+        return pool_result(inference_pool.submit(img_bytes, DECODE_MAX_SIDE), slot)
+
+    return process_image(detector, img_bytes, DECODE_MAX_SIDE)
+
+
+def analyse_frames(frames_bytes, slot=None):
+    """
+    Multi-frame version of analyse_image (see process_frames).
+    """
+    if len(frames_bytes) == 1:
+        return analyse_image(frames_bytes[0], slot)
+
+    if inference_pool is not None:
+        return pool_result(inference_pool.submit_frames(frames_bytes, TOP_FRAMES, DECODE_MAX_SIDE), slot)
+
+    return process_frames(detector, frames_bytes, TOP_FRAMES, DECODE_MAX_SIDE)
+
+
+def overloaded(e):
+    """
+    Fast 429/503 for a request turned away by admission control.
+    """
+    SHED.inc(status=e.status)
+    log.warning(f"🚦 Registration shed ({e.status}), retry after {e.retry_after}s")
+
+    response = jsonify({"message": e.message, "retry_after": e.retry_after})
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
 # --------------------------------------------------
 # LOCATION API ENDPOINTS
 # --------------------------------------------------
+@app.route("/api/locations")
+def get_locations():
+    """
+    Whole country → state → branch tree in one response.
+    Pre-serialised; clients revalidate with If-None-Match.
+    """
+    _, body, etag = locations.snapshot()
+
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype="application/json")
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={LOCATIONS_MAX_AGE}"
+    return response
+
+
 @app.route("/api/countries")
 def get_countries():
     """Return list of available countries"""
-    return jsonify(list(BRANCHES.keys()))
+    tree = locations.snapshot()[0]
+    return jsonify(list(tree.keys()))
 
 
 @app.route("/api/states")
 def get_states():
     """Return list of states for a given country"""
     country = request.args.get("country")
+    tree = locations.snapshot()[0]
 
-    if not country or country not in BRANCHES:
+    if not country or country not in tree:
         return jsonify([])
 
-    return jsonify(list(BRANCHES[country].keys()))
+    return jsonify(list(tree[country].keys()))
 
 
 @app.route("/api/branches")
@@ -108,14 +304,15 @@ def get_branches():
     """Return list of branches for a given country and state"""
     country = request.args.get("country")
     state = request.args.get("state")
+    tree = locations.snapshot()[0]
 
     if not country or not state:
         return jsonify([])
 
-    if country not in BRANCHES or state not in BRANCHES[country]:
+    if country not in tree or state not in tree[country]:
         return jsonify([])
 
-    return jsonify(BRANCHES[country][state])
+    return jsonify(tree[country][state])
 
 
 # --------------------------------------------------
@@ -133,11 +330,31 @@ def ai_status():
     Not based on time window, but actual service availability.
     """
     online = ai_is_online()
+    load = admission.stats()
 
-    return jsonify({
+    if not online:
+        message = "AI service is currently unavailable. Please try again later."
+    elif not load["accepting"]:
+        message = "AI service is busy. Please try again shortly."
+    else:
+        message = "AI service available"
+
+    response = jsonify({
         "online": online,
-        "message": "AI service available" if online else "AI service is currently unavailable. Please try again later."
-    }), 200 if online else 503
+        "message": message,
+        "accepting": online and load["accepting"],
+        "queue_depth": load["queued"],
+        "inflight": load["inflight"],
+        "capacity": load["capacity"],
+        "estimated_wait_seconds": load["estimated_wait_seconds"],
+        "retry_after_seconds": load["retry_after_seconds"]
+    })
+    response.status_code = 200 if online else 503
+
+    if not online or not load["accepting"]:
+        response.headers["Retry-After"] = str(load["retry_after_seconds"])
+
+    return response
 
 @app.route("/api/check-phone")
 def check_phone():
@@ -148,21 +365,12 @@ def check_phone():
         return jsonify({"count": 0})
 
     try:
-        conn = sqlite3.connect("database/church.db")
-        cur = conn.cursor()
-
-        cur.execute(
-            "SELECT COUNT(*) FROM members WHERE phone = ?",
-            (phone,)
-        )
-
-        count = cur.fetchone()[0]
-        conn.close()
+        count = phone_index.count(phone, request.args.get("country"))
 
         return jsonify({"count": count})
 
     except Exception as e:
-        print(f"❌ Phone check error: {str(e)}")
+        log.error(f"❌ Phone check error: {str(e)}")
         return jsonify({"count": 0})
 
 
@@ -172,6 +380,22 @@ def check_phone():
 @app.route("/register", methods=["POST"])
 def register():
     """Register a new member with facial recognition"""
+    start = time.perf_counter()
+    INFLIGHT.inc()
+
+    try:
+        response = app.make_response(handle_registration())
+    finally:
+        INFLIGHT.dec()
+
+    REGISTER_SECONDS.observe(time.perf_counter() - start, status=response.status_code)
+    return response
+
+
+def handle_registration():
+    """Body of /register (register() adds the request metrics)"""
+
+    deadline = admission.deadline()
 
     # Check if AI service is actually available (not time-based)
     if not ai_is_online():
@@ -179,8 +403,21 @@ def register():
             "message": "AI service is currently unavailable. Please try again later."
         }), 503
 
+    # Queue already full: answer before reading the upload
     try:
-        data = request.json
+        admission.check()
+    except Overloaded as e:
+        return overloaded(e)
+
+    try:
+        # Binary upload: multipart form fields + raw JPEG frame parts
+        multipart = request.mimetype == "multipart/form-data"
+
+        if multipart:
+            data = request.form.to_dict()
+            data["consent"] = data.get("consent", "").lower() in ("true", "1", "yes", "on")
+        else:
+            data = request.json
 
         # Validate required fields
         required_fields = ["first_name", "last_name", "phone", "country", "state"]
@@ -194,131 +431,73 @@ def register():
 
 
         # --------------------------------------------------
-        # Decode image - IMPROVED WITH VALIDATION
+        # Image payload
+        # multipart: JPEG file parts named "images" (or "image"),
+        #            read straight into the decode buffer
+        # JSON:      base64 data URLs in "images" (or "image")
         # --------------------------------------------------
-        if not data.get("image"):
-            return jsonify({"message": "No image provided"}), 400
-
         try:
-            # Get image data
-            image_data = data["image"]
-            print(f"📊 Received image data: {len(image_data)} characters")
-
-            # Remove data URL prefix if present
-            if "," in image_data:
-                image_data = image_data.split(",")[1]
-
-            # Decode base64
-            img_bytes = base64.b64decode(image_data)
-            print(f"📊 Decoded to: {len(img_bytes)} bytes")
+            frames_bytes = []
 
-            # Verify we have data
-            if len(img_bytes) == 0:
-                print("❌ Error: Empty image buffer after decoding")
-                return jsonify({"message": "Empty image data received"}), 400
+            if multipart:
+                files = request.files.getlist("images") or request.files.getlist("image")
 
-            # Convert to numpy array
-            nparr = np.frombuffer(img_bytes, np.uint8)
-
-            # Verify numpy array has data
-            if nparr.size == 0:
-                print("❌ Error: Numpy array is empty")
-                return jsonify({"message": "Failed to decode image data"}), 400
-
-            # Decode image
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-            # Verify image was decoded
-            if frame is None:
-                print("❌ Error: cv2.imdecode returned None")
-                return jsonify({"message": "Failed to decode image. Please try again."}), 400
+                for file in files[:MAX_FRAMES]:
+                    frames_bytes.append(file.stream.read())
+            else:
+                images = data.get("images") or ([data["image"]] if data.get("image") else [])
 
-            # Verify image has content
-            if frame.size == 0:
-                print("❌ Error: Decoded frame is empty")
-                return jsonify({"message": "Decoded image is empty"}), 400
+                for image_data in images[:MAX_FRAMES]:
+                    # Remove data URL prefix if present
+                    if "," in image_data:
+                        image_data = image_data.split(",")[1]
 
-            print(f"✅ Image decoded successfully: {frame.shape}")
+                    frames_bytes.append(base64.b64decode(image_data))
 
         except Exception as e:
-            print(f"❌ Image decoding error: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.exception(f"❌ Image decoding error: {str(e)}")
             return jsonify({"message": f"Image decoding failed: {str(e)}"}), 400
 
-        # --------------------------------------------------
-        # Face detection – safe version that never crashes on unpacking
-        # --------------------------------------------------
-
-        detection_result = detector.detect_single_face(frame)
-
-        if detection_result is None:
-            return jsonify({"message": "No face detected. Please try again with your face clearly visible."}), 400
-
-        # Handle different possible return formats
-        if isinstance(detection_result, tuple) or isinstance(detection_result, list):
-            num_returned = len(detection_result)
-
-            if num_returned == 0:
-                return jsonify({"message": "Face detector returned empty result"}), 500
-
-            face_img = detection_result[0]  # always take the cropped face as first item
-
-            if num_returned >= 2:
-                face_obj = detection_result[1]  # take metadata/object as second item
-            else:
-                face_obj = None  # or {} if you prefer
-
-            # Optional: log if unexpected format (helps future debugging)
-            if num_returned != 2:
-                print(f"Warning: detect_single_face returned {num_returned} values instead of 2 → using first two")
-                print("Returned:", detection_result)
-        else:
-            # Single value returned (just the crop)
-            face_img = detection_result
-            face_obj = None
-
-        # Safety check on the face crop
-        if face_img is None or (hasattr(face_img, 'size') and face_img.size == 0):
-            return jsonify({"message": "Detected face crop is invalid/empty. Try better lighting or positioning."}), 400
-
-        # Now proceed with quality check
-        quality = evaluate_face_quality(face_img)
-
-        if not isinstance(quality, dict) or "passed" not in quality or "score" not in quality:
-            print("Face quality function returned unexpected format:", quality)
-            return jsonify({"message": "Internal error during face quality check"}), 500
-
-        passed = quality["passed"]
-        score = quality["score"]
-        reasons = quality.get("reasons", [])
-
-        if not passed:
-            message = f"Face quality too low (score: {score:.2f})."
-            if reasons:
-                message += " " + "; ".join(reasons)
-            else:
-                message += " Ensure good lighting, steady hold, and centered face."
+        if not frames_bytes:
+            return jsonify({"message": "No image provided"}), 400
 
-            return jsonify({"message": message}), 400
+        log.info(f"📊 Received {len(frames_bytes)} frame(s) "
+                 f"({'binary' if multipart else 'base64'}): "
+                 f"{sum(len(b) for b in frames_bytes)} bytes")
 
-        # Success path
-        # ... your registration logic ...
+        # --------------------------------------------------
+        # Decode → detect → quality → embed
+        # (worker pool or in-process, see analyse_frames), once
+        # admission control gives this request an inference slot
+        # --------------------------------------------------
+        queued = time.perf_counter()
 
-        # ... rest of your registration code (save to DB, etc.) ...
+        try:
+            with admission.slot(deadline) as slot:
+                start = time.perf_counter()
+                analysis = analyse_frames(frames_bytes, slot)
+                elapsed = time.perf_counter() - start
+        except Overloaded as e:
+            return overloaded(e)
 
+        STAGE_SECONDS.observe(start - queued, stage="admission_wait")
 
-        #face_img, face_obj = detector.detect_single_face(frame)
+        # Pipeline stages as timed where they ran (worker or this
+        # thread); the rest of the wall time was spent queued for the
+        # inference pool (the batch scheduler's wait counts as detect)
+        timings = analysis.get("timings", {})
+        for stage, seconds in timings.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+        STAGE_SECONDS.observe(max(0.0, elapsed - sum(timings.values())), stage="queue_wait")
 
-        #if face_img is None:
-        #    return jsonify({"message": "No face detected. Please try again."}), 400
+        if not analysis["passed"]:
+            for reason in analysis.get("reasons", ["rejected"]):
+                REJECTIONS.inc(reason=reason)
 
-    #    passed, score = evaluate_face_quality(face_img)
+            log.info(f"❌ Face rejected: {analysis['message']}")
+            return jsonify({"message": analysis["message"]}), analysis["status"]
 
-    #    if not passed:
-    #        return jsonify({
-    #            "message": f"Face quality too low (score: {score:.2f}). Please ensure good lighting and look directly at the camera."
-    #        }), 400
+        embedding = analysis["embedding"]
 
         # --------------------------------------------------
         # Process role and level
@@ -351,37 +530,28 @@ def register():
         # --------------------------------------------------
         # Database
         # --------------------------------------------------
-        os.makedirs("database", exist_ok=True)
-
-        conn = sqlite3.connect("database/church.db")
-        conn.execute("PRAGMA foreign_keys = ON")
-        cur = conn.cursor()
+        device_id = DEVICE["device"]["device_id"]
 
-        try:
-            device_id = DEVICE["device"]["device_id"]
+        # --------------------------------------------------
+        # Validate branch (only if branch_id is provided)
+        # --------------------------------------------------
+        db_start = time.perf_counter()
 
-            # --------------------------------------------------
-            # Validate branch (only if branch_id is provided)
-            # --------------------------------------------------
-            if branch_id is not None:
-                cur.execute(
-                    "SELECT id FROM branches WHERE id = ? AND active = 1",
-                    (branch_id,)
-                )
+        if branch_id is not None:
+            branch = db.query_one(
+                "SELECT id FROM branches WHERE id = ? AND active = 1",
+                (branch_id,)
+            )
 
-                if not cur.fetchone():
-                    conn.close()
-                    return jsonify({"message": "Invalid branch selected"}), 400
+            if not branch:
+                return jsonify({"message": "Invalid branch selected"}), 400
 
-            # --------------------------------------------------
-            # Check for existing phone numbers
-            # --------------------------------------------------
-            cur.execute(
-                "SELECT COUNT(*) FROM members WHERE phone = ?",
-                (data["phone"],)
-            )
+        # --------------------------------------------------
+        # Check for existing phone numbers
+        # --------------------------------------------------
+        existing_count = phone_index.count(data["phone"], data["country"])
 
-            existing_count = cur.fetchone()[0]
+        with db.transaction() as cur:
 
             # --------------------------------------------------
             # Insert member
@@ -426,33 +596,30 @@ def register():
 
             # --------------------------------------------------
             # Face embedding
+            # add() is durable on its own (journal append + fsync);
+            # full snapshots are written in the background.
             # --------------------------------------------------
-            embedding = get_embedding(face_obj)
+            faiss_start = time.perf_counter()
             faiss_db.add(embedding, member_id)
-            faiss_db.save()
+            faiss_seconds = time.perf_counter() - faiss_start
 
-            conn.commit()
+        STAGE_SECONDS.observe(faiss_seconds, stage="faiss")
+        STAGE_SECONDS.observe(time.perf_counter() - db_start - faiss_seconds, stage="db")
 
-            print(f"✅ Registered: {data['first_name']} {data['last_name']} (ID: {member_id}, Role: {role})")
+        phone_index.committed(member_id)
 
-            # Return success WITHOUT exposing level (backend secret)
-            return jsonify({
-                "status": "success",
-                "message": "✅ Registration successful",
-                "member_id": member_id,
-                "phone_used_before": existing_count > 0
-            })
+        log.info(f"✅ Registered: {data['first_name']} {data['last_name']} (ID: {member_id}, Role: {role})")
 
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+        # Return success WITHOUT exposing level (backend secret)
+        return jsonify({
+            "status": "success",
+            "message": "✅ Registration successful",
+            "member_id": member_id,
+            "phone_used_before": existing_count > 0
+        })
 
     except Exception as e:
-        print(f"❌ Registration error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Registration error: {str(e)}")
         return jsonify({
             "message": f"Registration failed: {str(e)}"
         }), 500
@@ -467,19 +634,31 @@ def health():
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "ai_online": ai_is_online()
+        "ai_online": ai_is_online(),
+        "phone_index": phone_index.stats(),
+        "queues": {name: depth for (name,), depth in queue_depths().items()},
+        "admission": admission.stats()
     })
 
 
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint (latency histograms, rejections, queue depths)"""
+    if not METRICS_ENABLED:
+        return jsonify({"message": "Metrics are disabled"}), 404
+
+    return app.response_class(metrics.render(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+
 # --------------------------------------------------
 if __name__ == "__main__":
-    print("="*60)
-    print("🚀 COZA GLOBAL REGISTRATION PORTAL")
-    print("="*60)
-    print(f"📍 Port: {PORT}")
-    print(f"🌐 URL: http://127.0.0.1:{PORT}")
-    print(f"🤖 AI Service: {'Online' if ai_is_online() else 'Offline'}")
-    print(f"🏢 Branches: {sum(len(states) for states in BRANCHES.values())} total")
-    print("="*60)
+    log.info("="*60)
+    log.info("🚀 COZA GLOBAL REGISTRATION PORTAL")
+    log.info("="*60)
+    log.info(f"📍 Port: {PORT}")
+    log.info(f"🌐 URL: http://127.0.0.1:{PORT}")
+    log.info(f"🤖 AI Service: {'Online' if ai_is_online() else 'Offline'}")
+    log.info(f"🏢 Branches: {len(locations.rows)} total ({locations.source})")
+    log.info("="*60)
 
     app.run(host="0.0.0.0", port=PORT, debug=DEBUG)
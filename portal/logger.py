@@ -0,0 +1,109 @@
+"""
+logger.py
+------------------
+
+Purpose:
+• Non-blocking logging for the portal: request threads only put the
+  record on a bounded queue, one background thread formats it and
+  writes it to stderr
+• A full queue drops the record (and counts it) instead of stalling
+  a registration behind a slow log sink
+
+Usage:
+    queue_logger = QueueLogger(level="INFO", queue_size=10000)
+    log = queue_logger.logger
+    log.info("✅ Registered: ...")
+
+    queue_logger.depth()     # records waiting
+    queue_logger.dropped     # records lost to a full queue
+
+"""
+
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks: records that do not fit are dropped.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Keep the record unformatted (the listener formats it), but
+        # resolve %-args and tracebacks now, while they still refer to
+        # the request's state
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+
+class QueueLogger:
+
+    def __init__(self, name="portal", level="INFO", queue_size=10000, stream=None):
+        """
+        Args:
+            name (str): logger name
+            level (str): logging level
+            queue_size (int): records held before new ones are dropped
+            stream: output stream (default stderr)
+        """
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+
+        self.listener = QueueListener(self.queue, output, respect_handler_level=False)
+        self.listener.start()
+        self._running = True
+        atexit.register(self.close)
+
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(level)
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+
+    @property
+    def dropped(self):
+        return self.handler.dropped
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def close(self):
+        """
+        Flush what is queued and stop the writer thread.
+        """
+        if not self._running:
+            return
+        self._running = False
+
+        # stop() queues a sentinel: make room for it
+        while True:
+            try:
+                self.listener.stop()
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.handler.dropped += 1
+                except queue.Empty:
+                    pass
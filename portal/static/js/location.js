@@ -1,33 +1,17 @@
-// Branch data structure
-const BRANCHES = {
-    "Nigeria": {
-        "Abuja": [
-            { id: 1, code: "COZA_HQ", name: "COZA Abuja", city: "Guzape" },
-            { id: 2, code: "COZA_LUGBE", name: "COZA Lugbe", city: "Lugbe" }
-        ],
-        "Lagos": [
-            { id: 3, code: "COZA_LAGOS", name: "COZA Lagos", city: "Ikeja" },
-            { id: 4, code: "COZA_VI/CHILDREN CHURCH", name: "COZA VI", city: "Maryland" }
-        ],
-        "Kwara": [
-            { id: 5, code: "COZA_ILORIN", name: "COZA Ilorin", city: "Tanke" }
-        ],
-        "Rivers": [
-            { id: 6, code: "COZA_PH", name: "COZA Port Harcourt", city: "Rumuomasi" }
-        ]
-    },
-    "United Kingdom": {
-        "Greater London": [
-            { id: 7, code: "COZA_LONDON", name: "COZA London", city: "London" }
-        ],
-        "West Midlands": [
-            { id: 8, code: "COZA_BIRMINGHAM", name: "COZA Birmingham", city: "Birmingham" }
-        ],
-        "Greater Manchester": [
-            { id: 9, code: "COZA_MANCHESTER", name: "COZA Manchester", city: "Manchester" }
-        ]
+// Branch data structure (country → state → branches)
+// Loaded once from /api/locations; the browser revalidates it with its ETag
+let BRANCHES = {};
+
+async function loadLocations() {
+    try {
+        const res = await fetch("/api/locations");
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        BRANCHES = await res.json();
+    } catch (err) {
+        console.error("Failed to load locations:", err);
+        BRANCHES = {};
     }
-};
+}
 
 // Populate country dropdown
 function populateCountries() {
@@ -70,13 +54,14 @@ function populateBranches(country, state) {
     BRANCHES[country][state].forEach(branch => {
         const option = document.createElement("option");
         option.value = branch.id;
-        option.textContent = `${branch.name} - ${branch.city}`;
+        option.textContent = branch.city ? `${branch.name} - ${branch.city}` : branch.name;
         branchSelect.appendChild(option);
     });
 }
 
 // Initialize location dropdowns
-document.addEventListener("DOMContentLoaded", () => {
+document.addEventListener("DOMContentLoaded", async () => {
+    await loadLocations();
     populateCountries();
 
     // Country change handler
@@ -8,6 +8,33 @@ let video = null;
 let captureInProgress = false;
 let phoneCheckTimeout = null;
 
+// AI status polling: slow when idle, follows the server's
+// Retry-After when busy, backs off exponentially when unreachable
+const STATUS_IDLE_MS = 30000;
+const STATUS_MIN_MS = 5000;
+const STATUS_MAX_MS = 300000;
+let statusTimer = null;
+let statusFailures = 0;
+
+// Registrations turned away with 429/503 are resubmitted this often
+const MAX_REGISTER_RETRIES = 3;
+
+// Retry-After (seconds) → ms, with jitter so clients do not return together
+function retryDelayMs(seconds, fallbackSeconds) {
+    const base = (Number(seconds) > 0 ? Number(seconds) : fallbackSeconds) * 1000;
+    return Math.round(base * (1 + Math.random() * 0.5));
+}
+
+function scheduleStatusCheck(delayMs) {
+    clearTimeout(statusTimer);
+    statusTimer = setTimeout(checkAIStatus, Math.min(Math.max(delayMs, STATUS_MIN_MS), STATUS_MAX_MS));
+}
+
+function offlineDelayMs() {
+    statusFailures++;
+    return 15000 * Math.pow(2, Math.min(statusFailures - 1, 5));
+}
+
 async function checkAIStatus() {
     const statusText = document.getElementById("ai-status");
     const scanBtn = document.getElementById("startScan");
@@ -21,22 +48,39 @@ async function checkAIStatus() {
             statusText.innerText = "🔴 AI temporarily offline";
             statusText.style.backgroundColor = "#ffebee";
             statusText.style.color = "#c62828";
-            scanBtn.disabled = true;
+            if (!captureInProgress) scanBtn.disabled = true;
+            scheduleStatusCheck(offlineDelayMs());
             return;
         }
 
         const data = await res.json();
+        statusFailures = 0;
+
+        if (!data.accepting || data.queue_depth > 0) {
+            const wait = Math.ceil(data.estimated_wait_seconds || 0);
+            statusText.innerText = data.accepting
+                ? `🟡 AI busy — about ${wait}s wait`
+                : "🟡 AI busy — please wait a moment";
+            statusText.style.backgroundColor = "#fff8e1";
+            statusText.style.color = "#f57f17";
+            if (!captureInProgress) scanBtn.disabled = !data.accepting;
+            scheduleStatusCheck(retryDelayMs(data.retry_after_seconds, 5));
+            return;
+        }
+
         statusText.innerText = "🟢 AI online";
         statusText.style.backgroundColor = "#e8f5e9";
         statusText.style.color = "#2e7d32";
-        scanBtn.disabled = false;
+        if (!captureInProgress) scanBtn.disabled = false;
+        scheduleStatusCheck(STATUS_IDLE_MS);
 
     } catch (err) {
         console.error("AI status check failed:", err);
         statusText.innerText = "⚠️ Unable to reach AI service";
         statusText.style.backgroundColor = "#fff3e0";
         statusText.style.color = "#e65100";
-        scanBtn.disabled = true;
+        if (!captureInProgress) scanBtn.disabled = true;
+        scheduleStatusCheck(offlineDelayMs());
     }
 }
 
@@ -52,7 +96,9 @@ async function checkPhoneDuplicate() {
     if (phone.length < 10) return;
 
     try {
-        const res = await fetch(`/api/check-phone?phone=${encodeURIComponent(phone)}`);
+        // Country lets the server read local numbers (e.g. 0803...) as E.164
+        const country = document.getElementById("country").value;
+        const res = await fetch(`/api/check-phone?phone=${encodeURIComponent(phone)}&country=${encodeURIComponent(country)}`);
         const data = await res.json();
 
         if (data.count > 0) {
@@ -182,6 +228,26 @@ async function startFaceScan() {
         let captured = 0;
         const totalFrames = 5;
 
+        // Capture frames at intervals
+        let pending = 0;
+        let submitted = false;
+
+        // Submit the whole burst once - the server keeps the best frames
+        const finishCapture = () => {
+            if (submitted) return;
+            submitted = true;
+            clearInterval(captureInterval);
+            console.log(`✅ Capture complete! Got ${frames.length} frames`);
+
+            // Stop camera
+            stopCamera();
+            video.style.display = "none";  // Hide after capture
+
+            console.log(`📤 Submitting ${frames.length} frames`);
+            statusEl.innerText = "🔄 Processing registration...";
+            submitRegistration(frames);
+        };
+
         // Capture frames at intervals
         const captureInterval = setInterval(() => {
             // Verify video is actually playing
@@ -190,6 +256,9 @@ async function startFaceScan() {
                 return;
             }
 
+            // Enough frames captured or still encoding
+            if (captured + pending >= totalFrames) return;
+
             // Set canvas size to match video
             canvas.width = video.videoWidth;
             canvas.height = video.videoHeight;
@@ -203,54 +272,43 @@ async function startFaceScan() {
             // Draw current video frame to canvas
             ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
 
-            // Convert to base64 with good quality
-            const imageData = canvas.toDataURL("image/jpeg", 0.92);
-
-            // Verify we have valid data
-            if (imageData && imageData.length > 1000) { // At least 1KB
-                frames.push(imageData);
-                captured++;
-                console.log(`✅ Frame ${captured}/${totalFrames} captured (${imageData.length} chars)`);
-                statusEl.innerText = `📸 Captured ${captured}/${totalFrames} frames...`;
-            } else {
-                console.warn(`⚠️ Frame ${captured + 1} too small or empty`);
-            }
-
-            // Check if we have enough frames
-            if (captured >= totalFrames) {
-                clearInterval(captureInterval);
-                console.log(`✅ Capture complete! Got ${frames.length} frames`);
-
-                // Stop camera
-                stopCamera();
-                video.style.display = "none";  // Hide after capture
-
-                // Use the last (most recent) frame
-                const finalImage = frames[frames.length - 1];
-                console.log(`📤 Submitting final frame (${finalImage.length} chars)`);
+            // Encode as a binary JPEG Blob (no base64 inflation)
+            pending++;
+            canvas.toBlob(blob => {
+                pending--;
+
+                // Verify we have valid data
+                if (blob && blob.size > 1000) { // At least 1KB
+                    frames.push(blob);
+                    captured++;
+                    console.log(`✅ Frame ${captured}/${totalFrames} captured (${blob.size} bytes)`);
+                    statusEl.innerText = `📸 Captured ${captured}/${totalFrames} frames...`;
+                } else {
+                    console.warn(`⚠️ Frame ${captured + 1} too small or empty`);
+                }
 
-                statusEl.innerText = "🔄 Processing registration...";
-                submitRegistration(finalImage);
-            }
+                // Check if we have enough frames
+                if (captured >= totalFrames) finishCapture();
+            }, "image/jpeg", 0.92);
         }, 300); // Capture every 300ms
 
         // Safety timeout - stop after 5 seconds even if not enough frames
         setTimeout(() => {
-            if (captureInProgress) {
-                clearInterval(captureInterval);
-                console.log(`⏱️ Timeout: captured ${frames.length} frames`);
+            if (submitted) return;
 
-                if (frames.length > 0) {
-                    stopCamera();
-                    submitRegistration(frames[frames.length - 1]);
-                } else {
-                    stopCamera();
-                    alert("Failed to capture image. Please try again.");
-                    captureInProgress = false;
-                    scanBtn.disabled = false;
-                    scanBtn.innerText = "Start Face Scan";
-                    statusEl.innerText = "";
-                }
+            console.log(`⏱️ Timeout: captured ${frames.length} frames`);
+
+            if (frames.length > 0) {
+                finishCapture();
+            } else {
+                submitted = true;
+                clearInterval(captureInterval);
+                stopCamera();
+                alert("Failed to capture image. Please try again.");
+                captureInProgress = false;
+                scanBtn.disabled = false;
+                scanBtn.innerText = "Start Face Scan";
+                statusEl.innerText = "";
             }
         }, 5000);
 
@@ -289,14 +347,14 @@ function stopCamera() {
     }
 }
 
-async function submitRegistration(imageData) {
+async function submitRegistration(frames, attempt = 0) {
     console.log("📤 Submitting registration...");
-    console.log(`  Image data length: ${imageData.length} characters`);
+    console.log(`  Frames: ${frames.length}`);
 
     const scanBtn = document.getElementById("startScan");
     const statusEl = document.getElementById("status");
 
-    const payload = {
+    const fields = {
         first_name: document.getElementById("first_name").value.trim(),
         last_name: document.getElementById("last_name").value.trim(),
         phone: document.getElementById("phone").value.trim(),
@@ -306,28 +364,40 @@ async function submitRegistration(imageData) {
         country: document.getElementById("country").value,
         state: document.getElementById("state").value,
         branch_id: document.getElementById("branch_id").value,
-        is_worker: document.getElementById("is_worker").value === "yes",
+        is_worker: document.getElementById("is_worker").value === "yes" ? "yes" : "no",
         role: document.getElementById("role").value || "member",
         ministry_name: document.getElementById("ministry_name")?.value || "",
-        consent: document.getElementById("consent").checked,
-        image: imageData
+        consent: document.getElementById("consent").checked ? "true" : "false"
     };
 
+    // Multipart: form fields + raw JPEG parts (browser sets the boundary)
+    const payload = new FormData();
+    Object.entries(fields).forEach(([key, value]) => payload.append(key, value));
+    frames.forEach((blob, i) => payload.append("images", blob, `frame${i + 1}.jpg`));
+
     console.log("📋 Payload:", {
-        ...payload,
-        image: `${imageData.substring(0, 50)}... (${imageData.length} chars total)`
+        ...fields,
+        images: `${frames.length} frames (${frames.reduce((n, f) => n + f.size, 0)} bytes total)`
     });
 
     try {
         const res = await fetch("/register", {
             method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify(payload)
+            body: payload
         });
 
         const data = await res.json();
         console.log("📥 Response:", data);
 
+        // Server saturated: wait as long as it asks, then resend the same frames
+        if ((res.status === 429 || res.status === 503) && attempt < MAX_REGISTER_RETRIES) {
+            const delay = retryDelayMs(res.headers.get("Retry-After") || data.retry_after, 5);
+            console.warn(`🚦 Server busy (${res.status}), retrying in ${delay} ms`);
+            statusEl.innerText = `⏳ Many people are registering — retrying in ${Math.ceil(delay / 1000)}s...`;
+            setTimeout(() => submitRegistration(frames, attempt + 1), delay);
+            return;
+        }
+
         if (!res.ok) {
             console.error("❌ Registration failed:", data.message);
             alert(data.message || "Registration failed");
@@ -413,7 +483,6 @@ document.addEventListener("DOMContentLoaded", () => {
     // AI status check
     checkAIStatus();
     setupPhoneListener();
-    setInterval(checkAIStatus, 15000);
 
     // Start face scan button
     const scanBtn = document.getElementById("startScan");
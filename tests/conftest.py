@@ -0,0 +1,45 @@
+"""
+conftest.py
+------------------
+
+Purpose:
+• Make the repo's packages (ai, database, portal, ...) importable from
+  the tests, as benchmarks/ does for its scripts
+• Shared fixtures for the FAISS gallery tests
+
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+# Small embeddings keep the FAISS tests fast
+DIM = 16
+
+
+def random_embedding(rng, dim=DIM):
+    vector = rng.standard_normal(dim).astype("float32")
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def gallery_settings(tmp_path):
+    """
+    FaissManager settings for a gallery in a fresh directory.
+    Background snapshots are pushed out of the way of the tests.
+    """
+    return {
+        "index_path": str(tmp_path / "faiss.index"),
+        "meta_path": str(tmp_path / "faiss_meta.json"),
+        "journal_path": str(tmp_path / "faiss.index.journal"),
+        "dim": DIM,
+        "snapshot_every": 10 ** 6,
+        "snapshot_interval": 3600,
+        "index_type": "Flat"
+    }
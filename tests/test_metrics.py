@@ -0,0 +1,78 @@
+"""
+portal/metrics.Registry.render(): the Prometheus text format served by
+/metrics.
+"""
+
+import pytest
+
+from portal.metrics import CONTENT_TYPE, Registry
+
+
+def test_counter_and_gauge():
+    registry = Registry()
+    shed = registry.counter("portal_shed_total", "Requests shed", ["status"])
+    depth = registry.gauge("portal_queue_depth", "Jobs waiting", ["queue"],
+                           callback=lambda: {("inference_pool",): 3})
+
+    shed.inc(status=429)
+    shed.inc(2, status=429)
+    shed.inc(status=503)
+    depth.set(1, queue="batch")
+
+    assert registry.render() == (
+        "# HELP portal_shed_total Requests shed\n"
+        "# TYPE portal_shed_total counter\n"
+        'portal_shed_total{status="429"} 3\n'
+        'portal_shed_total{status="503"} 1\n'
+        "# HELP portal_queue_depth Jobs waiting\n"
+        "# TYPE portal_queue_depth gauge\n"
+        'portal_queue_depth{queue="batch"} 1\n'
+        'portal_queue_depth{queue="inference_pool"} 3\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    stage = registry.histogram("portal_stage_seconds", "Time per stage", ["stage"], buckets=(0.1, 1.0))
+
+    stage.observe(0.05, stage="detect")
+    stage.observe(0.1, stage="detect")
+    stage.observe(0.5, stage="detect")
+    stage.observe(2.0, stage="detect")
+
+    lines = registry.render().splitlines()
+
+    assert lines == [
+        "# HELP portal_stage_seconds Time per stage",
+        "# TYPE portal_stage_seconds histogram",
+        'portal_stage_seconds_bucket{stage="detect",le="0.1"} 2',
+        'portal_stage_seconds_bucket{stage="detect",le="1.0"} 3',
+        'portal_stage_seconds_bucket{stage="detect",le="+Inf"} 4',
+        'portal_stage_seconds_sum{stage="detect"} 2.65',
+        'portal_stage_seconds_count{stage="detect"} 4'
+    ]
+
+
+def test_unlabelled_metric_and_escaping():
+    registry = Registry()
+    registry.gauge("portal_gallery_size", "Faces in the gallery").set(7)
+    reasons = registry.counter("portal_rejections_total", "Rejections", ["reason"])
+    reasons.inc(reason='say "cheese"\\\n')
+
+    body = registry.render()
+
+    assert "portal_gallery_size 7\n" in body
+    assert 'portal_rejections_total{reason="say \\"cheese\\"\\\\\\n"} 1\n' in body
+    assert body.endswith("\n")
+    assert "version=0.0.4" in CONTENT_TYPE
+
+
+def test_wrong_labels_are_rejected():
+    registry = Registry()
+    stage = registry.histogram("portal_stage_seconds", "Time per stage", ["stage"])
+
+    with pytest.raises(ValueError):
+        stage.observe(0.1, step="detect")
+
+    with pytest.raises(ValueError):
+        stage.observe(0.1)
@@ -0,0 +1,128 @@
+"""
+SharedFaissManager across processes: registrations and removals made in
+one process must be visible in another that already has the gallery
+open, before and after a snapshot is published.
+"""
+
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from ai.shared_gallery import SharedFaissManager
+from conftest import random_embedding
+
+
+def run_in_process(target, *args):
+    """
+    Run target(*args) in a fresh (spawned) process, return its result.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+
+    process = context.Process(target=_worker, args=(results, target) + args)
+    process.start()
+    ok, value = results.get(timeout=60)
+    process.join(60)
+
+    if not ok:
+        pytest.fail(f"Worker process failed: {value}")
+    return value
+
+
+def _worker(results, target, *args):
+    try:
+        results.put((True, target(*args)))
+    except Exception as e:
+        results.put((False, repr(e)))
+
+
+# --------------------------------------------------
+# Run in the other process
+# --------------------------------------------------
+def register_and_remove(settings, embedding, member_id, removed_id):
+    manager = SharedFaissManager(**settings)
+    try:
+        seen = sorted(int(i) for i in manager.member_ids())
+        manager.add(embedding, member_id)
+        manager.remove(removed_id)
+        return seen
+    finally:
+        manager._stop.set()
+        manager._snapshot_thread.join()
+        manager.journal.close()
+
+
+def register_and_publish(settings, embedding, member_id):
+    manager = SharedFaissManager(**settings)
+    try:
+        manager.add(embedding, member_id)
+        manager.save()
+        return manager.generation
+    finally:
+        manager.close()
+
+
+# --------------------------------------------------
+# Tests
+# --------------------------------------------------
+@pytest.fixture
+def shared(gallery_settings):
+    rng = np.random.default_rng(4)
+    faces = {member_id: random_embedding(rng) for member_id in range(1, 11)}
+
+    manager = SharedFaissManager(**gallery_settings)
+    for member_id, embedding in faces.items():
+        manager.add(embedding, member_id)
+
+    yield manager, faces, rng
+    manager.close()
+
+
+def test_changes_from_another_process_are_visible(shared, gallery_settings):
+    manager, faces, rng = shared
+    embedding = random_embedding(rng)
+
+    seen = run_in_process(register_and_remove, gallery_settings, embedding, 42, 3)
+
+    # The other process saw this one's journal records...
+    assert seen == sorted(faces)
+
+    # ...and this one sees its add and remove without reopening
+    assert 42 in manager
+    assert 3 not in manager
+    assert len(manager) == 10
+    assert manager.search(embedding, top_k=1)[0][0] == 42
+    assert all(member_id != 3 for member_id, _ in manager.search(faces[3], top_k=10))
+
+
+def test_published_snapshot_is_picked_up(shared, gallery_settings):
+    manager, faces, rng = shared
+    embedding = random_embedding(rng)
+    generation = manager.generation
+
+    published = run_in_process(register_and_publish, gallery_settings, embedding, 43)
+
+    assert published > generation
+    assert manager.shared_version()[0] == published
+
+    # Re-mapped on the next operation: everything is in the snapshot now
+    assert len(manager) == 11
+    assert manager.generation == published
+    assert manager.delta.ntotal == 0
+    assert manager.search(embedding, top_k=1)[0][0] == 43
+    assert manager.search(faces[7], top_k=1)[0][0] == 7
+
+
+def test_stale_snapshot_face_is_replaced(shared, gallery_settings):
+    manager, faces, rng = shared
+    manager.save()
+
+    # Re-enrolled elsewhere after the snapshot: the mapped face is stale
+    replacement = random_embedding(rng)
+    run_in_process(register_and_remove, gallery_settings, replacement, 5, 6)
+
+    assert len(manager) == 9
+    assert 5 in manager.stale and 6 in manager.stale
+    assert manager.search(replacement, top_k=1)[0][0] == 5
+    assert np.allclose(manager.get_embeddings([5])[5], replacement, atol=1e-5)